@@ -0,0 +1,812 @@
+"""Headless recording, persistence and replay benchmarks.
+
+Runs the recorder and replay engine against fake input controllers, so it
+works on a machine without a desktop session. pynput is replaced by a
+minimal stub when it cannot be imported (e.g. no X display); the win32
+ctypes paths are never taken off Windows. Synthetic inputs are generated
+from fixed seeds so runs on different commits are comparable.
+
+Usage:
+    python benchmarks.py [NAME ...] [--json results.json] [--sizes 10000,100000,1000000]
+
+Names: record-moves, persistence, keys, jitter, stop-latency, pipeline,
+typing, window-table, archive, schema, editor, remap, loops, trace, x11 (default: all). The x11
+benchmark needs $DISPLAY, e.g. `xvfb-run -s "-screen 0 1920x1080x24"`.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+
+def _install_pynput_stub() -> None:
+    class _Names:
+        def __getattr__(self, name):
+            return name
+
+    class _Controller:
+        def __init__(self):
+            self.position = (0, 0)
+
+        def press(self, _item):
+            pass
+
+        def release(self, _item):
+            pass
+
+        def scroll(self, _dx, _dy):
+            pass
+
+    class _KeyCode:
+        def __init__(self, vk=None, char=None):
+            self.vk = vk
+            self.char = char
+
+        @classmethod
+        def from_char(cls, char):
+            return cls(char=char)
+
+        @classmethod
+        def from_vk(cls, vk):
+            return cls(vk=vk)
+
+        def __eq__(self, other):
+            return isinstance(other, _KeyCode) and (self.vk, self.char) == (other.vk, other.char)
+
+        def __hash__(self):
+            return hash((self.vk, self.char))
+
+    pynput = types.ModuleType("pynput")
+    pynput.mouse = types.SimpleNamespace(Button=_Names(), Controller=_Controller, Listener=None)
+    pynput.keyboard = types.SimpleNamespace(
+        Key=_Names(),
+        KeyCode=_KeyCode,
+        Controller=_Controller,
+        Listener=None,
+    )
+    sys.modules["pynput"] = pynput
+
+
+try:
+    import pynput  # noqa: F401
+
+    PYNPUT_STUBBED = False
+except Exception:
+    _install_pynput_stub()
+    PYNPUT_STUBBED = True
+
+import main  # noqa: E402
+import recording_archive  # noqa: E402
+import recording_editor  # noqa: E402
+import recording_schema  # noqa: E402
+import replay_trace  # noqa: E402
+import screen_layout  # noqa: E402
+import x11_backend  # noqa: E402
+
+
+SAMPLE_RECORDING = Path(__file__).resolve().parent / "last_recording.json"
+DEFAULT_PERSISTENCE_SIZES = (10000, 100000, 1000000)
+SEED = 1234
+
+
+class FakeController:
+    """Stands in for pynput controllers and timestamps every injected action."""
+
+    def __init__(self, keep_timestamps: bool = False):
+        self._position = (0, 0)
+        self.injections = 0
+        self.last_injection_at = None
+        self.timestamps = [] if keep_timestamps else None
+
+    def _record(self) -> None:
+        self.injections += 1
+        self.last_injection_at = time.perf_counter()
+        if self.timestamps is not None:
+            self.timestamps.append(self.last_injection_at)
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+        self._record()
+
+    def press(self, _item) -> None:
+        self._record()
+
+    def release(self, _item) -> None:
+        self._record()
+
+    def scroll(self, _dx, _dy) -> None:
+        self._record()
+
+    def type(self, _text) -> None:
+        self._record()
+
+
+def make_move_events(count: int, rate_hz: float = 1000.0):
+    return [
+        {"type": "move", "time": idx / rate_hz, "x": idx % 1920, "y": (idx * 7) % 1080}
+        for idx in range(count)
+    ]
+
+
+class _HeadlessVar:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value) -> None:
+        self.value = value
+
+
+class _HeadlessRoot:
+    def after(self, _delay, callback=None):
+        if callback:
+            callback()
+
+
+def make_headless_app(data_dir: Path):
+    """A MouseRecorderApp with recorder/persistence state but no Tk window or listeners."""
+    app = main.MouseRecorderApp.__new__(main.MouseRecorderApp)
+    app.root = _HeadlessRoot()
+    app.is_recording = True
+    app.is_replaying = False
+    app.events = []
+    app.recording = None
+    app.window_table = main.WindowContextTable()
+    app.record_start_time = time.perf_counter()
+    app.last_move_time = 0.0
+    app.min_move_interval = 0.003
+    app.last_recorded_pos = None
+    app.app_data_dir = Path(data_dir)
+    app.recording_file = app.app_data_dir / f"last_recording{main.ARCHIVE_SUFFIX}"
+    app.legacy_recording_file = app.app_data_dir / "last_recording.json"
+    app.replay_log_file = app.app_data_dir / "replay_debug.log"
+    app.status_var = _HeadlessVar("Ready")
+    app.session_metrics = None
+    app.record_screen = None
+    return app
+
+
+def make_random_walk(count: int, seed: int = SEED):
+    rng = random.Random(seed)
+    x, y = 960, 540
+    points = []
+    for _ in range(count):
+        x = min(1919, max(0, x + rng.randint(-3, 3)))
+        y = min(1079, max(0, y + rng.randint(-3, 3)))
+        points.append((x, y))
+    return points
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def bench_stop_latency(trials: int = 20, stop_after: float = 0.2):
+    """Esc-to-last-injection latency while replaying moves and while blocked in a guard wait."""
+    scenarios = {
+        "scheduler": (make_move_events(5000), main.ReplayOptions(replay_count=1)),
+        "window_wait": (
+            [{"type": "key", "time": 0.0, "action": "press",
+              "key": {"kind": "char", "value": "a"}, "window": {"title": "never", "class": ""}}],
+            main.ReplayOptions(replay_count=1, smart_enabled=True, smart_wait_timeout=30.0),
+        ),
+    }
+    results = {}
+    for name, (events, options) in scenarios.items():
+        stop_latencies = []
+        exit_latencies = []
+        for _ in range(trials):
+            controller = FakeController()
+            token = main.CancellationToken()
+            engine = main.ReplayEngine(events, options, controller, controller, cancel_token=token)
+            outcome = {}
+            worker = threading.Thread(target=lambda: outcome.setdefault("result", engine.run()))
+            worker.start()
+            time.sleep(stop_after)
+            token.cancel("benchmark")
+            worker.join()
+            result = outcome["result"]
+            stop_latencies.append((result.stop_latency or 0.0) * 1000.0)
+            exit_latencies.append((result.exit_latency or 0.0) * 1000.0)
+        results[name] = {
+            "trials": trials,
+            "stop_latency_ms_p50": statistics.median(stop_latencies),
+            "stop_latency_ms_max": max(stop_latencies),
+            "exit_latency_ms_p50": statistics.median(exit_latencies),
+            "exit_latency_ms_p95": _percentile(exit_latencies, 0.95),
+        }
+    return results
+
+
+def bench_pipeline(event_count: int = 3000, rate_hz: float = 1000.0):
+    """Producer/injector queue behaviour for a dense move stream replayed twice."""
+    controller = FakeController()
+    engine = main.ReplayEngine(
+        make_move_events(event_count, rate_hz),
+        main.ReplayOptions(replay_count=2),
+        controller,
+        controller,
+    )
+    started_at = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - started_at
+    stats = engine.pipeline_stats
+    return {
+        "pipeline": {
+            "events": event_count * 2,
+            "wall_s": elapsed,
+            "produced": stats.produced,
+            "producer_stalls": stats.producer_stalls,
+            "injector_starved": stats.injector_starvations,
+            "avg_depth": (stats.depth_total / stats.depth_samples) if stats.depth_samples else 0.0,
+            "max_depth": stats.max_depth,
+        }
+    }
+
+
+def make_typing_events(char_count: int, interval: float = 0.0005, window=None):
+    window = window or {"title": "Form - Browser", "class": "Chrome_WidgetWin_1"}
+    events = []
+    for idx in range(char_count):
+        payload = {"kind": "char", "value": "abcdefghij"[idx % 10]}
+        for offset, action in ((0.0, "press"), (interval / 2, "release")):
+            events.append({
+                "type": "key",
+                "time": idx * interval + offset,
+                "action": action,
+                "key": payload,
+                "window": window,
+            })
+    return events
+
+
+def bench_typing(char_count: int = 400, capture_cost: float = 0.0003):
+    """Per-key replay vs the typed-text fast path with a window guard on every key."""
+    window = {"title": "Form - Browser", "class": "Chrome_WidgetWin_1"}
+
+    def fake_capture():
+        # Roughly the cost of GetForegroundWindow + GetWindowText + GetClassName.
+        deadline = time.perf_counter() + capture_cost
+        while time.perf_counter() < deadline:
+            pass
+        return dict(window)
+
+    original_capture = main.capture_window_context
+    main.capture_window_context = fake_capture
+    try:
+        events = make_typing_events(char_count, window=window)
+        timings = {}
+        for label, exact in (("per_key", True), ("fast_path", False)):
+            controller = FakeController()
+            options = main.ReplayOptions(
+                replay_count=1,
+                smart_enabled=True,
+                smart_wait_timeout=5.0,
+                exact_key_timing=exact,
+            )
+            engine = main.ReplayEngine(events, options, controller, controller)
+            started_at = time.perf_counter()
+            engine.run()
+            timings[label] = {
+                "wall_s": time.perf_counter() - started_at,
+                "guard_waits": engine.window_wait_stats.waits,
+                "injections": controller.injections,
+            }
+    finally:
+        main.capture_window_context = original_capture
+    timings["speedup"] = {"x": timings["per_key"]["wall_s"] / max(timings["fast_path"]["wall_s"], 1e-9)}
+    return timings
+
+
+def bench_window_table(event_count: int = 100000, window_count: int = 6, calls: int = 200000):
+    """Memory of per-event window dicts vs an interned table, and cost per match call."""
+    titles = [f"Invoice {idx} - Accounting Suite" for idx in range(window_count)]
+
+    def build_events():
+        return [
+            {"type": "key", "time": idx * 0.01, "action": "press",
+             "key": {"kind": "char", "value": "a"},
+             "window": {"title": str(titles[idx % window_count]), "class": "AppWindow"}}
+            for idx in range(event_count)
+        ]
+
+    tracemalloc.start()
+    events = build_events()
+    per_event_bytes = tracemalloc.get_traced_memory()[0]
+    table = recording_schema.WindowContextTable()
+    table.intern_events(events)
+    interned_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+
+    expected = {"title": titles[0], "class": "AppWindow"}
+    current = {"title": f"  {titles[0].upper()}  - Browser", "class": "AppWindow"}
+
+    def normalize_every_call():
+        return recording_schema._normalized_context_matches(
+            recording_schema.normalize_window_text(expected["title"]),
+            recording_schema.normalize_window_text(expected["class"]),
+            recording_schema.normalize_window_text(current["title"]),
+            recording_schema.normalize_window_text(current["class"]),
+        )
+
+    started_at = time.perf_counter()
+    for _ in range(calls):
+        normalize_every_call()
+    normalized_ns = (time.perf_counter() - started_at) / calls * 1e9
+
+    context_id = table.intern(expected)
+    started_at = time.perf_counter()
+    for _ in range(calls):
+        table.matches(context_id, current)
+    memoized_ns = (time.perf_counter() - started_at) / calls * 1e9
+
+    return {
+        "memory": {
+            "events": event_count,
+            "per_event_dicts_mb": per_event_bytes / 1e6,
+            "interned_mb": interned_bytes / 1e6,
+            "saved_mb": (per_event_bytes - interned_bytes) / 1e6,
+        },
+        "match_call": {
+            "normalize_each_call_ns": normalized_ns,
+            "memoized_ns": memoized_ns,
+        },
+    }
+
+
+def _best_of(func, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started_at)
+    return best
+
+
+def bench_archive(scale: int = 200):
+    """Size and decode speed of the archive format against the sample JSON recording."""
+    sample = json.loads(SAMPLE_RECORDING.read_text(encoding="utf-8"))
+    span = sample[-1]["time"] + 0.01
+    scaled = [
+        dict(event, time=event["time"] + copy * span)
+        for copy in range(scale)
+        for event in sample
+    ]
+    results = {}
+    for label, events in (("sample", sample), (f"sample_x{scale}", scaled)):
+        raw_json = json.dumps(events, ensure_ascii=True, separators=(",", ":"))
+        row = {"events": len(events), "json_bytes": len(raw_json)}
+        row["json_decode_ms"] = _best_of(lambda: json.loads(raw_json)) * 1000
+        for codec in ("zlib", "lzma"):
+            packed = recording_archive.encode_events(events, codec)
+            row[f"{codec}_bytes"] = len(packed)
+            row[f"{codec}_ratio"] = len(raw_json) / len(packed)
+            row[f"{codec}_decode_ms"] = _best_of(lambda: recording_archive.decode_events(packed)) * 1000
+        results[label] = row
+    return results
+
+
+def make_mixed_events(count: int):
+    window = {"title": "Form - Browser", "class": "Chrome_WidgetWin_1"}
+    events = []
+    for idx, (x, y) in enumerate(make_random_walk(count)):
+        kind = idx % 8
+        event = {"type": "move", "time": idx * 0.001, "x": x, "y": y}
+        if kind == 5:
+            event.update(type="click", button="left", pressed=bool(idx % 16 == 5),
+                         pixel={"r": 10, "g": 20, "b": 30}, window=window)
+        elif kind == 6:
+            event.update(type="scroll", dx=0, dy=-1, window=window)
+        elif kind == 7:
+            event = {"type": "key", "time": idx * 0.001, "action": "press",
+                     "key": {"kind": "char", "value": "a"}, "window": window}
+        events.append(event)
+    return events
+
+
+def bench_schema(sizes=(200000, 1000000)):
+    """Validation throughput of compile_events and the replay-time cost it removes."""
+    results = {}
+    for count in sizes:
+        events = make_mixed_events(count)
+        # One malformed event per thousand exercises the repair path.
+        for idx in range(0, count, 1000):
+            events[idx] = dict(events[idx], time=str(events[idx]["time"]))
+        started_at = time.perf_counter()
+        compiled = recording_schema.compile_events(events)
+        elapsed = time.perf_counter() - started_at
+        results[f"compile_{count}"] = {
+            "wall_s": elapsed,
+            "events_per_s": count / elapsed,
+            "repaired": compiled.repaired,
+            "rejected": compiled.rejected,
+        }
+
+    events = make_mixed_events(200000)
+    compiled = recording_schema.compile_events(events)
+    engine = main.ReplayEngine(compiled, main.ReplayOptions(replay_count=1), FakeController(), FakeController())
+
+    def dict_access():
+        for event in events:
+            if event.get("type") in main.GUARDED_EVENT_TYPES:
+                event.get("window"), float(event.get("time", 0.0))
+
+    def record_access():
+        for record in compiled.records:
+            if record.type in main.GUARDED_EVENT_TYPES:
+                record.window_id, record.time
+
+    results["hot_path_200000"] = {
+        "dict_get_ms": _best_of(dict_access, 3) * 1000,
+        "record_slots_ms": _best_of(record_access, 3) * 1000,
+        "bind_ms": _best_of(lambda: [engine._bind_record(record) for record in compiled.records], 3) * 1000,
+    }
+    return results
+
+
+def bench_record_moves(seconds: int = 60, rate_hz: float = 1000.0):
+    """Cost of _append_move_event per listener callback for a simulated 1 kHz mouse."""
+    count = int(seconds * rate_hz)
+    points = make_random_walk(count)
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = make_headless_app(data_dir)
+
+        def feed():
+            app.events = []
+            app.last_move_time = 0.0
+            app.last_recorded_pos = None
+            append = app._append_move_event
+            for idx, (x, y) in enumerate(points):
+                append(x, y, idx / rate_hz)
+
+        elapsed = _best_of(feed)
+        per_call_ns = elapsed / count * 1e9
+        results["move_1khz"] = {
+            "callbacks": count,
+            "kept_events": len(app.events),
+            "per_call_ns": per_call_ns,
+            "budget_used_pct": per_call_ns / (1e9 / rate_hz) * 100,
+        }
+    return results
+
+
+def bench_persistence(sizes=DEFAULT_PERSISTENCE_SIZES):
+    """_save_last_recording and _load_last_recording round trips through the app methods."""
+    results = {}
+    for count in sizes:
+        events = make_mixed_events(count)
+        with tempfile.TemporaryDirectory() as data_dir:
+            app = make_headless_app(data_dir)
+            app.events = events
+            gc.collect()
+            started_at = time.perf_counter()
+            app._save_last_recording()
+            save_s = time.perf_counter() - started_at
+            file_bytes = app.recording_file.stat().st_size
+            app.events = []
+            gc.collect()
+            started_at = time.perf_counter()
+            app._load_last_recording()
+            load_s = time.perf_counter() - started_at
+            loaded = len(app.events)
+        del events
+        results[f"events_{count}"] = {
+            "save_s": save_s,
+            "load_s": load_s,
+            "file_bytes": file_bytes,
+            "bytes_per_event": file_bytes / count,
+            "loaded": loaded,
+        }
+    return results
+
+
+def bench_keys(calls: int = 200000):
+    """_deserialize_key per payload kind, and the per-recording cache used when binding steps."""
+    engine = main.ReplayEngine([], main.ReplayOptions(replay_count=1), FakeController(), FakeController())
+    payloads = {"special": ("special", "shift"), "char": ("char", "a"), "vk": ("vk", 65)}
+    results = {"deserialize_ns": {}}
+    for label, (kind, value) in payloads.items():
+        elapsed = _best_of(lambda: [engine._deserialize_key(kind, value) for _ in range(calls)], 3)
+        results["deserialize_ns"][label] = elapsed / calls * 1e9
+
+    compiled = recording_schema.compile_events(make_typing_events(calls // 2))
+    records = compiled.records
+    elapsed = _best_of(lambda: [engine._bind_record(record) for record in records], 3)
+    results["bind_cached_ns"] = {"per_record": elapsed / len(records) * 1e9}
+    return results
+
+
+def bench_jitter(event_count: int = 2000, rate_hz: float = 1000.0, burst_count: int = 100000):
+    """Scheduler lateness at 1 kHz and per-event overhead of the replay loop with zero gaps."""
+    controller = FakeController(keep_timestamps=True)
+    events = make_move_events(event_count, rate_hz)
+    main.ReplayEngine(events, main.ReplayOptions(replay_count=1), controller, controller).run()
+    stamps = controller.timestamps[:event_count]
+    lateness_us = [
+        ((stamp - stamps[0]) - idx / rate_hz) * 1e6
+        for idx, stamp in enumerate(stamps)
+    ]
+    intervals_us = [(later - earlier) * 1e6 for earlier, later in zip(stamps, stamps[1:])]
+
+    burst = [dict(event, time=0.0) for event in make_move_events(burst_count)]
+    compiled = recording_schema.compile_events(burst)
+    controller = FakeController()
+    engine = main.ReplayEngine(compiled, main.ReplayOptions(replay_count=1), controller, controller)
+    started_at = time.perf_counter()
+    engine.run()
+    burst_s = time.perf_counter() - started_at
+    return {
+        "lateness_1khz": {
+            "events": len(stamps),
+            "p50_us": _percentile(lateness_us, 0.5),
+            "p95_us": _percentile(lateness_us, 0.95),
+            "p99_us": _percentile(lateness_us, 0.99),
+            "max_us": max(lateness_us),
+            "interval_stdev_us": statistics.pstdev(intervals_us),
+        },
+        "overhead": {
+            "events": burst_count,
+            "per_event_us": burst_s / burst_count * 1e6,
+        },
+    }
+
+
+def bench_editor(event_count: int = 1000000):
+    """Edit latency on a large recording, and the cost of reading re-based records at replay."""
+    compiled = recording_schema.compile_events(make_mixed_events(event_count))
+    clip = recording_schema.compile_events(make_mixed_events(1000))
+    base = recording_editor.EditedRecording.from_recording(compiled)
+    operations = {
+        "trim": lambda recording: recording.trim(10.0, compiled.records[-1].time - 10.0),
+        "delete": lambda recording: recording.delete(event_count // 2, event_count // 2 + 50),
+        "splice": lambda recording: recording.splice(event_count // 3, clip),
+        "repeat": lambda recording: recording.repeat(1000, 21000, 10, 0.5),
+        "shift": lambda recording: recording.shift(event_count // 4, 1.5),
+    }
+    results = {}
+    edited = base
+    for name, operation in operations.items():
+        elapsed = _best_of(lambda: operation(edited))
+        edited = operation(edited)
+        results[name] = {"ms": elapsed * 1000.0, "segments": len(edited.segments)}
+
+    started_at = time.perf_counter()
+    count = sum(1 for _ in edited.records)
+    iterate_s = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    for index in range(0, len(edited.records), 10):
+        edited.records[index]
+    index_s = time.perf_counter() - started_at
+    results["read"] = {
+        "events": count,
+        "iter_per_event_us": iterate_s / count * 1e6,
+        "index_per_event_us": index_s / (len(edited.records) // 10) * 1e6,
+    }
+    return results
+
+
+def bench_remap(event_count: int = 1000000, burst_count: int = 100000):
+    """Cost of remapping a recording to another screen layout, and replay overhead with remapping."""
+    source = {"left": 0, "top": 0, "width": 1920, "height": 1080, "dpi": 96}
+    target = screen_layout.ScreenLayout(-1280, 0, 3840, 2160, 192)
+    compiled = recording_schema.compile_events(make_mixed_events(event_count), screen=source)
+    started_at = time.perf_counter()
+    screen_layout.remap_points(compiled, target)
+    first_s = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    screen_layout.remap_points(compiled, target)
+    cached_s = time.perf_counter() - started_at
+
+    burst = [dict(event, time=0.0) for event in make_move_events(burst_count)]
+    results = {"plan": {"events": event_count, "first_ms": first_s * 1000.0, "cached_us": cached_s * 1e6}}
+    for name, layout in (("same_layout", screen_layout.ScreenLayout.from_dict(source)), ("remapped", target)):
+        recording = recording_schema.compile_events(burst, screen=source)
+        controller = FakeController()
+        engine = main.ReplayEngine(recording, main.ReplayOptions(replay_count=1), controller, controller, screen=layout)
+        started_at = time.perf_counter()
+        engine.run()
+        results[name] = {"per_event_us": (time.perf_counter() - started_at) / burst_count * 1e6}
+    return results
+
+
+def bench_loops(loops: int = 1000, events_per_loop: int = 5, flush_cost: float = 0.00005):
+    """Wall clock of many short loops with and without overlapped loop boundaries."""
+
+    class BufferedController(FakeController):
+        # Like the XTest controllers: injections are sent by a flush with a fixed round-trip cost.
+        def flush(self) -> None:
+            deadline = time.perf_counter() + flush_cost
+            while time.perf_counter() < deadline:
+                pass
+
+    events = make_move_events(events_per_loop)
+    compiled = recording_schema.compile_events(events)
+    ideal_s = compiled.records[-1].time * loops
+    results = {}
+    for name, overlap in (("sequential", False), ("overlapped", True)):
+        controller = BufferedController()
+        options = main.ReplayOptions(replay_count=loops, overlap_loops=overlap)
+        engine = main.ReplayEngine(compiled, options, controller, controller)
+        started_at = time.perf_counter()
+        replay = engine.run()
+        wall_s = time.perf_counter() - started_at
+        results[name] = {
+            "loops": replay.completed_loops,
+            "wall_s": wall_s,
+            "over_ideal_ms": (wall_s - ideal_s) * 1000.0,
+            "boundary_mean_us": replay.loop_boundary_total / max(1, replay.loop_boundaries) * 1e6,
+            "schedule_slip_ms": replay.schedule_slip * 1000.0,
+        }
+    return results
+
+
+def bench_trace(event_count: int = 100000, loops: int = 3):
+    """Per-event cost of writing a replay trace, trace size, and analyzer throughput."""
+    burst = [dict(event, time=0.0) for event in make_move_events(event_count)]
+    compiled = recording_schema.compile_events(burst)
+    options = main.ReplayOptions(replay_count=loops)
+
+    def replay(trace=None):
+        controller = FakeController()
+        engine = main.ReplayEngine(compiled, options, controller, controller, trace=trace)
+        started_at = time.perf_counter()
+        engine.run()
+        return time.perf_counter() - started_at
+
+    plain_s = min(replay() for _ in range(3))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / f"bench{replay_trace.TRACE_SUFFIX}"
+        traced_s = None
+        for _ in range(3):
+            writer = replay_trace.TraceWriter(path, {"events": event_count})
+            elapsed = replay(writer)
+            writer.close()
+            traced_s = elapsed if traced_s is None else min(traced_s, elapsed)
+        size = path.stat().st_size
+        started_at = time.perf_counter()
+        _, records = replay_trace.read_trace(path)
+        analysis = replay_trace.TraceAnalysis(records)
+        analysis.loop_rows()
+        analysis.top_drift(10)
+        analyze_s = time.perf_counter() - started_at
+    injected = event_count * loops
+    return {
+        "write": {
+            "events": injected,
+            "plain_per_event_us": plain_s / injected * 1e6,
+            "traced_per_event_us": traced_s / injected * 1e6,
+            "bytes_per_event": size / injected,
+        },
+        "analyze": {"records": len(records), "records_per_s": len(records) / analyze_s},
+    }
+
+
+def bench_x11(calls: int = 2000, event_count: int = 5000):
+    """Context capture, pixel read and batched XTest replay cost on the current X display."""
+    x_display = x11_backend.default_display()
+    if x_display is None or not x_display.has_xtest:
+        return {"skipped": {"reason": "no X display with XTest (set DISPLAY, e.g. under Xvfb)"}}
+
+    results = {}
+    elapsed = _best_of(lambda: [x_display.active_window_context() for _ in range(calls)], 3)
+    results["context"] = {"per_call_us": elapsed / calls * 1e6}
+    elapsed = _best_of(lambda: [x_display.pixel_rgb(idx % 100, idx % 100) for idx in range(calls)], 3)
+    results["pixel"] = {"per_call_us": elapsed / calls * 1e6}
+
+    mouse_controller = x11_backend.X11MouseController(x_display)
+    keyboard_controller = x11_backend.X11KeyboardController(x_display)
+    width, height = x_display.screen_size()
+    burst = [
+        {"type": "move", "time": 0.0, "x": x % width, "y": y % height}
+        for x, y in make_random_walk(event_count)
+    ]
+    engine = main.ReplayEngine(burst, main.ReplayOptions(replay_count=1), mouse_controller, keyboard_controller)
+    started_at = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - started_at
+    results["xtest_replay"] = {"events": event_count, "per_event_us": elapsed / event_count * 1e6}
+    return results
+
+
+BENCHMARKS = {
+    "record-moves": bench_record_moves,
+    "persistence": bench_persistence,
+    "keys": bench_keys,
+    "jitter": bench_jitter,
+    "stop-latency": bench_stop_latency,
+    "pipeline": bench_pipeline,
+    "typing": bench_typing,
+    "window-table": bench_window_table,
+    "archive": bench_archive,
+    "schema": bench_schema,
+    "editor": bench_editor,
+    "remap": bench_remap,
+    "loops": bench_loops,
+    "trace": bench_trace,
+    "x11": bench_x11,
+}
+
+
+def _git_revision():
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def run(names, sizes=None) -> dict:
+    results = {}
+    for name in names or BENCHMARKS:
+        if name == "persistence" and sizes:
+            result = bench_persistence(sizes)
+        else:
+            result = BENCHMARKS[name]()
+        results[name] = result
+        print(f"== {name}")
+        for scenario, values in result.items():
+            summary = ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                                for key, value in values.items())
+            print(f"  {scenario}: {summary}")
+    return results
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run headless recorder/replay benchmarks.")
+    parser.add_argument("names", nargs="*", metavar="NAME", help=f"one of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--json", type=Path, help="write machine-readable results to this file")
+    parser.add_argument("--sizes", help="comma-separated event counts for the persistence benchmark")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")] if args.sizes else None
+
+    results = run(args.names, sizes)
+    if args.json:
+        report = {
+            "meta": {
+                "commit": _git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "pynput_stubbed": PYNPUT_STUBBED,
+                "seed": SEED,
+            },
+            "results": results,
+        }
+        args.json.write_text(json.dumps(report, indent=2, sort_keys=True), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli(sys.argv[1:]))
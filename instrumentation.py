@@ -0,0 +1,198 @@
+"""Opt-in counters, timing histograms and profiling for one recording or replay session.
+
+Call sites hold either an `Instrumentation` or None and test it before
+reading the clock, so a session without instrumentation pays a single
+truth test per hook.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Histogram:
+    """Durations in power-of-two microsecond buckets: bucket i holds [2**(i-1), 2**i) us."""
+
+    bucket_count = 28
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * self.bucket_count
+
+    def observe(self, seconds: float) -> None:
+        if seconds < 0.0:
+            seconds = 0.0
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[min(bucket, self.bucket_count - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound, in seconds, of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bucket, amount in enumerate(self.buckets):
+            seen += amount
+            if seen >= target:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        last = max((idx for idx, amount in enumerate(self.buckets) if amount), default=-1)
+        return {
+            "count": self.count,
+            "total_ms": self.total * 1000.0,
+            "mean_us": (self.total / self.count * 1e6) if self.count else 0.0,
+            "p50_us": self.percentile(0.5) * 1e6,
+            "p95_us": self.percentile(0.95) * 1e6,
+            "p99_us": self.percentile(0.99) * 1e6,
+            "max_us": self.max * 1e6,
+            "buckets_us": {f"<{1 << idx}": self.buckets[idx] for idx in range(last + 1) if self.buckets[idx]},
+        }
+
+
+class Instrumentation:
+    """Metrics for one session; safe to update from listener, replay and Tk threads."""
+
+    def __init__(self, session: str, profile_cpu: bool = False, trace_memory: bool = False):
+        self.session = session
+        self.profile_cpu = profile_cpu
+        self.trace_memory = trace_memory
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started_at = None
+        self.stopped_at = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profilers = []
+        self._started_tracemalloc = False
+        self._memory_top = []
+        self._memory_peak = 0
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge_max(self, name: str, value) -> None:
+        with self._lock:
+            if value > self.gauges.get(name, value - 1):
+                self.gauges[name] = value
+
+    @contextmanager
+    def profile_thread(self):
+        """Runs the block under this thread's cProfile profiler when CPU profiling is on."""
+        profiler = None
+        if self.profile_cpu and self.stopped_at is None:
+            profiler = getattr(self._local, "profiler", None)
+            if profiler is None:
+                profiler = cProfile.Profile()
+                self._local.profiler = profiler
+                with self._lock:
+                    self._profilers.append(profiler)
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this thread.
+                profiler = None
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._started_tracemalloc = True
+
+    def stop(self) -> None:
+        if self.stopped_at is not None:
+            return
+        self.stopped_at = time.perf_counter()
+        if self._started_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            self._memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+            self._memory_top = [
+                {"location": str(stat.traceback[0]), "kib": stat.size / 1024.0, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:25]
+            ]
+
+    def report(self) -> dict:
+        with self._lock:
+            histograms = {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())}
+            counters = dict(sorted(self.counters.items()))
+            gauges = dict(sorted(self.gauges.items()))
+        duration = None
+        if self.started_at is not None:
+            duration = (self.stopped_at or time.perf_counter()) - self.started_at
+        report = {
+            "session": self.session,
+            "written_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_s": duration,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+        if self.trace_memory:
+            report["memory"] = {"peak_kib": self._memory_peak / 1024.0, "top": self._memory_top}
+        return report
+
+    def profile_text(self, limit: int = 40) -> str:
+        with self._lock:
+            profilers = list(self._profilers)
+        if not profilers:
+            return ""
+        stream = io.StringIO()
+        stats = pstats.Stats(profilers[0], stream=stream)
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, path: Path) -> list:
+        """Writes the JSON report to `path` (plus a cProfile listing next to it); returns the paths."""
+        path = Path(path)
+        path.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+        written = [path]
+        profile = self.profile_text()
+        if profile:
+            profile_path = path.with_name(f"{path.stem}_profile.txt")
+            profile_path.write_text(profile, encoding="utf-8")
+            written.append(profile_path)
+        return written
+
+    def summary(self) -> str:
+        parts = []
+        with self._lock:
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                parts.append(
+                    f"{name}(n={histogram.count}, p95={histogram.percentile(0.95) * 1e6:.0f}us, "
+                    f"max={histogram.max * 1e6:.0f}us)"
+                )
+        return " ".join(parts)
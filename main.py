@@ -1,5 +1,7 @@
-import json
+import argparse
+import bisect
 import math
+import queue
 import sys
 import threading
 import time
@@ -9,6 +11,23 @@ from tkinter import messagebox
 
 from pynput import keyboard, mouse
 
+from instrumentation import Instrumentation
+from recording_archive import ARCHIVE_SUFFIX, ArchiveError, save_archive
+from replay_trace import FLAG_GUARD_WAITED, FLAG_PREFETCHED, TRACE_SUFFIX, TraceWriter
+from screen_layout import ScreenLayout, remap_points
+import x11_backend
+from recording_schema import (
+    SCHEMA_VERSION,
+    ClickRecord,
+    CompiledRecording,
+    EventRecord,
+    SchemaError,
+    WindowContextTable,
+    compile_events,
+    read_recording_file,
+    release_pressed,
+)
+
 
 if sys.platform == "win32":
     import ctypes
@@ -46,9 +65,22 @@ def get_app_data_dir() -> Path:
     return app_dir
 
 
+def get_x11_display():
+    if not sys.platform.startswith("linux"):
+        return None
+    return x11_backend.default_display()
+
+
+def native_context_available() -> bool:
+    return sys.platform == "win32" or get_x11_display() is not None
+
+
 def get_foreground_window_context():
     if sys.platform != "win32":
-        return {"title": "", "class": ""}
+        x_display = get_x11_display()
+        if x_display is None:
+            return {"title": "", "class": ""}
+        return x_display.active_window_context()
 
     user32 = ctypes.windll.user32
     hwnd = user32.GetForegroundWindow()
@@ -70,7 +102,10 @@ def get_foreground_window_context():
 
 def get_screen_pixel_rgb(x: int, y: int):
     if sys.platform != "win32":
-        return None
+        x_display = get_x11_display()
+        if x_display is None:
+            return None
+        return x_display.pixel_rgb(x, y)
 
     user32 = ctypes.windll.user32
     gdi32 = ctypes.windll.gdi32
@@ -89,6 +124,35 @@ def get_screen_pixel_rgb(x: int, y: int):
         user32.ReleaseDC(0, hdc)
 
 
+def get_screen_layout(root: tk.Tk = None):
+    """Virtual-screen rectangle and DPI in the same pixel space as recorded coordinates."""
+    if sys.platform == "win32":
+        user32 = ctypes.windll.user32
+        try:
+            dpi = user32.GetDpiForSystem()
+        except AttributeError:
+            # Windows 8.1 and older.
+            hdc = user32.GetDC(0)
+            dpi = ctypes.windll.gdi32.GetDeviceCaps(hdc, LOGPIXELSX) if hdc else 96
+            if hdc:
+                user32.ReleaseDC(0, hdc)
+        return ScreenLayout(
+            user32.GetSystemMetrics(SM_XVIRTUALSCREEN),
+            user32.GetSystemMetrics(SM_YVIRTUALSCREEN),
+            user32.GetSystemMetrics(SM_CXVIRTUALSCREEN),
+            user32.GetSystemMetrics(SM_CYVIRTUALSCREEN),
+            dpi,
+        )
+
+    x_display = get_x11_display()
+    if x_display is not None:
+        width, height = x_display.screen_size()
+        return ScreenLayout(0, 0, width, height, x_display.dpi())
+    if root is not None:
+        return ScreenLayout(0, 0, root.winfo_screenwidth(), root.winfo_screenheight(), round(root.winfo_fpixels("1i")))
+    return None
+
+
 if sys.platform == "win32":
     ULONG_PTR_TYPE = getattr(wintypes, "ULONG_PTR", ctypes.c_size_t)
     LRESULT_TYPE = getattr(wintypes, "LRESULT", ctypes.c_ssize_t)
@@ -98,6 +162,11 @@ if sys.platform == "win32":
     MOUSEEVENTF_HWHEEL = 0x01000
     WHEEL_DELTA = 120
     VK_ESCAPE = 0x1B
+    SM_XVIRTUALSCREEN = 76
+    SM_YVIRTUALSCREEN = 77
+    SM_CXVIRTUALSCREEN = 78
+    SM_CYVIRTUALSCREEN = 79
+    LOGPIXELSX = 88
 
     class WindowsWheelHook:
         WH_MOUSE_LL = 14
@@ -184,11 +253,1143 @@ if sys.platform == "win32":
             self._thread_id = None
 
 
+GUARDED_EVENT_TYPES = ("click", "scroll", "key")
+# Special keys that turn plain characters into shortcuts; typing under them is never batched.
+CHORD_MODIFIERS = frozenset(
+    ("ctrl", "ctrl_l", "ctrl_r", "alt", "alt_l", "alt_r", "alt_gr", "cmd", "cmd_l", "cmd_r")
+)
+
+WAIT_READY = "ready"
+WAIT_STOPPED = "stopped"
+WAIT_TIMEOUT = "timeout"
+
+
+class BackoffPolicy:
+    """Poll interval schedule: start fast, grow geometrically, never exceed the cap."""
+
+    def __init__(
+        self,
+        initial_interval: float = 0.002,
+        multiplier: float = 1.5,
+        max_interval: float = 0.1,
+    ):
+        self.initial_interval = max(0.0005, float(initial_interval))
+        self.multiplier = max(1.0, float(multiplier))
+        self.max_interval = max(self.initial_interval, float(max_interval))
+
+    def next_interval(self, interval: float) -> float:
+        return min(interval * self.multiplier, self.max_interval)
+
+
+class GuardWaitStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.waits = 0
+        self.polls = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.name}(waits={self.waits}, polls={self.polls}, timeouts={self.timeouts}, "
+            f"wait={self.wait_seconds:.3f}s, cpu={self.cpu_seconds:.3f}s)"
+        )
+
+
+def poll_until(
+    check,
+    timeout_seconds: float,
+    cancel_token,
+    policy: BackoffPolicy = None,
+    stats: GuardWaitStats = None,
+) -> str:
+    """Poll `check` until it returns True, the timeout expires or a stop is requested.
+
+    Sleeps block on the cancellation token, so cancelling ends the wait
+    immediately instead of after the current poll interval.
+    """
+    policy = policy or BackoffPolicy()
+    started_at = time.perf_counter()
+    cpu_started_at = time.thread_time()
+    deadline = started_at + timeout_seconds
+    interval = policy.initial_interval
+    polls = 0
+    outcome = WAIT_TIMEOUT
+    while True:
+        if cancel_token.is_cancelled():
+            outcome = WAIT_STOPPED
+            break
+
+        polls += 1
+        if check():
+            outcome = WAIT_READY
+            break
+
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            break
+        if cancel_token.wait(min(interval, remaining)):
+            outcome = WAIT_STOPPED
+            break
+        interval = policy.next_interval(interval)
+
+    if stats is not None:
+        stats.waits += 1
+        stats.polls += polls
+        stats.wait_seconds += time.perf_counter() - started_at
+        stats.cpu_seconds += time.thread_time() - cpu_started_at
+        if outcome == WAIT_TIMEOUT:
+            stats.timeouts += 1
+    return outcome
+
+
+class GuardPrefetcher:
+    """Evaluates guards of upcoming events while earlier events are replayed.
+
+    A satisfied guard is cached with the time it was observed; the replay
+    thread accepts the cached result only while it is younger than
+    `validity_seconds` and newer than the latest injected click, scroll or
+    key, otherwise it falls back to the normal wait. Near the end of a loop
+    that is followed by another, the lookahead wraps around to the first
+    guarded events of the next loop.
+    """
+
+    def __init__(
+        self,
+        records,
+        guard_check,
+        has_guard=None,
+        lookahead: int = 4,
+        validity_seconds: float = 0.15,
+        poll_interval: float = 0.01,
+    ):
+        self.records = records
+        self.guard_check = guard_check
+        self.lookahead = max(1, int(lookahead))
+        self.validity_seconds = float(validity_seconds)
+        self.poll_interval = float(poll_interval)
+        # Events without a usable guard are never prefetched or counted as hits.
+        self.guarded_indices = [
+            idx
+            for idx, record in enumerate(records)
+            if record.type in GUARDED_EVENT_TYPES and (has_guard is None or has_guard(record))
+        ]
+        self.guarded = frozenset(self.guarded_indices)
+        self.loop_duration = records[-1].time if records else 0.0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._satisfied_at = {}
+        self._next_loop_satisfied = {}
+        self._cursor = 0
+        self._replay_start = None
+        self._wrap = False
+        self._injected_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def begin_loop(self, replay_start: float, has_next_loop: bool = False) -> None:
+        with self._lock:
+            # Results gathered during the previous loop's tail stay valid for this loop.
+            self._satisfied_at = self._next_loop_satisfied
+            self._next_loop_satisfied = {}
+            self._cursor = 0
+            self._replay_start = replay_start
+            self._wrap = has_next_loop
+
+    def advance(self, event_index: int) -> None:
+        self._cursor = event_index
+
+    def note_injection(self, injected_at: float) -> None:
+        """Results sampled before `injected_at` may predate the screen change it caused."""
+        self._injected_at = injected_at
+
+    def consume(self, event_index: int) -> bool:
+        with self._lock:
+            satisfied_at = self._satisfied_at.pop(event_index, None)
+        if (
+            satisfied_at is not None
+            and satisfied_at >= self._injected_at
+            and (time.perf_counter() - satisfied_at) <= self.validity_seconds
+        ):
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return (self.hits / total) if total else 0.0
+
+    def _upcoming(self):
+        """Returns (event_index, next_loop) pairs for the guards to evaluate next."""
+        start = bisect.bisect_left(self.guarded_indices, self._cursor)
+        upcoming = [(event_index, False) for event_index in self.guarded_indices[start:start + self.lookahead]]
+        if self._wrap and len(upcoming) < self.lookahead:
+            wrapped = self.guarded_indices[:self.lookahead - len(upcoming)]
+            upcoming.extend((event_index, True) for event_index in wrapped)
+        return upcoming
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            replay_start = self._replay_start
+            if replay_start is not None:
+                for event_index, next_loop in self._upcoming():
+                    with self._lock:
+                        results = self._next_loop_satisfied if next_loop else self._satisfied_at
+                    satisfied_at = results.get(event_index)
+                    now = time.perf_counter()
+                    if (
+                        satisfied_at is not None
+                        and satisfied_at >= self._injected_at
+                        and (now - satisfied_at) < self.validity_seconds / 2
+                    ):
+                        continue
+                    record = self.records[event_index]
+                    remaining = record.time - (now - replay_start)
+                    if next_loop:
+                        remaining += self.loop_duration
+                    # Only look at guards whose deadline is close enough that a
+                    # positive result will still be valid when the event runs.
+                    if remaining > self.validity_seconds:
+                        break
+                    # Stamped with the start of the check, so an injection
+                    # that lands while it runs invalidates the result.
+                    sampled_at = time.perf_counter()
+                    if self.guard_check(record):
+                        with self._lock:
+                            if next_loop or event_index >= self._cursor:
+                                results[event_index] = sampled_at
+            self._stop.wait(self.poll_interval)
+
+
+def capture_window_context():
+    context = get_foreground_window_context()
+    title = str(context.get("title", "")).strip()
+    class_name = str(context.get("class", "")).strip()
+    return {"title": title, "class": class_name}
+
+
+def is_escape_pressed_now() -> bool:
+    if sys.platform != "win32":
+        x_display = get_x11_display()
+        return x_display is not None and x_display.is_key_down(x11_backend.ESCAPE_KEYSYM)
+    return bool(ctypes.windll.user32.GetAsyncKeyState(VK_ESCAPE) & 0x8000)
+
+
+class CancellationToken:
+    """Stop signal shared by every wait of a replay session."""
+
+    # Event.wait() is only as precise as the OS timer, so the last few
+    # milliseconds before a deadline are slept in short slices instead.
+    precision_window = 0.004
+    precision_slice = 0.001
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = ""
+        self.cancelled_at = None
+
+    def cancel(self, reason: str = "Stopped by Esc") -> None:
+        if self._event.is_set():
+            return
+        self.reason = reason
+        self.cancelled_at = time.perf_counter()
+        self._event.set()
+
+    def reset(self) -> None:
+        self._event.clear()
+        self.reason = ""
+        self.cancelled_at = None
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float) -> bool:
+        return self._event.wait(timeout)
+
+    def sleep_until(self, deadline: float) -> bool:
+        """Block until the perf_counter deadline; returns True if cancelled first."""
+        event = self._event
+        remaining = deadline - time.perf_counter()
+        if remaining > self.precision_window:
+            if event.wait(remaining - self.precision_window):
+                return True
+        while True:
+            if event.is_set():
+                return True
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, self.precision_slice))
+
+
+class EscapeWatcher:
+    """Samples the physical Esc key at a fixed rate and cancels the token."""
+
+    def __init__(self, cancel_token: CancellationToken, sample_interval: float = 0.01):
+        self.cancel_token = cancel_token
+        self.sample_interval = float(sample_interval)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if not native_context_available():
+            # The pynput control listener reports Esc on other platforms.
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set() and not self.cancel_token.is_cancelled():
+            if is_escape_pressed_now():
+                self.cancel_token.cancel("Stopped by Esc")
+                return
+            self._stop.wait(self.sample_interval)
+
+
+class ReplayOptions:
+    def __init__(
+        self,
+        replay_count: int = 1,
+        smart_enabled: bool = False,
+        smart_wait_timeout: float = 0.0,
+        pixel_guard_enabled: bool = False,
+        pixel_tolerance: int = 0,
+        exact_key_timing: bool = False,
+        overlap_loops: bool = False,
+    ):
+        self.replay_count = int(replay_count)
+        self.smart_enabled = bool(smart_enabled)
+        self.smart_wait_timeout = float(smart_wait_timeout)
+        self.pixel_guard_enabled = bool(pixel_guard_enabled)
+        self.pixel_tolerance = int(pixel_tolerance)
+        # Replays typed text key by key instead of as one bulk injection.
+        self.exact_key_timing = bool(exact_key_timing)
+        # Keeps one timeline across loops and lets the end-of-loop release and
+        # cursor reset go out with the next loop's first events.
+        self.overlap_loops = bool(overlap_loops)
+
+    def describe(self) -> str:
+        return (
+            f"loops={self.replay_count}, smart={self.smart_enabled}, "
+            f"smart_wait={self.smart_wait_timeout}, pixel_guard={self.pixel_guard_enabled}, "
+            f"pixel_tol={self.pixel_tolerance}, exact_key_timing={self.exact_key_timing}, "
+            f"overlap_loops={self.overlap_loops}"
+        )
+
+
+class ReplayResult:
+    def __init__(self, replay_count: int):
+        self.replay_count = replay_count
+        self.completed_loops = 0
+        self.scroll_events = 0
+        self.key_events = 0
+        self.stopped = False
+        self.stop_reason = ""
+        # Seconds from the stop request until the last injected event and
+        # until the replay loop exited; None when replay was not cancelled.
+        self.stop_latency = None
+        self.exit_latency = None
+        # Time between one loop's last event and the next loop's start, and
+        # how far loop starts slipped behind the back-to-back schedule.
+        self.loop_boundaries = 0
+        self.loop_boundary_total = 0.0
+        self.loop_boundary_max = 0.0
+        self.schedule_slip = 0.0
+
+    def boundary_summary(self) -> str:
+        mean = self.loop_boundary_total / self.loop_boundaries if self.loop_boundaries else 0.0
+        return (
+            f"(count={self.loop_boundaries}, mean={mean * 1e6:.0f}us, "
+            f"max={self.loop_boundary_max * 1e6:.0f}us, schedule_slip={self.schedule_slip * 1000:.1f}ms)"
+        )
+
+
+class ReplayStep:
+    """A compiled record bound to pynput objects so the injector only waits and injects."""
+
+    __slots__ = ("index", "type", "time", "record", "x", "y", "button", "key", "text", "count")
+
+    def __init__(self, record: EventRecord, step_type: str = None):
+        self.index = record.index
+        self.type = step_type or record.type
+        self.time = record.time
+        self.record = record
+        self.x = 0
+        self.y = 0
+        self.button = None
+        self.key = None
+        self.text = ""
+        self.count = 1
+
+
+LOOP_END = object()
+PRODUCER_FAILED = object()
+
+
+class PipelineStats:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.produced = 0
+        self.producer_stalls = 0
+        self.injector_starvations = 0
+        self.text_runs = 0
+        self.text_keys = 0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def summary(self) -> str:
+        avg_depth = (self.depth_total / self.depth_samples) if self.depth_samples else 0.0
+        return (
+            f"(queue_size={self.queue_size}, produced={self.produced}, "
+            f"producer_stalls={self.producer_stalls}, injector_starved={self.injector_starvations}, "
+            f"avg_depth={avg_depth:.1f}, max_depth={self.max_depth}, "
+            f"text_runs={self.text_runs}, text_keys={self.text_keys})"
+        )
+
+
+class ReplayProgress:
+    """Progress published by the replay thread and sampled by the UI without locks.
+
+    The replay thread is the only writer: after every step it replaces
+    `latest` with a new tuple, so a reader always sees one consistent step.
+    """
+
+    def __init__(self, replay_count: int, events_per_loop: int, loop_duration: float, wait_stats=()):
+        self.replay_count = replay_count
+        self.events_per_loop = events_per_loop
+        self.loop_duration = loop_duration
+        self.wait_stats = tuple(wait_stats)
+        self.started_at = time.perf_counter()
+        self.events_done = 0
+        self.waiting_since = None
+        # (loop_number, event_index, event_time, events_done, lateness)
+        self.latest = (1, 0, 0.0, 0, 0.0)
+
+    def publish(self, loop_number: int, event_index: int, event_time: float, count: int, lateness: float) -> None:
+        self.events_done += count
+        self.latest = (loop_number, event_index, event_time, self.events_done, lateness)
+
+    def guard_wait_seconds(self) -> float:
+        waited = sum(stats.wait_seconds for stats in self.wait_stats)
+        waiting_since = self.waiting_since
+        if waiting_since is not None:
+            waited += max(0.0, time.perf_counter() - waiting_since)
+        return waited
+
+    def eta_seconds(self, now: float) -> float:
+        loop_number, _index, event_time, _done, _lateness = self.latest
+        replayed = (loop_number - 1) * self.loop_duration + event_time
+        remaining = self.replay_count * self.loop_duration - replayed
+        if replayed <= 0.0:
+            return remaining
+        # Scale by how far wall time has run ahead of recorded time (guard waits, lateness).
+        return remaining * max(1.0, (now - self.started_at) / replayed)
+
+
+class ReplayEngine:
+    """Replays a compiled recording through pynput controllers without any UI."""
+
+    def __init__(
+        self,
+        recording,
+        options: ReplayOptions,
+        mouse_controller,
+        keyboard_controller,
+        cancel_token: CancellationToken = None,
+        log=None,
+        on_loop_started=None,
+        metrics: Instrumentation = None,
+        trace: TraceWriter = None,
+        screen: ScreenLayout = None,
+    ):
+        # Raw event iterables (e.g. streamed from an archive) are compiled here.
+        if not isinstance(recording, CompiledRecording):
+            recording = compile_events(recording)
+        self.recording = recording
+        self.records = recording.records
+        self.window_table = recording.window_table
+        self.options = options
+        self.mouse_controller = mouse_controller
+        self.keyboard_controller = keyboard_controller
+        self.cancel_token = cancel_token or CancellationToken()
+        self.log = log or (lambda _message: None)
+        self.on_loop_started = on_loop_started
+        self.metrics = metrics
+        self.trace = trace
+        # Target layout; coordinates are remapped once here, not per event.
+        self.screen = screen
+        self.points = remap_points(recording, screen)
+        self.guard_prefetch_lookahead = 4
+        self.guard_prefetch_validity = 0.15  # max age of a prefetched guard result
+        self.window_poll_policy = BackoffPolicy(initial_interval=0.002, multiplier=1.5, max_interval=0.1)
+        self.pixel_poll_policy = BackoffPolicy(initial_interval=0.002, multiplier=1.5, max_interval=0.06)
+        self.escape_sample_interval = 0.01
+        self.pipeline_queue_size = 256
+        # With overlap_loops, a loop that starts at most this late stays on the previous timeline.
+        self.loop_catchup_limit = 0.005
+        self.pipeline_stats = None
+        self.min_text_run_chars = 2
+        self.window_wait_stats = GuardWaitStats("window")
+        self.pixel_wait_stats = GuardWaitStats("pixel")
+        self.last_injection_at = None
+        self.progress = None
+        self.producer_error = None
+        self._helper_stops = []
+        self._note_flush_to = None
+        self._key_cache = {}
+        # On Windows, wheel events for the pynput controller go straight to
+        # mouse_event; other controllers (XTest, dry runs) receive them.
+        self._native_wheel = sys.platform == "win32" and isinstance(mouse_controller, mouse.Controller)
+        # Controllers that buffer injections (XTest) expose flush(); it runs
+        # once per scheduler tick instead of after every event.
+        self._flushers = []
+        for controller in (mouse_controller, keyboard_controller):
+            flush = getattr(controller, "flush", None)
+            if flush is not None and flush not in self._flushers:
+                self._flushers.append(flush)
+
+    def _point(self, record: EventRecord):
+        if self.points is None:
+            return record.x, record.y
+        xs, ys = self.points
+        return xs[record.index], ys[record.index]
+
+    def _wait_for_event_window_context(
+        self,
+        record: EventRecord,
+        timeout_seconds: float,
+        smart_enabled: bool,
+        stats: GuardWaitStats = None,
+    ):
+        context_id = record.window_id
+        if not smart_enabled or context_id is None:
+            return True, ""
+
+        outcome = poll_until(
+            lambda: self.window_table.matches(context_id, capture_window_context()),
+            timeout_seconds,
+            self.cancel_token,
+            policy=self.window_poll_policy,
+            stats=stats,
+        )
+        if outcome == WAIT_READY:
+            return True, ""
+        if outcome == WAIT_STOPPED:
+            return False, self.cancel_token.reason
+        expected_title = self.window_table.contexts[context_id]["title"].strip()
+        if expected_title:
+            return False, f"Smart wait timeout on window: {expected_title[:60]}"
+        return False, "Smart wait timeout (window context mismatch)"
+
+    def _wait_for_click_pixel_context(
+        self,
+        record: ClickRecord,
+        timeout_seconds: float,
+        pixel_guard_enabled: bool,
+        tolerance: int,
+        stats: GuardWaitStats = None,
+    ):
+        if not pixel_guard_enabled or not record.pressed or record.pixel is None:
+            return True, ""
+
+        x, y = self._point(record)
+        target_r, target_g, target_b = record.pixel
+
+        def pixel_matches():
+            current = get_screen_pixel_rgb(x, y)
+            if current is None:
+                return False
+            dr = abs(current[0] - target_r)
+            dg = abs(current[1] - target_g)
+            db = abs(current[2] - target_b)
+            return dr <= tolerance and dg <= tolerance and db <= tolerance
+
+        outcome = poll_until(
+            pixel_matches,
+            timeout_seconds,
+            self.cancel_token,
+            policy=self.pixel_poll_policy,
+            stats=stats,
+        )
+        if outcome == WAIT_READY:
+            return True, ""
+        if outcome == WAIT_STOPPED:
+            return False, self.cancel_token.reason
+        return False, f"Pixel guard timeout at ({x},{y})"
+
+    def _has_usable_guard(self, record: EventRecord, smart_enabled: bool, pixel_guard_enabled: bool) -> bool:
+        if smart_enabled and record.window_id is not None:
+            return True
+        return pixel_guard_enabled and record.type == "click" and record.pressed and record.pixel is not None
+
+    def _event_guards_satisfied(
+        self,
+        record: EventRecord,
+        smart_enabled: bool,
+        pixel_guard_enabled: bool,
+        tolerance: int,
+    ) -> bool:
+        # Single non-blocking evaluation of every guard that applies to the record.
+        if smart_enabled and record.window_id is not None:
+            if not self.window_table.matches(record.window_id, capture_window_context()):
+                return False
+        if pixel_guard_enabled and record.type == "click" and record.pressed and record.pixel is not None:
+            current = get_screen_pixel_rgb(*self._point(record))
+            if current is None:
+                return False
+            if abs(current[0] - record.pixel[0]) > tolerance:
+                return False
+            if abs(current[1] - record.pixel[1]) > tolerance:
+                return False
+            if abs(current[2] - record.pixel[2]) > tolerance:
+                return False
+        return True
+
+    def _deserialize_key(self, kind: str, value):
+        if kind == "special":
+            return getattr(keyboard.Key, value, None)
+        try:
+            if kind == "char":
+                return keyboard.KeyCode.from_char(value)
+            return keyboard.KeyCode.from_vk(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _flush_injections(self) -> None:
+        for flush in self._flushers:
+            flush()
+        prefetcher = self._note_flush_to
+        if prefetcher is not None:
+            # Buffered input only reaches the screen now.
+            self._note_flush_to = None
+            prefetcher.note_injection(time.perf_counter())
+
+    def _emit_scroll(self, step_x: int, step_y: int) -> None:
+        if step_x == 0 and step_y == 0:
+            return
+
+        if self._native_wheel:
+            user32 = ctypes.windll.user32
+            if step_y != 0:
+                user32.mouse_event(
+                    MOUSEEVENTF_WHEEL,
+                    0,
+                    0,
+                    int(step_y * WHEEL_DELTA),
+                    0,
+                )
+            if step_x != 0:
+                user32.mouse_event(
+                    MOUSEEVENTF_HWHEEL,
+                    0,
+                    0,
+                    int(step_x * WHEEL_DELTA),
+                    0,
+                )
+            return
+
+        self.mouse_controller.scroll(step_x, step_y)
+
+    def _bind_record(self, record: EventRecord) -> ReplayStep:
+        step = ReplayStep(record)
+        if record.type != "key":
+            step.x, step.y = self._point(record)
+        if record.type == "click":
+            step.button = getattr(mouse.Button, record.button, None)
+        elif record.type == "key":
+            cache_key = (record.key_kind, record.key_value)
+            if cache_key not in self._key_cache:
+                self._key_cache[cache_key] = self._deserialize_key(record.key_kind, record.key_value)
+            step.key = self._key_cache[cache_key]
+        return step
+
+    def _plain_char_key(self, record: EventRecord):
+        if record.type != "key" or record.key_kind != "char":
+            return None
+        value = record.key_value
+        if len(value) != 1 or not value.isprintable():
+            return None
+        return value
+
+    def _find_text_run(self, records, start: int):
+        """Returns (end, text, scan_end) for the longest balanced run of plain typing at `start`.
+
+        `scan_end` is the first record the scan did not accept; end == start means no run.
+        """
+        window_id = records[start].window_id
+        open_presses = {}
+        typed = []
+        run_end = start
+        run_text = ""
+        scan_end = len(records)
+        for index in range(start, len(records)):
+            record = records[index]
+            char = self._plain_char_key(record)
+            if char is None or record.window_id != window_id:
+                scan_end = index
+                break
+            if record.action == "press":
+                open_presses[char] = open_presses.get(char, 0) + 1
+                typed.append(char)
+            elif open_presses.get(char):
+                open_presses[char] -= 1
+                if not open_presses[char]:
+                    del open_presses[char]
+            else:
+                # Release of a key pressed before the run started.
+                scan_end = index
+                break
+            if not open_presses:
+                run_end = index + 1
+                run_text = "".join(typed)
+        if len(run_text) < self.min_text_run_chars:
+            return start, "", scan_end
+        return run_end, run_text, scan_end
+
+    def _compile_steps(self, records, stats: PipelineStats):
+        index = 0
+        record_count = len(records)
+        held_modifiers = set()
+        # Records before this index belong to a scan that found no run, so
+        # scanning again from each of them would be quadratic.
+        no_run_before = 0
+        while index < record_count:
+            record = records[index]
+            if record.type == "key" and record.key_kind == "special" and record.key_value in CHORD_MODIFIERS:
+                if record.action == "press":
+                    held_modifiers.add(record.key_value)
+                else:
+                    held_modifiers.discard(record.key_value)
+            if (
+                not self.options.exact_key_timing
+                and not held_modifiers
+                and index >= no_run_before
+                and self._plain_char_key(record) is not None
+            ):
+                run_end, text, scan_end = self._find_text_run(records, index)
+                if run_end == index:
+                    no_run_before = scan_end
+                if run_end > index:
+                    step = ReplayStep(record, "text")
+                    step.text = text
+                    step.count = run_end - index
+                    stats.text_runs += 1
+                    stats.text_keys += step.count
+                    yield step
+                    index = run_end
+                    continue
+            yield self._bind_record(record)
+            index += 1
+
+    def _put_step(self, steps: queue.Queue, step, stats: PipelineStats, stop_event: threading.Event) -> bool:
+        try:
+            steps.put_nowait(step)
+            stats.produced += 1
+            return True
+        except queue.Full:
+            stats.producer_stalls += 1
+        while not stop_event.is_set():
+            try:
+                steps.put(step, timeout=0.05)
+                stats.produced += 1
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, records, steps: queue.Queue, stats: PipelineStats, stop_event: threading.Event) -> None:
+        try:
+            self._produce_steps(records, steps, stats, stop_event)
+        except Exception as exc:
+            # Without this the injector would wait for steps that never come.
+            self.producer_error = f"{type(exc).__name__}: {exc}"
+            self.log(f"Replay producer failed: {self.producer_error}")
+            self._put_step(steps, PRODUCER_FAILED, stats, stop_event)
+
+    def _produce_steps(self, records, steps: queue.Queue, stats: PipelineStats, stop_event: threading.Event) -> None:
+        # Records are bound once during the first loop; later loops reuse the steps.
+        bound = []
+        for loop_idx in range(self.options.replay_count):
+            source = self._compile_steps(records, stats) if loop_idx == 0 else bound
+            for step in source:
+                if loop_idx == 0:
+                    bound.append(step)
+                if not self._put_step(steps, step, stats, stop_event):
+                    return
+            if not self._put_step(steps, LOOP_END, stats, stop_event):
+                return
+
+    def _next_step(self, steps: queue.Queue, stats: PipelineStats):
+        depth = steps.qsize()
+        stats.depth_samples += 1
+        stats.depth_total += depth
+        stats.max_depth = max(stats.max_depth, depth)
+        try:
+            return steps.get_nowait()
+        except queue.Empty:
+            stats.injector_starvations += 1
+        while True:
+            try:
+                return steps.get(timeout=0.01)
+            except queue.Empty:
+                if self.cancel_token.is_cancelled():
+                    return None
+
+    def _profiled(self, func, *args):
+        if self.metrics is None:
+            return func(*args)
+        with self.metrics.profile_thread():
+            return func(*args)
+
+    def run(self) -> ReplayResult:
+        self._helper_stops = []
+        try:
+            return self._profiled(self._replay)
+        except BaseException:
+            # Background helpers would otherwise keep polling after a failed replay.
+            for stop in self._helper_stops:
+                stop()
+            raise
+
+    def _replay(self) -> ReplayResult:
+        options = self.options
+        metrics = self.metrics
+        trace = self.trace
+        token = self.cancel_token
+        result = ReplayResult(options.replay_count)
+        records = self.records
+        if self.points is not None:
+            self.log(f"Coordinates remapped from {self.recording.screen.describe()} to {self.screen.describe()}")
+        watcher = EscapeWatcher(token, self.escape_sample_interval)
+        watcher.start()
+        self._helper_stops.append(watcher.stop)
+        prefetcher = None
+        guards_active = options.smart_enabled or options.pixel_guard_enabled
+        if guards_active:
+            prefetcher = GuardPrefetcher(
+                records,
+                lambda item: self._event_guards_satisfied(
+                    item,
+                    options.smart_enabled,
+                    options.pixel_guard_enabled,
+                    options.pixel_tolerance,
+                ),
+                lambda item: self._has_usable_guard(item, options.smart_enabled, options.pixel_guard_enabled),
+                lookahead=self.guard_prefetch_lookahead,
+                validity_seconds=self.guard_prefetch_validity,
+            )
+            prefetcher.start()
+            self._helper_stops.append(prefetcher.stop)
+        pipeline_stats = PipelineStats(self.pipeline_queue_size)
+        self.pipeline_stats = pipeline_stats
+        progress = ReplayProgress(
+            options.replay_count,
+            len(records),
+            records[-1].time if records else 0.0,
+            (self.window_wait_stats, self.pixel_wait_stats),
+        )
+        self.progress = progress
+        steps = queue.Queue(maxsize=self.pipeline_queue_size)
+        producer_stop = threading.Event()
+        producer = threading.Thread(
+            target=self._profiled,
+            args=(self._produce, records, steps, pipeline_stats, producer_stop),
+            daemon=True,
+        )
+        producer.start()
+        self._helper_stops.append(producer_stop.set)
+        replay_stopped = False
+        replay_stop_reason = ""
+        buffered_injection = bool(self._flushers)
+        unflushed = False
+        overlap = options.overlap_loops
+        pressed_keys = []
+        pressed_buttons = []
+        last_record = records[-1] if records else None
+        loop_span = last_record.time if records else 0.0
+        # When the next loop's first event places the cursor itself, an
+        # overlapped boundary can skip resetting it to the last position.
+        first_positions_cursor = bool(records) and records[0].type != "key"
+        planned_start = None
+        loop_ended_at = None
+
+        for loop_idx in range(options.replay_count):
+            if token.is_cancelled():
+                replay_stopped = True
+                replay_stop_reason = token.reason
+                break
+            if self.on_loop_started:
+                self.on_loop_started(loop_idx + 1)
+
+            has_next_loop = loop_idx + 1 < options.replay_count
+            replay_start = time.perf_counter()
+            if loop_ended_at is not None:
+                boundary = replay_start - loop_ended_at
+                result.loop_boundaries += 1
+                result.loop_boundary_total += boundary
+                result.loop_boundary_max = max(result.loop_boundary_max, boundary)
+                if metrics:
+                    metrics.observe("replay.loop_boundary", boundary)
+            if planned_start is not None:
+                if overlap and replay_start - planned_start <= self.loop_catchup_limit:
+                    # Stay on the previous loop's timeline; the boundary work
+                    # is absorbed by the next loop's first events.
+                    replay_start = planned_start
+                result.schedule_slip += replay_start - planned_start
+            if prefetcher:
+                prefetcher.begin_loop(replay_start, has_next_loop)
+            if trace:
+                trace.loop_started(loop_idx, replay_start)
+            scroll_x_remainder = 0.0
+            scroll_y_remainder = 0.0
+            loop_scroll_events = 0
+            loop_key_events = 0
+
+            while True:
+                step = self._next_step(steps, pipeline_stats)
+                if step is None:
+                    replay_stopped = True
+                    replay_stop_reason = token.reason
+                    break
+                if step is LOOP_END:
+                    loop_ended_at = time.perf_counter()
+                    break
+                if step is PRODUCER_FAILED:
+                    replay_stopped = True
+                    replay_stop_reason = f"Replay failed: {self.producer_error}"
+                    break
+                if prefetcher:
+                    prefetcher.advance(step.index)
+                if unflushed and replay_start + step.time > time.perf_counter():
+                    # Everything due in this tick has been queued; send it before sleeping.
+                    self._flush_injections()
+                    unflushed = False
+                if token.sleep_until(replay_start + step.time):
+                    replay_stopped = True
+                    replay_stop_reason = token.reason
+                    break
+                lateness = time.perf_counter() - (replay_start + step.time)
+                if metrics:
+                    metrics.observe("replay.lateness", lateness)
+
+                etype = step.type
+                record = step.record
+                guards_prefetched = False
+                guard_wait = 0.0
+                # Text steps are indexed by their first key record.
+                guarded = prefetcher is not None and step.index in prefetcher.guarded
+                if guarded:
+                    guards_prefetched = prefetcher.consume(step.index)
+                if metrics and guards_prefetched:
+                    metrics.count("guard.prefetch_hits")
+                if unflushed and guarded and not guards_prefetched:
+                    # Guards must observe the screen after earlier injections landed.
+                    self._flush_injections()
+                    unflushed = False
+                if (etype in GUARDED_EVENT_TYPES or etype == "text") and not guards_prefetched:
+                    wait_started_at = time.perf_counter()
+                    progress.waiting_since = wait_started_at
+                    ready, reason = self._wait_for_event_window_context(
+                        record,
+                        options.smart_wait_timeout,
+                        options.smart_enabled,
+                        self.window_wait_stats,
+                    )
+                    progress.waiting_since = None
+                    window_wait = time.perf_counter() - wait_started_at
+                    guard_wait += window_wait
+                    if metrics:
+                        metrics.observe("guard.window_wait", window_wait)
+                    if not ready:
+                        replay_stopped = True
+                        replay_stop_reason = reason
+                        break
+                if etype == "click" and not guards_prefetched:
+                    wait_started_at = time.perf_counter()
+                    progress.waiting_since = wait_started_at
+                    ready, reason = self._wait_for_click_pixel_context(
+                        record,
+                        options.smart_wait_timeout,
+                        options.pixel_guard_enabled,
+                        options.pixel_tolerance,
+                        self.pixel_wait_stats,
+                    )
+                    progress.waiting_since = None
+                    pixel_wait = time.perf_counter() - wait_started_at
+                    guard_wait += pixel_wait
+                    if metrics:
+                        metrics.observe("guard.pixel_wait", pixel_wait)
+                    if not ready:
+                        replay_stopped = True
+                        replay_stop_reason = reason
+                        break
+
+                inject_started_at = time.perf_counter() if metrics else 0.0
+                if etype == "move":
+                    self.mouse_controller.position = (step.x, step.y)
+                elif etype == "click":
+                    self.mouse_controller.position = (step.x, step.y)
+                    btn = step.button
+                    if btn:
+                        if record.pressed:
+                            self.mouse_controller.press(btn)
+                            pressed_buttons.append(btn)
+                        else:
+                            self.mouse_controller.release(btn)
+                            release_pressed(pressed_buttons, btn)
+                elif etype == "scroll":
+                    loop_scroll_events += 1
+                    self.mouse_controller.position = (step.x, step.y)
+                    scroll_x_remainder += record.dx
+                    scroll_y_remainder += record.dy
+                    scroll_x = math.trunc(scroll_x_remainder)
+                    scroll_y = math.trunc(scroll_y_remainder)
+                    if scroll_x != 0 or scroll_y != 0:
+                        self._emit_scroll(scroll_x, scroll_y)
+                        scroll_x_remainder -= scroll_x
+                        scroll_y_remainder -= scroll_y
+                elif etype == "text":
+                    # One bulk injection and one guard check for a whole typed run.
+                    loop_key_events += step.count
+                    self.keyboard_controller.type(step.text)
+                elif etype == "key":
+                    key_obj = step.key
+                    if key_obj:
+                        loop_key_events += 1
+                        if record.action == "press":
+                            self.keyboard_controller.press(key_obj)
+                            pressed_keys.append(key_obj)
+                        else:
+                            self.keyboard_controller.release(key_obj)
+                            release_pressed(pressed_keys, key_obj)
+                self.last_injection_at = time.perf_counter()
+                if prefetcher and etype != "move":
+                    prefetcher.note_injection(self.last_injection_at)
+                    if buffered_injection:
+                        self._note_flush_to = prefetcher
+                if metrics:
+                    metrics.observe(f"replay.inject.{etype}", self.last_injection_at - inject_started_at)
+                if trace:
+                    trace.add(
+                        loop_idx,
+                        step.index,
+                        etype,
+                        step.time,
+                        self.last_injection_at - replay_start,
+                        guard_wait,
+                        (FLAG_PREFETCHED if guards_prefetched else 0) | (FLAG_GUARD_WAITED if guard_wait else 0),
+                    )
+                progress.publish(loop_idx + 1, step.index, step.time, step.count, lateness)
+                unflushed = buffered_injection
+
+            if replay_stopped and token.is_cancelled():
+                result.exit_latency = time.perf_counter() - token.cancelled_at
+
+            if not replay_stopped:
+                # Flush residual fractional scroll at end so tiny touchpad deltas
+                # still produce a final visible scroll step.
+                final_x = int(round(scroll_x_remainder))
+                final_y = int(round(scroll_y_remainder))
+                if final_x != 0 or final_y != 0:
+                    self._emit_scroll(final_x, final_y)
+
+            # Safety release for any keys/buttons that remained pressed.
+            for key_obj in reversed(pressed_keys):
+                try:
+                    self.keyboard_controller.release(key_obj)
+                except Exception:
+                    pass
+            pressed_keys.clear()
+
+            for btn in reversed(pressed_buttons):
+                try:
+                    self.mouse_controller.release(btn)
+                except Exception:
+                    pass
+            pressed_buttons.clear()
+
+            result.scroll_events += loop_scroll_events
+            result.key_events += loop_key_events
+
+            overlapped = overlap and has_next_loop and not replay_stopped
+            if last_record is not None and not replay_stopped and last_record.type != "key":
+                if not (overlapped and first_positions_cursor):
+                    self.mouse_controller.position = self._point(last_record)
+            if not overlapped:
+                self._flush_injections()
+                unflushed = False
+            # Otherwise buffered releases go out with the next loop's first flush.
+
+            if replay_stopped:
+                break
+
+            result.completed_loops += 1
+            planned_start = replay_start + loop_span
+
+        producer_stop.set()
+        producer.join(timeout=1.0)
+        watcher.stop()
+        result.stopped = replay_stopped
+        result.stop_reason = replay_stop_reason
+        if replay_stopped and token.is_cancelled():
+            if result.exit_latency is None:
+                result.exit_latency = time.perf_counter() - token.cancelled_at
+            last_injection_at = self.last_injection_at or token.cancelled_at
+            result.stop_latency = max(0.0, last_injection_at - token.cancelled_at)
+            self.log(
+                "Stop latency "
+                f"(last_injection=+{result.stop_latency * 1000:.1f}ms, "
+                f"loop_exit=+{result.exit_latency * 1000:.1f}ms)"
+            )
+
+        if result.loop_boundaries:
+            self.log(f"Loop boundaries {result.boundary_summary()} overlap={overlap}")
+        self.log(f"Guard waits {self.window_wait_stats.summary()} {self.pixel_wait_stats.summary()}")
+        self.log(f"Replay pipeline {pipeline_stats.summary()}")
+        self.log(
+            "Window contexts "
+            f"(distinct={len(self.window_table)}, match_calls={self.window_table.match_calls}, "
+            f"cache_hits={self.window_table.match_cache_hits})"
+        )
+        if prefetcher:
+            prefetcher.stop()
+            self.log(
+                "Guard prefetch "
+                f"(hits={prefetcher.hits}, misses={prefetcher.misses}, "
+                f"hit_rate={prefetcher.hit_rate() * 100:.1f}%)"
+            )
+        return result
+
+
 class MouseRecorderApp:
     def __init__(self, root: tk.Tk) -> None:
         self.root = root
         self.root.title("Mouse Recorder")
-        self.root.geometry("420x430")
+        self.root.geometry("420x500")
         self.root.resizable(False, False)
 
         self.is_recording = False
@@ -205,19 +1406,33 @@ class MouseRecorderApp:
         self.mouse_controller = mouse.Controller()
         self.keyboard_controller = keyboard.Controller()
         self.wheel_hook = None
-        self.stop_replay_requested = threading.Event()
+        self.replay_cancel = CancellationToken()
+        self.recording = None
+        self.window_table = WindowContextTable()
         self.last_scroll_time = 0.0
         self.last_scroll_signature = None
+        self.record_screen = None
         self.app_data_dir = get_app_data_dir()
-        self.recording_file = self.app_data_dir / "last_recording.json"
+        self.recording_file = self.app_data_dir / f"last_recording{ARCHIVE_SUFFIX}"
+        self.legacy_recording_file = self.app_data_dir / "last_recording.json"
         self.replay_log_file = self.app_data_dir / "replay_debug.log"
         self.replay_count_var = tk.StringVar(value="1")
         self.smart_replay_var = tk.BooleanVar(value=True)
         self.smart_wait_timeout_var = tk.StringVar(value="8")
         self.click_pixel_guard_var = tk.BooleanVar(value=True)
         self.click_pixel_tolerance_var = tk.StringVar(value="28")
+        self.exact_key_timing_var = tk.BooleanVar(value=False)
+        self.overlap_loops_var = tk.BooleanVar(value=False)
+        self.profile_session_var = tk.BooleanVar(value=False)
+        self.collect_metrics = False
+        self.session_metrics = None
+        self.trace_replays = False
 
         self.status_var = tk.StringVar(value="Ready")
+        self.live_metrics_var = tk.StringVar(value="")
+        self.progress_poll_interval_ms = 250
+        self.progress_poll_due_at = 0.0
+        self.last_progress_sample = None
 
         self._build_ui()
         self._load_last_recording()
@@ -280,6 +1495,15 @@ class MouseRecorderApp:
             font=("Segoe UI", 10),
         )
         self.replay_count_spinbox.pack(side="left")
+        self.overlap_loops_check = tk.Checkbutton(
+            replay_count_row,
+            text="Overlap Loops",
+            variable=self.overlap_loops_var,
+            onvalue=True,
+            offvalue=False,
+            font=("Segoe UI", 10),
+        )
+        self.overlap_loops_check.pack(side="left", padx=(12, 0))
 
         smart_row = tk.Frame(wrapper)
         smart_row.pack(pady=(4, 6))
@@ -337,6 +1561,27 @@ class MouseRecorderApp:
         )
         self.click_pixel_tolerance_spinbox.pack(side="left")
 
+        typing_row = tk.Frame(wrapper)
+        typing_row.pack(pady=(0, 6))
+        self.exact_key_timing_check = tk.Checkbutton(
+            typing_row,
+            text="Exact Key Timing",
+            variable=self.exact_key_timing_var,
+            onvalue=True,
+            offvalue=False,
+            font=("Segoe UI", 10),
+        )
+        self.exact_key_timing_check.pack(side="left", padx=(0, 12))
+        self.profile_session_check = tk.Checkbutton(
+            typing_row,
+            text="Profile Session",
+            variable=self.profile_session_var,
+            onvalue=True,
+            offvalue=False,
+            font=("Segoe UI", 10),
+        )
+        self.profile_session_check.pack(side="left")
+
         status_label = tk.Label(
             wrapper,
             textvariable=self.status_var,
@@ -345,6 +1590,15 @@ class MouseRecorderApp:
         )
         status_label.pack(pady=(14, 4))
 
+        live_metrics_label = tk.Label(
+            wrapper,
+            textvariable=self.live_metrics_var,
+            font=("Consolas", 9),
+            fg="#444444",
+            justify="left",
+        )
+        live_metrics_label.pack(pady=(0, 4))
+
         hint = tk.Label(
             wrapper,
             text="Press Esc to stop recording or replay",
@@ -366,6 +1620,9 @@ class MouseRecorderApp:
             self.smart_wait_spinbox.config(state="disabled")
             self.click_pixel_guard_check.config(state="disabled")
             self.click_pixel_tolerance_spinbox.config(state="disabled")
+            self.exact_key_timing_check.config(state="disabled")
+            self.overlap_loops_check.config(state="disabled")
+            self.profile_session_check.config(state="disabled")
         else:
             self.start_btn.config(state="normal")
             self.stop_btn.config(state="disabled")
@@ -376,48 +1633,27 @@ class MouseRecorderApp:
                 self.smart_wait_spinbox.config(state="normal")
                 self.click_pixel_guard_check.config(state="normal")
                 self.click_pixel_tolerance_spinbox.config(state="normal")
+                self.exact_key_timing_check.config(state="normal")
+                self.overlap_loops_check.config(state="normal")
+                self.profile_session_check.config(state="normal")
 
     def _timestamp(self) -> float:
         return time.perf_counter() - self.record_start_time
 
-    def _normalize_window_text(self, text: str) -> str:
-        return " ".join(text.lower().split())
-
-    def _capture_window_context(self):
-        context = get_foreground_window_context()
-        title = str(context.get("title", "")).strip()
-        class_name = str(context.get("class", "")).strip()
-        return {"title": title, "class": class_name}
-
     def _attach_window_context(self, event: dict) -> dict:
-        if sys.platform != "win32":
+        if not native_context_available():
             return event
-        context = self._capture_window_context()
+        metrics = self.session_metrics
+        started_at = time.perf_counter() if metrics else 0.0
+        context = capture_window_context()
         if context.get("title") or context.get("class"):
-            event["window"] = context
+            event["window"] = self.window_table.shared(context)
+        if metrics:
+            metrics.observe("enrich.window", time.perf_counter() - started_at)
         return event
 
-    def _window_context_matches(self, expected: dict, current: dict) -> bool:
-        expected_class = self._normalize_window_text(str(expected.get("class", "")))
-        current_class = self._normalize_window_text(str(current.get("class", "")))
-        if expected_class and current_class and expected_class != current_class:
-            return False
-
-        expected_title = self._normalize_window_text(str(expected.get("title", "")))
-        current_title = self._normalize_window_text(str(current.get("title", "")))
-        if expected_title:
-            if not current_title:
-                return False
-            if expected_title == current_title:
-                return True
-            if expected_title in current_title or current_title in expected_title:
-                return True
-            return False
-
-        return True
-
     def _smart_replay_enabled(self) -> bool:
-        return bool(self.smart_replay_var.get()) and sys.platform == "win32"
+        return bool(self.smart_replay_var.get()) and native_context_available()
 
     def _get_smart_wait_timeout(self):
         raw = self.smart_wait_timeout_var.get().strip()
@@ -436,7 +1672,7 @@ class MouseRecorderApp:
         return timeout_seconds
 
     def _click_pixel_guard_enabled(self) -> bool:
-        return bool(self.click_pixel_guard_var.get()) and sys.platform == "win32"
+        return bool(self.click_pixel_guard_var.get()) and native_context_available()
 
     def _get_click_pixel_tolerance(self):
         raw = self.click_pixel_tolerance_var.get().strip()
@@ -455,58 +1691,22 @@ class MouseRecorderApp:
         return tolerance
 
     def _attach_click_pixel_context(self, event: dict) -> dict:
-        if sys.platform != "win32":
+        if not native_context_available():
             return event
         if event.get("type") != "click" or not event.get("pressed"):
             return event
         x = int(event.get("x", 0))
         y = int(event.get("y", 0))
+        metrics = self.session_metrics
+        started_at = time.perf_counter() if metrics else 0.0
         color = get_screen_pixel_rgb(x, y)
+        if metrics:
+            metrics.observe("enrich.pixel", time.perf_counter() - started_at)
         if color is None:
             return event
         event["pixel"] = {"r": color[0], "g": color[1], "b": color[2]}
         return event
 
-    def _wait_for_click_pixel_context(
-        self,
-        event: dict,
-        timeout_seconds: float,
-        pixel_guard_enabled: bool,
-        tolerance: int,
-    ):
-        if not pixel_guard_enabled:
-            return True, ""
-        if event.get("type") != "click" or not event.get("pressed"):
-            return True, ""
-
-        expected_pixel = event.get("pixel")
-        if not isinstance(expected_pixel, dict):
-            return True, ""
-
-        x = int(event.get("x", 0))
-        y = int(event.get("y", 0))
-        target_r = int(expected_pixel.get("r", 0))
-        target_g = int(expected_pixel.get("g", 0))
-        target_b = int(expected_pixel.get("b", 0))
-
-        started_at = time.perf_counter()
-        while True:
-            if self._should_stop_replay():
-                return False, "Stopped by Esc"
-
-            current = get_screen_pixel_rgb(x, y)
-            if current is not None:
-                dr = abs(current[0] - target_r)
-                dg = abs(current[1] - target_g)
-                db = abs(current[2] - target_b)
-                if dr <= tolerance and dg <= tolerance and db <= tolerance:
-                    return True, ""
-
-            if (time.perf_counter() - started_at) >= timeout_seconds:
-                return False, f"Pixel guard timeout at ({x},{y})"
-
-            time.sleep(0.03)
-
     def _log_replay(self, message: str) -> None:
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
         line = f"[{timestamp}] {message}\n"
@@ -516,35 +1716,68 @@ class MouseRecorderApp:
         except OSError:
             pass
 
-    def _wait_for_event_window_context(
-        self,
-        event: dict,
-        timeout_seconds: float,
-        smart_enabled: bool,
-    ):
-        if not smart_enabled:
-            return True, ""
+    def _begin_session_metrics(self, session: str) -> None:
+        if self.profile_session_var.get():
+            self.session_metrics = Instrumentation(session, profile_cpu=True, trace_memory=True)
+        elif self.collect_metrics:
+            self.session_metrics = Instrumentation(session)
+        else:
+            self.session_metrics = None
+            return
+        self.session_metrics.start()
 
-        expected_context = event.get("window")
-        if not isinstance(expected_context, dict):
-            return True, ""
+    def _finish_session_metrics(self) -> None:
+        metrics = self.session_metrics
+        if metrics is None:
+            return
+        self.session_metrics = None
+        metrics.stop()
+        try:
+            written = metrics.dump(self.app_data_dir / f"{metrics.session}_metrics.json")
+        except OSError as exc:
+            self._log_replay(f"Could not write {metrics.session} metrics: {exc}")
+            return
+        self._log_replay(
+            f"Session metrics ({metrics.session}) written to {', '.join(str(path) for path in written)}"
+        )
 
-        started_at = time.perf_counter()
-        while True:
-            if self._should_stop_replay():
-                return False, "Stopped by Esc"
+    def _listener_callback(self, name: str, callback):
+        metrics = self.session_metrics
+        if metrics is None:
+            return callback
+
+        def timed(*args):
+            started_at = time.perf_counter()
+            with metrics.profile_thread():
+                result = callback(*args)
+            metrics.observe(f"listener.{name}", time.perf_counter() - started_at)
+            return result
+
+        return timed
+
+    def _replay_controllers(self):
+        # On X11 hosts, XTest controllers batch injections; elsewhere pynput is used.
+        x_display = get_x11_display()
+        if x_display is not None and x_display.has_xtest:
+            return x11_backend.X11MouseController(x_display), x11_backend.X11KeyboardController(x_display)
+        return self.mouse_controller, self.keyboard_controller
+
+    def _post_to_ui(self, callback) -> None:
+        metrics = self.session_metrics
+        if metrics is None:
+            self.root.after(0, callback)
+            return
 
-            current_context = self._capture_window_context()
-            if self._window_context_matches(expected_context, current_context):
-                return True, ""
+        queued_at = time.perf_counter()
+        metrics.count("tk.posted")
+        metrics.gauge_max("tk.backlog_max", metrics.counters.get("tk.posted", 0) - metrics.counters.get("tk.ran", 0))
 
-            if (time.perf_counter() - started_at) >= timeout_seconds:
-                expected_title = str(expected_context.get("title", "")).strip()
-                if expected_title:
-                    return False, f"Smart wait timeout on window: {expected_title[:60]}"
-                return False, "Smart wait timeout (window context mismatch)"
+        def timed():
+            metrics.count("tk.ran")
+            metrics.observe("tk.callback_delay", time.perf_counter() - queued_at)
+            callback()
 
-            time.sleep(0.05)
+        self.root.after(0, timed)
 
     def _event_type_counts(self):
         counts = {"move": 0, "click": 0, "scroll": 0, "key": 0}
@@ -562,28 +1795,8 @@ class MouseRecorderApp:
                 return {"kind": "char", "value": key.char}
             if key.vk is not None:
                 return {"kind": "vk", "value": int(key.vk)}
-        return {"kind": "text", "value": str(key)}
-
-    def _deserialize_key(self, payload):
-        if not isinstance(payload, dict):
-            return None
-
-        kind = payload.get("kind")
-        value = payload.get("value")
-        if kind == "special" and isinstance(value, str):
-            return getattr(keyboard.Key, value, None)
-        if kind == "char" and isinstance(value, str) and value != "":
-            try:
-                return keyboard.KeyCode.from_char(value)
-            except (TypeError, ValueError):
-                return None
-        if kind == "vk":
-            try:
-                return keyboard.KeyCode.from_vk(int(value))
-            except (TypeError, ValueError):
-                return None
-        if kind == "text" and isinstance(value, str) and value.startswith("Key."):
-            return getattr(keyboard.Key, value.split("Key.", 1)[1], None)
+        # A key with neither a name, a character nor a virtual key code cannot
+        # be replayed and would not pass schema validation.
         return None
 
     def _append_move_event(
@@ -641,6 +1854,8 @@ class MouseRecorderApp:
             return
 
         payload = self._serialize_key(key)
+        if payload is None:
+            return
         event = {
             "type": "key",
             "time": self._timestamp(),
@@ -649,32 +1864,6 @@ class MouseRecorderApp:
         }
         self.events.append(self._attach_window_context(event))
 
-    def _emit_scroll(self, step_x: int, step_y: int) -> None:
-        if step_x == 0 and step_y == 0:
-            return
-
-        if sys.platform == "win32":
-            user32 = ctypes.windll.user32
-            if step_y != 0:
-                user32.mouse_event(
-                    MOUSEEVENTF_WHEEL,
-                    0,
-                    0,
-                    int(step_y * WHEEL_DELTA),
-                    0,
-                )
-            if step_x != 0:
-                user32.mouse_event(
-                    MOUSEEVENTF_HWHEEL,
-                    0,
-                    0,
-                    int(step_x * WHEEL_DELTA),
-                    0,
-                )
-            return
-
-        self.mouse_controller.scroll(step_x, step_y)
-
     def _start_control_keyboard_listener(self) -> None:
         def on_press(key):
             if self._is_escape_key(key):
@@ -693,23 +1882,13 @@ class MouseRecorderApp:
             return key.char == "\x1b"
         return False
 
-    def _is_escape_pressed_now(self) -> bool:
-        if sys.platform != "win32":
-            return False
-        return bool(ctypes.windll.user32.GetAsyncKeyState(VK_ESCAPE) & 0x8000)
-
     def _handle_escape_shortcut(self) -> None:
         if self.is_recording:
-            self.root.after(0, self.stop_recording)
+            self._post_to_ui(self.stop_recording)
             return
         if self.is_replaying:
-            self.stop_replay_requested.set()
-            self.root.after(0, lambda: self.status_var.set("Stopping replay..."))
-
-    def _should_stop_replay(self) -> bool:
-        if self.stop_replay_requested.is_set():
-            return True
-        return self._is_escape_pressed_now()
+            self.replay_cancel.cancel("Stopped by Esc")
+            self._post_to_ui(lambda: self.status_var.set("Stopping replay..."))
 
     def _get_replay_count(self):
         raw_value = self.replay_count_var.get().strip()
@@ -731,12 +1910,17 @@ class MouseRecorderApp:
             return
 
         self.events = []
+        self.recording = None
+        self.window_table = WindowContextTable()
+        layout = get_screen_layout(self.root)
+        self.record_screen = layout.to_dict() if layout else None
         self.record_start_time = time.perf_counter()
         self.last_move_time = 0.0
         self.last_recorded_pos = None
         self.last_scroll_time = 0.0
         self.last_scroll_signature = None
         self.is_recording = True
+        self._begin_session_metrics("recording")
         self.status_var.set("Recording... mouse + keyboard. Press Esc to stop")
         self._set_recording_ui(True)
 
@@ -772,22 +1956,22 @@ class MouseRecorderApp:
             self._append_key_event(key, "release")
 
         self.mouse_listener = mouse.Listener(
-            on_move=on_move,
-            on_click=on_click,
-            on_scroll=on_scroll,
+            on_move=self._listener_callback("move", on_move),
+            on_click=self._listener_callback("click", on_click),
+            on_scroll=self._listener_callback("scroll", on_scroll),
         )
         self.mouse_listener.daemon = True
         self.mouse_listener.start()
 
         self.keyboard_listener = keyboard.Listener(
-            on_press=on_key_press,
-            on_release=on_key_release,
+            on_press=self._listener_callback("key_press", on_key_press),
+            on_release=self._listener_callback("key_release", on_key_release),
         )
         self.keyboard_listener.daemon = True
         self.keyboard_listener.start()
 
         if sys.platform == "win32":
-            self.wheel_hook = WindowsWheelHook(on_scroll)
+            self.wheel_hook = WindowsWheelHook(self._listener_callback("wheel_hook", on_scroll))
             self.wheel_hook.start()
 
     def stop_recording(self) -> None:
@@ -809,7 +1993,9 @@ class MouseRecorderApp:
             self.wheel_hook = None
 
         if self.events:
+            self.recording = compile_events(self.events, window_table=self.window_table, screen=self.record_screen)
             self._save_last_recording()
+        self._finish_session_metrics()
 
         self._set_recording_ui(False)
         counts = self._event_type_counts()
@@ -828,7 +2014,7 @@ class MouseRecorderApp:
             return
         if self.is_replaying:
             return
-        if not self.events:
+        if not self.events or self.recording is None:
             messagebox.showinfo("No Data", "No recorded data to replay.")
             return
         replay_count = self._get_replay_count()
@@ -847,8 +2033,18 @@ class MouseRecorderApp:
             if click_pixel_tolerance is None:
                 return
 
+        options = ReplayOptions(
+            replay_count=replay_count,
+            smart_enabled=smart_replay_enabled,
+            smart_wait_timeout=smart_wait_timeout,
+            pixel_guard_enabled=click_pixel_guard_enabled,
+            pixel_tolerance=click_pixel_tolerance,
+            exact_key_timing=bool(self.exact_key_timing_var.get()),
+            overlap_loops=bool(self.overlap_loops_var.get()),
+        )
+
         self.is_replaying = True
-        self.stop_replay_requested.clear()
+        self.replay_cancel.reset()
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="disabled")
         self.replay_btn.config(state="disabled")
@@ -857,175 +2053,116 @@ class MouseRecorderApp:
         self.smart_wait_spinbox.config(state="disabled")
         self.click_pixel_guard_check.config(state="disabled")
         self.click_pixel_tolerance_spinbox.config(state="disabled")
+        self.exact_key_timing_check.config(state="disabled")
+        self.overlap_loops_check.config(state="disabled")
+        self.profile_session_check.config(state="disabled")
         self.status_var.set(f"Replaying 1/{replay_count}... Press Esc to stop")
-        self._log_replay(
-            "Replay started "
-            f"(loops={replay_count}, smart={smart_replay_enabled}, "
-            f"smart_wait={smart_wait_timeout}, pixel_guard={click_pixel_guard_enabled}, "
-            f"pixel_tol={click_pixel_tolerance})"
+        self._log_replay(f"Replay started ({options.describe()})")
+        self._begin_session_metrics("replay")
+        self.live_metrics_var.set("")
+
+        trace = self._open_replay_trace(options)
+        mouse_controller, keyboard_controller = self._replay_controllers()
+        engine = ReplayEngine(
+            self.recording,
+            options,
+            mouse_controller,
+            keyboard_controller,
+            cancel_token=self.replay_cancel,
+            log=self._log_replay,
+            metrics=self.session_metrics,
+            trace=trace,
+            screen=get_screen_layout(self.root),
         )
 
         def run_replay():
-            replay_events = sorted(self.events, key=lambda item: float(item.get("time", 0.0)))
-            replay_stopped = False
-            replay_stop_reason = ""
-            replay_scroll_events = 0
-            replay_key_events = 0
-            completed_loops = 0
-
-            for loop_idx in range(replay_count):
-                if self._should_stop_replay():
-                    replay_stopped = True
-                    replay_stop_reason = "Stopped by Esc"
-                    break
-
-                replay_start = time.perf_counter()
-                scroll_x_remainder = 0.0
-                scroll_y_remainder = 0.0
-                pressed_keys = []
-                pressed_buttons = []
-                loop_scroll_events = 0
-                loop_key_events = 0
-
-                for event in replay_events:
-                    if self._should_stop_replay():
-                        replay_stopped = True
-                        replay_stop_reason = "Stopped by Esc"
-                        break
-
-                    target_time = float(event.get("time", 0.0))
-                    while True:
-                        if self._should_stop_replay():
-                            replay_stopped = True
-                            replay_stop_reason = "Stopped by Esc"
-                            break
-                        elapsed = time.perf_counter() - replay_start
-                        remaining = target_time - elapsed
-                        if remaining <= 0:
-                            break
-                        time.sleep(min(remaining, 0.002))
-                    if replay_stopped:
-                        break
-
-                    etype = event.get("type")
-                    if etype in ("click", "scroll", "key"):
-                        ready, reason = self._wait_for_event_window_context(
-                            event,
-                            smart_wait_timeout,
-                            smart_replay_enabled,
-                        )
-                        if not ready:
-                            replay_stopped = True
-                            replay_stop_reason = reason
-                            break
-                    if etype == "click":
-                        ready, reason = self._wait_for_click_pixel_context(
-                            event,
-                            smart_wait_timeout,
-                            click_pixel_guard_enabled,
-                            click_pixel_tolerance,
-                        )
-                        if not ready:
-                            replay_stopped = True
-                            replay_stop_reason = reason
-                            break
-
-                    if etype == "move":
-                        self.mouse_controller.position = (int(event["x"]), int(event["y"]))
-                    elif etype == "click":
-                        self.mouse_controller.position = (int(event["x"]), int(event["y"]))
-                        btn = getattr(mouse.Button, event["button"], None)
-                        if btn:
-                            if event["pressed"]:
-                                self.mouse_controller.press(btn)
-                                pressed_buttons.append(btn)
-                            else:
-                                self.mouse_controller.release(btn)
-                                for idx in range(len(pressed_buttons) - 1, -1, -1):
-                                    if pressed_buttons[idx] == btn:
-                                        pressed_buttons.pop(idx)
-                                        break
-                    elif etype == "scroll":
-                        loop_scroll_events += 1
-                        self.mouse_controller.position = (int(event["x"]), int(event["y"]))
-                        scroll_x_remainder += float(event.get("dx", 0.0))
-                        scroll_y_remainder += float(event.get("dy", 0.0))
-                        scroll_x = math.trunc(scroll_x_remainder)
-                        scroll_y = math.trunc(scroll_y_remainder)
-                        if scroll_x != 0 or scroll_y != 0:
-                            self._emit_scroll(scroll_x, scroll_y)
-                            scroll_x_remainder -= scroll_x
-                            scroll_y_remainder -= scroll_y
-                    elif etype == "key":
-                        key_obj = self._deserialize_key(event.get("key"))
-                        action = event.get("action")
-                        if key_obj and action in ("press", "release"):
-                            loop_key_events += 1
-                            if action == "press":
-                                self.keyboard_controller.press(key_obj)
-                                pressed_keys.append(key_obj)
-                            else:
-                                self.keyboard_controller.release(key_obj)
-                                for idx in range(len(pressed_keys) - 1, -1, -1):
-                                    if pressed_keys[idx] == key_obj:
-                                        pressed_keys.pop(idx)
-                                        break
-
-                if not replay_stopped:
-                    # Flush residual fractional scroll at end so tiny touchpad deltas
-                    # still produce a final visible scroll step.
-                    final_x = int(round(scroll_x_remainder))
-                    final_y = int(round(scroll_y_remainder))
-                    if final_x != 0 or final_y != 0:
-                        self._emit_scroll(final_x, final_y)
-
-                # Safety release for any keys/buttons that remained pressed.
-                for key_obj in reversed(pressed_keys):
-                    try:
-                        self.keyboard_controller.release(key_obj)
-                    except Exception:
-                        pass
-
-                for btn in reversed(pressed_buttons):
-                    try:
-                        self.mouse_controller.release(btn)
-                    except Exception:
-                        pass
-
-                replay_scroll_events += loop_scroll_events
-                replay_key_events += loop_key_events
-
-                if replay_events and not replay_stopped:
-                    last = replay_events[-1]
-                    if "x" in last and "y" in last:
-                        self.mouse_controller.position = (int(last["x"]), int(last["y"]))
-
-                if replay_stopped:
-                    break
-
-                completed_loops += 1
-                if completed_loops < replay_count:
-                    next_loop = completed_loops + 1
-                    self.root.after(
-                        0,
-                        lambda n=next_loop: self.status_var.set(
-                            f"Replaying {n}/{replay_count}... Press Esc to stop"
-                        ),
-                    )
-
-            self.root.after(
-                0,
+            try:
+                result = engine.run()
+            except Exception as exc:
+                # The UI must leave the replaying state whatever went wrong.
+                reason = f"Replay failed: {type(exc).__name__}: {exc}"
+                self._log_replay(reason)
+                result = ReplayResult(options.replay_count)
+                result.stopped = True
+                result.stop_reason = reason
+                if engine.progress is not None:
+                    result.completed_loops = max(0, engine.progress.latest[0] - 1)
+            finally:
+                if trace:
+                    trace.close()
+                    self._log_replay(f"Replay trace ({trace.records} events) written to {trace.path}")
+            self._post_to_ui(
                 lambda: self._on_replay_done(
-                    replay_scroll_events,
-                    replay_key_events,
-                    replay_stopped,
-                    completed_loops,
-                    replay_count,
-                    replay_stop_reason,
+                    result.scroll_events,
+                    result.key_events,
+                    result.stopped,
+                    result.completed_loops,
+                    result.replay_count,
+                    result.stop_reason,
                 ),
             )
 
         threading.Thread(target=run_replay, daemon=True).start()
+        self.last_progress_sample = None
+        self._schedule_progress_poll(engine)
+
+    def _open_replay_trace(self, options: ReplayOptions):
+        if not self.trace_replays:
+            return None
+        path = self.app_data_dir / f"replay_trace_{time.strftime('%Y%m%d-%H%M%S')}{TRACE_SUFFIX}"
+        try:
+            return TraceWriter(
+                path,
+                {"events": len(self.recording.records), "options": options.describe()},
+            )
+        except OSError as exc:
+            self._log_replay(f"Could not open replay trace {path}: {exc}")
+            return None
+
+    def _schedule_progress_poll(self, engine: ReplayEngine) -> None:
+        self.progress_poll_due_at = time.perf_counter() + self.progress_poll_interval_ms / 1000.0
+        self.root.after(self.progress_poll_interval_ms, self._poll_replay_progress, engine)
+
+    def _poll_replay_progress(self, engine: ReplayEngine) -> None:
+        # Runs on the Tk thread at a fixed rate; the replay thread never posts per step.
+        metrics = self.session_metrics
+        if metrics is not None:
+            # How late the Tk event loop ran this timer: the UI backlog as the user sees it.
+            metrics.observe("tk.after_drift", max(0.0, time.perf_counter() - self.progress_poll_due_at))
+        if not self.is_replaying:
+            return
+        progress = engine.progress
+        if progress is not None:
+            now = time.perf_counter()
+            loop_number, event_index, event_time, events_done, lateness = progress.latest
+            rate = 0.0
+            if self.last_progress_sample is not None:
+                sampled_at, sampled_done = self.last_progress_sample
+                if now > sampled_at:
+                    rate = (events_done - sampled_done) / (now - sampled_at)
+            self.last_progress_sample = (now, events_done)
+
+            if not self.replay_cancel.is_cancelled():
+                # Keep "Stopping replay..." visible once a stop was requested.
+                self.status_var.set(f"Replaying {loop_number}/{progress.replay_count}... Press Esc to stop")
+            self.live_metrics_var.set(
+                f"Event {event_index + 1}/{progress.events_per_loop} at {event_time:.1f}s | "
+                f"{rate:.0f} ev/s | late {lateness * 1000:.1f} ms\n"
+                f"Guard wait {progress.guard_wait_seconds():.1f}s | "
+                f"ETA {self._format_duration(progress.eta_seconds(now))}"
+            )
+        self._schedule_progress_poll(engine)
+
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
+        seconds = int(max(0.0, seconds))
+        hours, remainder = divmod(seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        if hours:
+            return f"{hours}h{minutes:02d}m"
+        if minutes:
+            return f"{minutes}m{seconds:02d}s"
+        return f"{seconds}s"
 
     def _on_replay_done(
         self,
@@ -1038,6 +2175,7 @@ class MouseRecorderApp:
     ) -> None:
         self.is_replaying = False
         self._set_recording_ui(False)
+        self._finish_session_metrics()
         if replay_stopped:
             reason_suffix = f" | Reason: {replay_stop_reason}" if replay_stop_reason else ""
             self._log_replay(
@@ -1068,35 +2206,46 @@ class MouseRecorderApp:
 
     def _save_last_recording(self) -> None:
         try:
-            self.recording_file.write_text(
-                json.dumps(self.events, ensure_ascii=True, separators=(",", ":")),
-                encoding="utf-8",
-            )
+            screen = self.recording.screen.to_dict() if self.recording and self.recording.screen else None
+            save_archive(self.events, self.recording_file, schema=SCHEMA_VERSION, screen=screen)
         except OSError as exc:
-            self.root.after(
-                0,
-                lambda: messagebox.showwarning(
-                    "Save Failed",
-                    f"Could not save recording:\n{exc}",
-                ),
-            )
+            # `exc` is unbound once the except block ends, before the callback runs.
+            message = f"Could not save recording:\n{exc}"
+            self._post_to_ui(lambda: messagebox.showwarning("Save Failed", message))
 
     def _load_last_recording(self) -> None:
-        if not self.recording_file.exists():
+        if self.recording_file.exists():
+            path = self.recording_file
+        elif self.legacy_recording_file.exists():
+            path = self.legacy_recording_file
+        else:
             return
         try:
-            raw = self.recording_file.read_text(encoding="utf-8")
-            data = json.loads(raw)
-            if isinstance(data, list):
-                self.events = data
-                self.status_var.set(f"Ready (loaded {len(self.events)} saved events)")
-        except (OSError, json.JSONDecodeError):
+            version, data, screen = read_recording_file(path)
+            recording = compile_events(data, version, screen=screen)
+        except (OSError, ArchiveError, SchemaError):
             # Ignore damaged file and continue with empty recording.
             self.events = []
+            self.recording = None
+            return
+
+        self.recording = recording
+        self.window_table = recording.window_table
+        self.events = recording.to_events()
+        status = f"Ready (loaded {len(self.events)} saved events)"
+        if recording.repaired or recording.rejected:
+            status = (
+                f"Ready (loaded {len(self.events)} saved events, "
+                f"repaired {recording.repaired}, dropped {recording.rejected})"
+            )
+            self._log_replay(f"Recording loaded ({recording.summary()})")
+            for problem in recording.problems:
+                self._log_replay(f"  {problem}")
+        self.status_var.set(status)
 
     def on_close(self) -> None:
         self.is_recording = False
-        self.stop_replay_requested.set()
+        self.replay_cancel.cancel("Window closed")
         self.is_replaying = False
         if self.mouse_listener:
             self.mouse_listener.stop()
@@ -1113,10 +2262,33 @@ class MouseRecorderApp:
         self.root.destroy()
 
 
-def main() -> None:
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Record and replay mouse and keyboard input.")
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="collect counters and timing histograms for every recording/replay session",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="start with Profile Session on (metrics plus cProfile and tracemalloc)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="write a binary trace of every injected event (see replay_trace.py analyze)",
+    )
+    args = parser.parse_args(argv)
+
     enable_windows_dpi_awareness()
+    # Opens the shared X11 connection (and XInitThreads) before Tk touches Xlib.
+    get_x11_display()
     root = tk.Tk()
     app = MouseRecorderApp(root)
+    app.collect_metrics = args.metrics
+    app.profile_session_var.set(args.profile)
+    app.trace_replays = args.trace
     root.mainloop()
 
 
@@ -0,0 +1,440 @@
+"""Compact binary archive format for recordings.
+
+Layout: magic, format version, codec id, a varint-length JSON header and
+one compressed stream per column. Times are stored as integer
+microseconds; times and coordinates are zigzag/varint delta encoded.
+Events that do not fit the known shapes are kept verbatim as JSON in the
+`raw` column, so packing never loses data beyond microsecond rounding.
+
+Usage:
+    python recording_archive.py pack last_recording.json last_recording.mtr [--codec lzma]
+    python recording_archive.py unpack last_recording.mtr last_recording.json
+"""
+
+import itertools
+import json
+import lzma
+import operator
+import struct
+import sys
+import zlib
+from pathlib import Path
+
+
+ARCHIVE_MAGIC = b"MTRA"
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = ".mtr"
+
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODECS = {"zlib": CODEC_ZLIB, "lzma": CODEC_LZMA}
+
+TYPE_MOVE = 0
+TYPE_CLICK = 1
+TYPE_SCROLL = 2
+TYPE_KEY = 3
+TYPE_RAW = 255
+
+COLUMNS = ("type", "time", "x", "y", "click", "scroll", "key", "window", "pixel", "raw")
+
+_FIELDS = {
+    "move": frozenset(("type", "time", "x", "y")),
+    "click": frozenset(("type", "time", "x", "y", "button", "pressed", "window", "pixel")),
+    "scroll": frozenset(("type", "time", "x", "y", "dx", "dy", "window")),
+    "key": frozenset(("type", "time", "action", "key", "window")),
+}
+_TYPE_IDS = {"move": TYPE_MOVE, "click": TYPE_CLICK, "scroll": TYPE_SCROLL, "key": TYPE_KEY}
+_SCROLL = struct.Struct("<dd")
+# Single-byte varints decode straight from this table (zigzag applied).
+_ZIGZAG_BYTE = [(value >> 1) ^ -(value & 1) for value in range(128)]
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) if value >= 0 else ((-value) << 1) - 1
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos: int):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise ArchiveError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _decode_varints(data) -> list:
+    if not data:
+        return []
+    if max(data) < 0x80:
+        return list(data)
+    values = []
+    pos = 0
+    end = len(data)
+    while pos < end:
+        value, pos = _read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def _decode_zigzag_deltas(data) -> list:
+    if data and max(data) < 0x80:
+        deltas = map(_ZIGZAG_BYTE.__getitem__, data)
+    else:
+        deltas = ((value >> 1) ^ -(value & 1) for value in _decode_varints(data))
+    return list(itertools.accumulate(deltas))
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _window_fits(window) -> bool:
+    return (
+        isinstance(window, dict)
+        and set(window) == {"title", "class"}
+        and isinstance(window["title"], str)
+        and isinstance(window["class"], str)
+    )
+
+
+def _pixel_fits(pixel) -> bool:
+    return (
+        isinstance(pixel, dict)
+        and set(pixel) == {"r", "g", "b"}
+        and all(_is_int(pixel[channel]) and 0 <= pixel[channel] <= 255 for channel in "rgb")
+    )
+
+
+def _event_fits(event) -> bool:
+    if not isinstance(event, dict):
+        return False
+    fields = _FIELDS.get(event.get("type"))
+    if fields is None or not fields.issuperset(event) or not _is_number(event.get("time")):
+        return False
+    etype = event["type"]
+    if etype != "key" and not (_is_int(event.get("x")) and _is_int(event.get("y"))):
+        return False
+    if "window" in event and not _window_fits(event["window"]):
+        return False
+    if etype == "click":
+        if not isinstance(event.get("button"), str) or not isinstance(event.get("pressed"), bool):
+            return False
+        if "pixel" in event and not _pixel_fits(event["pixel"]):
+            return False
+    elif etype == "scroll":
+        return _is_number(event.get("dx", 0.0)) and _is_number(event.get("dy", 0.0))
+    elif etype == "key":
+        return isinstance(event.get("action"), str) and "key" in event
+    return True
+
+
+def encode_events(events, codec: str = "zlib", schema: int = None, screen: dict = None) -> bytes:
+    if codec not in CODECS:
+        raise ArchiveError(f"Unknown codec: {codec}")
+    columns = {name: bytearray() for name in COLUMNS}
+    strings = []
+    string_ids = {}
+    windows = []
+    window_ids = {}
+
+    def string_id(value: str) -> int:
+        index = string_ids.get(value)
+        if index is None:
+            index = string_ids[value] = len(strings)
+            strings.append(value)
+        return index
+
+    def window_ref(event) -> int:
+        window = event.get("window")
+        if window is None:
+            return 0
+        key = (window["title"], window["class"])
+        index = window_ids.get(key)
+        if index is None:
+            index = window_ids[key] = len(windows)
+            windows.append([window["title"], window["class"]])
+        return index + 1
+
+    prev_time = 0
+    prev_x = 0
+    prev_y = 0
+    count = 0
+    for event in events:
+        count += 1
+        if not _event_fits(event):
+            columns["type"].append(TYPE_RAW)
+            raw = json.dumps(event, ensure_ascii=True, separators=(",", ":")).encode("ascii")
+            _write_varint(columns["raw"], len(raw))
+            columns["raw"] += raw
+            continue
+
+        etype = event["type"]
+        columns["type"].append(_TYPE_IDS[etype])
+        time_us = int(round(float(event["time"]) * 1_000_000))
+        _write_varint(columns["time"], _zigzag(time_us - prev_time))
+        prev_time = time_us
+        if etype != "key":
+            _write_varint(columns["x"], _zigzag(event["x"] - prev_x))
+            _write_varint(columns["y"], _zigzag(event["y"] - prev_y))
+            prev_x = event["x"]
+            prev_y = event["y"]
+        if etype == "move":
+            continue
+
+        _write_varint(columns["window"], window_ref(event))
+        if etype == "click":
+            _write_varint(columns["click"], string_id(event["button"]))
+            columns["click"].append(1 if event["pressed"] else 0)
+            pixel = event.get("pixel")
+            if pixel is None:
+                columns["pixel"].append(0)
+            else:
+                columns["pixel"] += bytes((1, pixel["r"], pixel["g"], pixel["b"]))
+        elif etype == "scroll":
+            columns["scroll"] += _SCROLL.pack(float(event.get("dx", 0.0)), float(event.get("dy", 0.0)))
+        else:
+            _write_varint(columns["key"], string_id(event["action"]))
+            payload = json.dumps(event["key"], ensure_ascii=True, separators=(",", ":"), sort_keys=True)
+            _write_varint(columns["key"], string_id(payload))
+
+    compress = (lambda raw: zlib.compress(raw, 9)) if codec == "zlib" else lzma.compress
+    blobs = [compress(bytes(columns[name])) for name in COLUMNS]
+    header = {
+        "count": count,
+        "strings": strings,
+        "windows": windows,
+        "columns": [[name, len(blob)] for name, blob in zip(COLUMNS, blobs)],
+    }
+    if schema is not None:
+        header["schema"] = schema
+    if screen is not None:
+        header["screen"] = screen
+    header = json.dumps(
+        header,
+        ensure_ascii=True,
+        separators=(",", ":"),
+    ).encode("ascii")
+    out = bytearray(ARCHIVE_MAGIC)
+    out.append(ARCHIVE_VERSION)
+    out.append(CODECS[codec])
+    _write_varint(out, len(header))
+    out += header
+    for blob in blobs:
+        out += blob
+    return bytes(out)
+
+
+def _read_header(data: bytes):
+    if data[:4] != ARCHIVE_MAGIC:
+        raise ArchiveError("Not a recording archive")
+    if len(data) < 6 or data[4] != ARCHIVE_VERSION:
+        raise ArchiveError("Unsupported archive version")
+    header_len, pos = _read_varint(data, 6)
+    try:
+        header = json.loads(data[pos:pos + header_len].decode("ascii"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ArchiveError(f"Damaged archive header: {exc}") from exc
+    if not isinstance(header, dict):
+        raise ArchiveError("Damaged archive header: not an object")
+    return header, pos + header_len
+
+
+def read_header(data: bytes) -> dict:
+    return _read_header(data)[0]
+
+
+def _read_container(data: bytes):
+    header, pos = _read_header(data)
+    codec = data[5]
+    if codec == CODEC_ZLIB:
+        decompress = zlib.decompress
+    elif codec == CODEC_LZMA:
+        decompress = lzma.decompress
+    else:
+        raise ArchiveError(f"Unknown codec id: {codec}")
+    columns = {}
+    try:
+        layout = [(str(name), int(length)) for name, length in header["columns"]]
+        count = int(header["count"])
+        if not isinstance(header["strings"], list) or not isinstance(header["windows"], list):
+            raise TypeError("string and window tables must be lists")
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ArchiveError(f"Damaged archive header: {exc!r}") from exc
+    for name, length in layout:
+        try:
+            columns[name] = decompress(data[pos:pos + length])
+        except (zlib.error, lzma.LZMAError) as exc:
+            raise ArchiveError(f"Damaged column {name}: {exc}") from exc
+        pos += length
+    missing = [name for name in COLUMNS if name not in columns]
+    if missing:
+        raise ArchiveError(f"Archive is missing columns: {', '.join(missing)}")
+    if len(columns["type"]) != count:
+        raise ArchiveError(f"Archive holds {len(columns['type'])} event types for {count} events")
+    return header, columns
+
+
+def _check_length(name: str, values: list, expected: int) -> None:
+    if len(values) != expected:
+        raise ArchiveError(f"Damaged column {name}: {len(values)} values for {expected} events")
+
+
+def iter_events(data: bytes):
+    """Decodes an archive into event dicts one at a time, in recorded order."""
+    header, columns = _read_container(data)
+    strings = header["strings"]
+    try:
+        windows = [{"title": title, "class": class_name} for title, class_name in header["windows"]]
+    except (TypeError, ValueError) as exc:
+        raise ArchiveError(f"Damaged window table: {exc}") from exc
+    keys = {}
+
+    # The per-event columns must line up with the type column; checking
+    # their lengths up front keeps a truncated archive from failing midway.
+    types = columns["type"]
+    moves = types.count(TYPE_MOVE)
+    keyed = types.count(TYPE_KEY)
+    positioned = moves + types.count(TYPE_CLICK) + types.count(TYPE_SCROLL)
+    timed = positioned + keyed
+    time_values = _decode_zigzag_deltas(columns["time"])
+    x_values = _decode_zigzag_deltas(columns["x"])
+    y_values = _decode_zigzag_deltas(columns["y"])
+    window_values = _decode_varints(columns["window"])
+    _check_length("time", time_values, timed)
+    _check_length("x", x_values, positioned)
+    _check_length("y", y_values, positioned)
+    _check_length("window", window_values, timed - moves)
+    times = map(operator.truediv, time_values, itertools.repeat(1_000_000))
+    xs = iter(x_values)
+    ys = iter(y_values)
+    window_refs = iter(window_values)
+    click = columns["click"]
+    scroll = columns["scroll"]
+    key = columns["key"]
+    pixel = columns["pixel"]
+    raw = columns["raw"]
+    click_pos = scroll_pos = key_pos = pixel_pos = raw_pos = 0
+
+    try:
+        for type_id in types:
+            if type_id == TYPE_MOVE:
+                yield {"type": "move", "time": next(times), "x": next(xs), "y": next(ys)}
+                continue
+            if type_id == TYPE_RAW:
+                length, raw_pos = _read_varint(raw, raw_pos)
+                yield json.loads(raw[raw_pos:raw_pos + length].decode("ascii"))
+                raw_pos += length
+                continue
+
+            time_offset = next(times)
+            if type_id == TYPE_CLICK:
+                event = {"type": "click", "time": time_offset, "x": next(xs), "y": next(ys)}
+                button, click_pos = _read_varint(click, click_pos)
+                event["button"] = strings[button]
+                event["pressed"] = bool(click[click_pos])
+                click_pos += 1
+                if pixel[pixel_pos]:
+                    event["pixel"] = {
+                        "r": pixel[pixel_pos + 1],
+                        "g": pixel[pixel_pos + 2],
+                        "b": pixel[pixel_pos + 3],
+                    }
+                    pixel_pos += 4
+                else:
+                    pixel_pos += 1
+            elif type_id == TYPE_SCROLL:
+                event = {"type": "scroll", "time": time_offset, "x": next(xs), "y": next(ys)}
+                event["dx"], event["dy"] = _SCROLL.unpack_from(scroll, scroll_pos)
+                scroll_pos += _SCROLL.size
+            elif type_id == TYPE_KEY:
+                action, key_pos = _read_varint(key, key_pos)
+                payload, key_pos = _read_varint(key, key_pos)
+                if payload not in keys:
+                    keys[payload] = json.loads(strings[payload])
+                event = {
+                    "type": "key",
+                    "time": time_offset,
+                    "action": strings[action],
+                    "key": keys[payload],
+                }
+            else:
+                raise ArchiveError(f"Unknown event type id: {type_id}")
+
+            window_ref = next(window_refs)
+            if window_ref:
+                event["window"] = windows[window_ref - 1]
+            yield event
+    except ArchiveError:
+        raise
+    except (IndexError, KeyError, TypeError, ValueError, struct.error) as exc:
+        # Column contents that do not match the string/window tables.
+        raise ArchiveError(f"Damaged archive data: {exc!r}") from exc
+
+
+def decode_events(data: bytes) -> list:
+    return list(iter_events(data))
+
+
+def is_archive(path: Path) -> bool:
+    try:
+        with Path(path).open("rb") as handle:
+            return handle.read(4) == ARCHIVE_MAGIC
+    except OSError:
+        return False
+
+
+def save_archive(events, path: Path, codec: str = "zlib", schema: int = None, screen: dict = None) -> None:
+    Path(path).write_bytes(encode_events(events, codec, schema, screen))
+
+
+def load_archive(path: Path) -> list:
+    return decode_events(Path(path).read_bytes())
+
+
+def main(argv) -> int:
+    if len(argv) < 3 or argv[0] not in ("pack", "unpack"):
+        print(__doc__.strip().split("Usage:", 1)[1].rstrip())
+        return 2
+    # recording_schema imports this module, so it can only be imported here.
+    from recording_schema import LEGACY_SCHEMA_VERSION, read_recording_file
+
+    command, source, target = argv[0], Path(argv[1]), Path(argv[2])
+    if command == "pack":
+        codec = argv[4] if len(argv) > 4 and argv[3] == "--codec" else "zlib"
+        schema, events, screen = read_recording_file(source)
+        save_archive(list(events), target, codec, schema, screen)
+    else:
+        data = source.read_bytes()
+        header = read_header(data)
+        document = decode_events(data)
+        if "schema" in header or "screen" in header:
+            document = {"schema": int(header.get("schema", LEGACY_SCHEMA_VERSION)), "events": document}
+            if header.get("screen") is not None:
+                document["screen"] = header["screen"]
+        target.write_text(json.dumps(document, ensure_ascii=True, separators=(",", ":")), encoding="utf-8")
+    print(f"{source} ({source.stat().st_size} bytes) -> {target} ({target.stat().st_size} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
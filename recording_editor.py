@@ -0,0 +1,339 @@
+"""Non-destructive editing of compiled recordings.
+
+An edited recording is a list of segments, each an index range over the
+records of a compiled recording plus a time shift. Trimming, deleting,
+splicing, repeating and shifting only split and rearrange segments, so
+they cost O(segments) regardless of recording size. Records are re-based
+(new position, time and window id) only when the replay engine or an
+export reads them.
+
+Usage:
+    python recording_editor.py IN OUT OP [OP ...]
+
+Operations (positions are event indices in the current edit, times in seconds):
+    trim:START_TIME:END_TIME         keep events in the time range, re-based to 0
+    delete:START:STOP                remove events [START, STOP) and close the gap
+    splice:POS:FILE[:START:STOP]     insert events [START, STOP) of FILE before POS
+    repeat:START:STOP:TIMES[:GAP]    play events [START, STOP) TIMES times in a row
+    shift:START:DELTA                move events from START onward by DELTA seconds
+
+OUT is written as an archive (.mtr) or JSON, based on its suffix.
+"""
+
+import bisect
+import json
+import sys
+import time
+from pathlib import Path
+
+from recording_archive import ARCHIVE_SUFFIX, save_archive
+from recording_schema import SCHEMA_VERSION, CompiledRecording, WindowContextTable, load_recording
+from screen_layout import ScreenLayout
+
+
+class EditError(ValueError):
+    pass
+
+
+class Segment:
+    """Records [start, stop) of `records`, played at `record.time + shift`."""
+
+    __slots__ = ("records", "start", "stop", "shift", "window_map")
+
+    def __init__(self, records, start: int, stop: int, shift: float = 0.0, window_map=None):
+        self.records = records
+        self.start = start
+        self.stop = stop
+        self.shift = shift
+        self.window_map = window_map
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def time_at(self, offset: int) -> float:
+        return self.records[self.start + offset].time + self.shift
+
+    def split(self, offset: int):
+        middle = self.start + offset
+        return (
+            Segment(self.records, self.start, middle, self.shift, self.window_map),
+            Segment(self.records, middle, self.stop, self.shift, self.window_map),
+        )
+
+    def shifted(self, delta: float) -> "Segment":
+        return Segment(self.records, self.start, self.stop, self.shift + delta, self.window_map)
+
+
+class RecordView:
+    """Read-only sequence of re-based records over a tuple of segments."""
+
+    def __init__(self, segments):
+        self.segments = tuple(segment for segment in segments if len(segment))
+        self.starts = []
+        total = 0
+        for segment in self.segments:
+            self.starts.append(total)
+            total += len(segment)
+        self.length = total
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def locate(self, position: int):
+        """Returns (segment number, offset inside it) for an event position."""
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError("record position out of range")
+        number = bisect.bisect_right(self.starts, position) - 1
+        return number, position - self.starts[number]
+
+    def time_at(self, position: int) -> float:
+        number, offset = self.locate(position)
+        return self.segments[number].time_at(offset)
+
+    def _rebase(self, segment: Segment, source_index: int, position: int):
+        record = segment.records[source_index]
+        window_id = record.window_id
+        if window_id is not None and segment.window_map is not None:
+            window_id = segment.window_map[window_id]
+        return record.rebased(position, record.time + segment.shift, window_id)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[index] for index in range(*position.indices(self.length))]
+        number, offset = self.locate(position)
+        segment = self.segments[number]
+        return self._rebase(segment, segment.start + offset, self.starts[number] + offset)
+
+    def __iter__(self):
+        for segment, first in zip(self.segments, self.starts):
+            for offset in range(len(segment)):
+                yield self._rebase(segment, segment.start + offset, first + offset)
+
+
+class EditedRecording(CompiledRecording):
+    """A CompiledRecording whose records are a view over segments; edits return new objects."""
+
+    def __init__(
+        self,
+        segments,
+        window_table: WindowContextTable,
+        source_version: int = SCHEMA_VERSION,
+        screen: ScreenLayout = None,
+    ):
+        super().__init__(RecordView(segments), window_table, source_version, screen)
+
+    @classmethod
+    def from_recording(cls, recording: CompiledRecording) -> "EditedRecording":
+        if isinstance(recording, EditedRecording):
+            return recording
+        segments = [Segment(recording.records, 0, len(recording.records))]
+        return cls(segments, recording.window_table, recording.source_version, recording.screen)
+
+    @property
+    def segments(self) -> tuple:
+        return self.records.segments
+
+    def duration(self) -> float:
+        return self.records.time_at(-1) if self.records else 0.0
+
+    def _with(self, segments) -> "EditedRecording":
+        return EditedRecording(segments, self.window_table, self.source_version, self.screen)
+
+    def _split_at(self, position: int):
+        """Segments before and from `position`, splitting at most one segment."""
+        view = self.records
+        if position <= 0:
+            return [], list(view.segments)
+        if position >= len(view):
+            return list(view.segments), []
+        number, offset = view.locate(position)
+        before = list(view.segments[:number])
+        after = list(view.segments[number + 1:])
+        if offset == 0:
+            return before, [view.segments[number]] + after
+        head, tail = view.segments[number].split(offset)
+        return before + [head], [tail] + after
+
+    def _check_range(self, start: int, stop: int) -> None:
+        if not 0 <= start < stop <= len(self.records):
+            raise EditError(f"Event range [{start}, {stop}) is outside 0..{len(self.records)}")
+
+    def trim(self, start_time: float, end_time: float) -> "EditedRecording":
+        """Keeps events with start_time <= time <= end_time; the first kept event plays at 0."""
+        view = self.records
+        times = _TimeIndex(view)
+        start = bisect.bisect_left(times, start_time)
+        stop = bisect.bisect_right(times, end_time)
+        if start >= stop:
+            raise EditError(f"No events between {start_time}s and {end_time}s")
+        _, kept = self._split_at(start)
+        kept = self._with(kept)
+        kept, _ = kept._split_at(stop - start)
+        first_time = view.time_at(start)
+        return self._with(segment.shifted(-first_time) for segment in kept)
+
+    def delete(self, start: int, stop: int) -> "EditedRecording":
+        """Removes events [start, stop); later events move earlier by the removed span."""
+        self._check_range(start, stop)
+        view = self.records
+        gap = view.time_at(stop) - view.time_at(start) if stop < len(view) else 0.0
+        before, _ = self._split_at(start)
+        _, after = self._split_at(stop)
+        return self._with(before + [segment.shifted(-gap) for segment in after])
+
+    def splice(
+        self,
+        position: int,
+        other: CompiledRecording,
+        start: int = 0,
+        stop: int = None,
+        gap: float = 0.0,
+    ) -> "EditedRecording":
+        """Inserts events [start, stop) of `other` before `position`, `gap` seconds after the previous event.
+
+        Spliced coordinates are kept as recorded and remapped with this recording's screen layout.
+        """
+        other = EditedRecording.from_recording(other)
+        stop = len(other.records) if stop is None else stop
+        other._check_range(start, stop)
+        if not 0 <= position <= len(self.records):
+            raise EditError(f"Splice position {position} is outside 0..{len(self.records)}")
+        window_map = None
+        if other.window_table is not self.window_table:
+            window_map = [self.window_table.intern(context) for context in other.window_table.contexts]
+
+        anchor = self.records.time_at(position - 1) + gap if position > 0 else 0.0
+        first_time = other.records.time_at(start)
+        duration = other.records.time_at(stop - 1) - first_time
+        _, inserted = other._split_at(start)
+        inserted, _ = other._with(inserted)._split_at(stop - start)
+        inserted = [
+            Segment(
+                segment.records,
+                segment.start,
+                segment.stop,
+                segment.shift + anchor - first_time,
+                _compose_maps(segment.window_map, window_map),
+            )
+            for segment in inserted
+        ]
+        before, after = self._split_at(position)
+        return self._with(before + inserted + [segment.shifted(duration + gap) for segment in after])
+
+    def repeat(self, start: int, stop: int, times: int, gap: float = 0.0) -> "EditedRecording":
+        """Plays events [start, stop) `times` times back to back, `gap` seconds apart."""
+        self._check_range(start, stop)
+        if times < 1:
+            raise EditError("Repeat count must be at least 1")
+        view = self.records
+        period = view.time_at(stop - 1) - view.time_at(start) + gap
+        before, rest = self._split_at(start)
+        block, after = self._with(rest)._split_at(stop - start)
+        repeated = [segment.shifted(period * copy) for copy in range(times) for segment in block]
+        return self._with(before + repeated + [segment.shifted(period * (times - 1)) for segment in after])
+
+    def shift(self, start: int, delta: float) -> "EditedRecording":
+        """Moves events from `start` onward by `delta` seconds, keeping the order of events."""
+        self._check_range(start, len(self.records))
+        view = self.records
+        floor = view.time_at(start - 1) if start > 0 else 0.0
+        if view.time_at(start) + delta < floor:
+            raise EditError(f"Shift of {delta}s would move event {start} before the event preceding it")
+        before, after = self._split_at(start)
+        return self._with(before + [segment.shifted(delta) for segment in after])
+
+
+class _TimeIndex:
+    """Sequence of event times for bisect without materializing records."""
+
+    def __init__(self, view: RecordView):
+        self.view = view
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def __getitem__(self, position: int) -> float:
+        return self.view.time_at(position)
+
+
+def _compose_maps(inner, outer):
+    if outer is None:
+        return inner
+    if inner is None:
+        return outer
+    return [outer[window_id] for window_id in inner]
+
+
+def parse_operation(spec: str):
+    """Turns an `op:arg:...` spec into a function of an EditedRecording; splice sources are loaded here."""
+    name, _, rest = spec.partition(":")
+    args = rest.split(":") if rest else []
+    try:
+        if name == "trim" and len(args) == 2:
+            start_time, end_time = float(args[0]), float(args[1])
+            return lambda recording: recording.trim(start_time, end_time)
+        if name == "delete" and len(args) == 2:
+            start, stop = int(args[0]), int(args[1])
+            return lambda recording: recording.delete(start, stop)
+        if name == "splice" and len(args) in (2, 4):
+            position = int(args[0])
+            other = EditedRecording.from_recording(load_recording(Path(args[1])))
+            start, stop = (int(args[2]), int(args[3])) if len(args) == 4 else (0, None)
+            return lambda recording: recording.splice(position, other, start, stop)
+        if name == "repeat" and len(args) in (3, 4):
+            start, stop, times = int(args[0]), int(args[1]), int(args[2])
+            gap = float(args[3]) if len(args) == 4 else 0.0
+            return lambda recording: recording.repeat(start, stop, times, gap)
+        if name == "shift" and len(args) == 2:
+            start, delta = int(args[0]), float(args[1])
+            return lambda recording: recording.shift(start, delta)
+    except ValueError as exc:
+        raise EditError(f"{spec}: {exc}") from exc
+    raise EditError(f"Unknown or malformed operation: {spec}")
+
+
+def save_recording(recording: CompiledRecording, path: Path) -> None:
+    events = recording.to_events()
+    screen = recording.screen.to_dict() if recording.screen else None
+    if path.suffix == ARCHIVE_SUFFIX:
+        save_archive(events, path, schema=SCHEMA_VERSION, screen=screen)
+    else:
+        document = {"schema": SCHEMA_VERSION, "events": events}
+        if screen:
+            document["screen"] = screen
+        path.write_text(json.dumps(document, ensure_ascii=True, separators=(",", ":")), encoding="utf-8")
+
+
+def main(argv) -> int:
+    if len(argv) < 3:
+        print("Usage:" + __doc__.split("Usage:", 1)[1].rstrip())
+        return 2
+    source, target, operations = Path(argv[0]), Path(argv[1]), argv[2:]
+    try:
+        recording = EditedRecording.from_recording(load_recording(source))
+        edits = [(spec, parse_operation(spec)) for spec in operations]
+        started_at = time.perf_counter()
+        for spec, edit in edits:
+            try:
+                recording = edit(recording)
+            except EditError as exc:
+                raise EditError(f"{spec}: {exc}") from exc
+    except EditError as exc:
+        print(f"Edit failed: {exc}", file=sys.stderr)
+        return 1
+    edit_ms = (time.perf_counter() - started_at) * 1000.0
+    save_recording(recording, target)
+    print(
+        f"{source} -> {target}: {len(recording)} events, {recording.duration():.2f}s, "
+        f"{len(recording.segments)} segments (edits took {edit_ms:.2f} ms)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
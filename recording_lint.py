@@ -0,0 +1,325 @@
+"""Batch statistics and lint checks for a directory of recordings.
+
+Files are analyzed in a process pool. Results are cached per file by
+content hash in `.recording_lint_cache.json` inside the scanned directory,
+so a re-run only analyzes new or changed files.
+
+Usage:
+    python recording_lint.py {lint,stats} DIR [--recursive] [--workers N]
+                             [--sort KEY] [--reverse] [--max-gap S]
+                             [--json OUT] [--no-cache]
+
+`lint` lists the problems found in each file and exits with 1 if there
+were any; `stats` prints one summary row per file.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from recording_archive import ARCHIVE_SUFFIX, ArchiveError
+from recording_schema import SchemaError, load_recording, release_pressed
+
+
+CACHE_FILE = ".recording_lint_cache.json"
+CACHE_VERSION = 1
+RECORDING_SUFFIXES = (ARCHIVE_SUFFIX, ".json")
+GUARDED_TYPES = ("click", "scroll", "key")
+DUPLICATE_SCROLL_WINDOW = 0.003  # same window the recorder uses to drop repeated wheel callbacks
+DEFAULT_MAX_GAP = 30.0
+SORT_KEYS = ("name", "events", "duration", "density", "coverage", "stuck", "issues", "gap")
+
+
+def analyze_file(path: str, max_gap: float = DEFAULT_MAX_GAP) -> dict:
+    """Counts, guard coverage, key/button balance, gaps and lint issues for one recording.
+
+    Never raises: a file that cannot be analyzed is reported as unreadable,
+    so one bad file does not stop a batch run.
+    """
+    try:
+        return _analyze(path, max_gap)
+    except Exception as exc:
+        return {"path": path, "issues": [f"unreadable: {type(exc).__name__}: {exc}"]}
+
+
+def _analyze(path: str, max_gap: float) -> dict:
+    result = {"path": path, "issues": []}
+    try:
+        recording = load_recording(Path(path))
+    except (OSError, ValueError, ArchiveError, SchemaError) as exc:
+        result["issues"].append(f"unreadable: {exc}")
+        return result
+
+    records = recording.records
+    counts = {"move": 0, "click": 0, "scroll": 0, "key": 0}
+    guarded = 0
+    with_window = 0
+    clicks_with_pixel = 0
+    pressed_keys = []
+    pressed_buttons = []
+    unmatched_releases = 0
+    duplicate_scrolls = 0
+    last_scroll = None
+    long_gaps = 0
+    max_gap_seen = 0.0
+    previous_time = records[0].time if records else 0.0
+
+    for record in records:
+        counts[record.type] += 1
+        gap = record.time - previous_time
+        if gap > max_gap_seen:
+            max_gap_seen = gap
+        if gap > max_gap:
+            long_gaps += 1
+        previous_time = record.time
+        if record.type in GUARDED_TYPES:
+            guarded += 1
+            if record.window_id is not None:
+                with_window += 1
+
+        if record.type == "key":
+            key = (record.key_kind, record.key_value)
+            if record.action == "press":
+                pressed_keys.append(key)
+            elif not release_pressed(pressed_keys, key):
+                unmatched_releases += 1
+        elif record.type == "click":
+            if record.pixel is not None:
+                clicks_with_pixel += 1
+            if record.pressed:
+                pressed_buttons.append(record.button)
+            elif not release_pressed(pressed_buttons, record.button):
+                unmatched_releases += 1
+        elif record.type == "scroll":
+            signature = (record.x, record.y, round(record.dx, 4), round(record.dy, 4))
+            if last_scroll is not None and last_scroll[0] == signature and (
+                record.time - last_scroll[1] < DUPLICATE_SCROLL_WINDOW
+            ):
+                duplicate_scrolls += 1
+            last_scroll = (signature, record.time)
+
+    duration = records[-1].time if records else 0.0
+    result.update(
+        events=len(records),
+        counts=counts,
+        duration=duration,
+        density=len(records) / duration if duration > 0 else 0.0,
+        coverage=with_window / guarded if guarded else 1.0,
+        pixel_coverage=clicks_with_pixel / counts["click"] if counts["click"] else 1.0,
+        stuck_keys=dict(Counter(str(value) for _kind, value in pressed_keys)),
+        stuck_buttons=dict(Counter(pressed_buttons)),
+        unmatched_releases=unmatched_releases,
+        duplicate_scrolls=duplicate_scrolls,
+        max_gap=max_gap_seen,
+        long_gaps=long_gaps,
+        repaired=recording.repaired,
+        rejected=recording.rejected,
+    )
+
+    issues = result["issues"]
+    if not records:
+        issues.append("empty recording")
+    if pressed_keys:
+        issues.append(f"stuck keys (press without release): {_tally(result['stuck_keys'])}")
+    if pressed_buttons:
+        issues.append(f"stuck mouse buttons: {_tally(result['stuck_buttons'])}")
+    if unmatched_releases:
+        issues.append(f"{unmatched_releases} releases without a press")
+    if guarded and with_window < guarded:
+        issues.append(f"{guarded - with_window}/{guarded} click/scroll/key events have no window context")
+    if duplicate_scrolls:
+        issues.append(f"{duplicate_scrolls} duplicate scroll events")
+    if long_gaps:
+        issues.append(f"{long_gaps} gaps longer than {max_gap:g}s (max {max_gap_seen:.1f}s)")
+    if recording.rejected:
+        issues.append(f"{recording.rejected} malformed events dropped at load")
+    if recording.repaired:
+        issues.append(f"{recording.repaired} events repaired at load")
+    return result
+
+
+def _tally(counts: dict, limit: int = 10) -> str:
+    ranked = sorted(counts.items(), key=lambda item: -item[1])[:limit]
+    parts = [name if amount == 1 else f"{name} (x{amount})" for name, amount in ranked]
+    if len(counts) > limit:
+        parts.append(f"... {len(counts) - limit} more")
+    return ", ".join(parts)
+
+
+def _content_hash(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_recordings(directory: Path, recursive: bool = False, exclude=()) -> list:
+    """Recording files under `directory`, skipping the cache and any resolved path in `exclude`."""
+    pattern = "**/*" if recursive else "*"
+    exclude = {Path(path).resolve() for path in exclude}
+    return sorted(
+        path for path in directory.glob(pattern)
+        if path.is_file()
+        and path.suffix in RECORDING_SUFFIXES
+        and path.name != CACHE_FILE
+        and path.resolve() not in exclude
+    )
+
+
+def _load_cache(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def _save_cache(path: Path, files: dict) -> None:
+    try:
+        path.write_text(json.dumps({"version": CACHE_VERSION, "files": files}), encoding="utf-8")
+    except OSError as exc:
+        print(f"Could not write cache {path}: {exc}", file=sys.stderr)
+
+
+def scan_directory(
+    directory: Path,
+    workers: int = None,
+    recursive: bool = False,
+    max_gap: float = DEFAULT_MAX_GAP,
+    use_cache: bool = True,
+    exclude=(),
+):
+    """Returns (results, analyzed_count); only files whose content hash changed are analyzed."""
+    paths = find_recordings(directory, recursive, exclude)
+    cache_path = directory / CACHE_FILE
+    cache = _load_cache(cache_path) if use_cache else {}
+    fresh_cache = {}
+    results = {}
+    todo = []
+    for path in paths:
+        key = str(path.relative_to(directory))
+        digest = _content_hash(path)
+        entry = cache.get(key)
+        if entry and entry.get("hash") == digest and entry.get("max_gap") == max_gap:
+            results[key] = entry["result"]
+            fresh_cache[key] = entry
+        else:
+            todo.append((key, path, digest))
+
+    if todo:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(todo)))
+        if workers == 1:
+            analyzed = [analyze_file(str(path), max_gap) for _key, path, _digest in todo]
+        else:
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                analyzed = list(pool.map(
+                    analyze_file,
+                    [str(path) for _key, path, _digest in todo],
+                    [max_gap] * len(todo),
+                ))
+        for (key, _path, digest), result in zip(todo, analyzed):
+            result["path"] = key
+            results[key] = result
+            fresh_cache[key] = {"hash": digest, "max_gap": max_gap, "result": result}
+
+    if use_cache:
+        _save_cache(cache_path, fresh_cache)
+    return [results[str(path.relative_to(directory))] for path in paths], len(todo)
+
+
+def _sort_value(result: dict, key: str):
+    if key == "name":
+        return result["path"]
+    if key == "issues":
+        return len(result["issues"])
+    if key == "stuck":
+        return sum(result.get("stuck_keys", {}).values()) + sum(result.get("stuck_buttons", {}).values())
+    if key == "gap":
+        return result.get("max_gap", 0.0)
+    return result.get(key, 0)
+
+
+def format_stats(results) -> str:
+    header = (
+        f"{'events':>9} {'move':>8} {'click':>6} {'scroll':>6} {'key':>6} {'duration':>9} "
+        f"{'ev/s':>7} {'cover':>6} {'stuck':>5} {'gap':>7} {'issues':>6}  file"
+    )
+    lines = [header]
+    for result in results:
+        if "events" not in result:
+            lines.append(f"{'-':>9} {'':>8} {'':>6} {'':>6} {'':>6} {'':>9} {'':>7} {'':>6} {'':>5} {'':>7} "
+                         f"{len(result['issues']):>6}  {result['path']}")
+            continue
+        counts = result["counts"]
+        lines.append(
+            f"{result['events']:>9} {counts['move']:>8} {counts['click']:>6} {counts['scroll']:>6} "
+            f"{counts['key']:>6} {result['duration']:>8.1f}s {result['density']:>7.1f} "
+            f"{result['coverage'] * 100:>5.0f}% {_sort_value(result, 'stuck'):>5} {result['max_gap']:>6.1f}s "
+            f"{len(result['issues']):>6}  {result['path']}"
+        )
+    return "\n".join(lines)
+
+
+def format_lint(results) -> str:
+    lines = []
+    for result in results:
+        for issue in result["issues"]:
+            lines.append(f"{result['path']}: {issue}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Lint or summarize every recording in a directory.")
+    parser.add_argument("command", choices=("lint", "stats"))
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--recursive", action="store_true", help="include subdirectories")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="name")
+    parser.add_argument("--reverse", action="store_true")
+    parser.add_argument("--max-gap", type=float, default=DEFAULT_MAX_GAP,
+                        help=f"report gaps between events longer than this (default {DEFAULT_MAX_GAP:g}s)")
+    parser.add_argument("--json", type=Path, help="also write all results to this JSON file")
+    parser.add_argument("--no-cache", action="store_true", help="ignore and do not update the hash cache")
+    args = parser.parse_args(argv)
+    if not args.directory.is_dir():
+        parser.error(f"{args.directory} is not a directory")
+
+    started_at = time.perf_counter()
+    # The --json report may live inside the scanned directory; it is not a recording.
+    results, analyzed = scan_directory(
+        args.directory,
+        args.workers,
+        args.recursive,
+        args.max_gap,
+        not args.no_cache,
+        exclude=[args.json] if args.json else (),
+    )
+    results.sort(key=lambda result: _sort_value(result, args.sort), reverse=args.reverse)
+    elapsed = time.perf_counter() - started_at
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    report = format_stats(results) if args.command == "stats" else format_lint(results)
+    if report:
+        print(report)
+    flagged = sum(1 for result in results if result["issues"])
+    print(
+        f"{len(results)} recordings, {flagged} with issues "
+        f"({analyzed} analyzed, {len(results) - analyzed} cached, {elapsed:.2f}s)",
+        file=sys.stderr,
+    )
+    return 1 if args.command == "lint" and flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
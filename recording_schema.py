@@ -0,0 +1,513 @@
+"""Recording schema: validation, repair, version upgrades and typed records.
+
+Recordings are compiled once at load time. The replay engine then works
+only with the `__slots__` records produced here and never re-checks
+event fields.
+
+Schema versions:
+    1  bare JSON list written by early builds; key payloads may use the
+       `{"kind": "text", "value": "Key.x"}` form.
+    2  current; special keys are always `{"kind": "special", ...}`.
+"""
+
+import json
+import math
+import threading
+from pathlib import Path
+
+from recording_archive import is_archive, iter_events, read_header
+from screen_layout import ScreenLayout
+
+
+SCHEMA_VERSION = 2
+LEGACY_SCHEMA_VERSION = 1
+EVENT_TYPES = ("move", "click", "scroll", "key")
+KEY_ACTIONS = ("press", "release")
+KEY_KINDS = ("special", "char", "vk")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def normalize_window_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def release_pressed(pressed: list, item) -> bool:
+    """Drops the latest press of `item` from `pressed`; False if it was not held.
+
+    Shared by the replay loop's safety release and the recording linter, so
+    both agree on which keys and buttons a recording leaves held.
+    """
+    for idx in range(len(pressed) - 1, -1, -1):
+        if pressed[idx] == item:
+            del pressed[idx]
+            return True
+    return False
+
+
+class WindowContextTable:
+    """Per-recording table of distinct window contexts.
+
+    Each distinct title/class pair is stored once, referenced by a small id
+    and normalized at intern time. Match results are memoized per context
+    id and raw foreground title/class, so repeated polls cost a dict lookup.
+    """
+
+    max_cached_matches = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contexts = []
+        self._ids = {}
+        self._normalized = []
+        self._match_cache = {}
+        self.match_calls = 0
+        self.match_cache_hits = 0
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def intern(self, context: dict) -> int:
+        title = str(context.get("title", ""))
+        class_name = str(context.get("class", ""))
+        key = (title, class_name)
+        context_id = self._ids.get(key)
+        if context_id is None:
+            with self._lock:
+                context_id = self._ids.get(key)
+                if context_id is None:
+                    context_id = len(self.contexts)
+                    self.contexts.append({"title": title, "class": class_name})
+                    self._normalized.append(
+                        (normalize_window_text(title), normalize_window_text(class_name))
+                    )
+                    self._ids[key] = context_id
+        return context_id
+
+    def shared(self, context: dict) -> dict:
+        """Returns the canonical dict for `context` so events can share one object."""
+        return self.contexts[self.intern(context)]
+
+    def intern_events(self, events) -> None:
+        for event in events:
+            context = event.get("window")
+            if isinstance(context, dict):
+                event["window"] = self.shared(context)
+
+    def matches(self, context_id: int, current: dict) -> bool:
+        self.match_calls += 1
+        current_title = current.get("title", "")
+        current_class = current.get("class", "")
+        cache_key = (context_id, current_title, current_class)
+        cached = self._match_cache.get(cache_key)
+        if cached is not None:
+            self.match_cache_hits += 1
+            return cached
+
+        expected_title, expected_class = self._normalized[context_id]
+        result = _normalized_context_matches(
+            expected_title,
+            expected_class,
+            normalize_window_text(str(current_title)),
+            normalize_window_text(str(current_class)),
+        )
+        if len(self._match_cache) >= self.max_cached_matches:
+            self._match_cache.clear()
+        self._match_cache[cache_key] = result
+        return result
+
+
+def _normalized_context_matches(
+    expected_title: str,
+    expected_class: str,
+    current_title: str,
+    current_class: str,
+) -> bool:
+    if expected_class and current_class and expected_class != current_class:
+        return False
+
+    if expected_title:
+        if not current_title:
+            return False
+        if expected_title == current_title:
+            return True
+        if expected_title in current_title or current_title in expected_title:
+            return True
+        return False
+
+    return True
+
+
+class EventRecord:
+    __slots__ = ("index", "type", "time", "window_id")
+
+    def __init__(self, index: int, event_type: str, time_offset: float, window_id=None):
+        self.index = index
+        self.type = event_type
+        self.time = time_offset
+        self.window_id = window_id
+
+    def rebased(self, index: int, time_offset: float, window_id):
+        """Shallow copy at another position and time; edited recordings build these lazily."""
+        clone = object.__new__(type(self))
+        for name in type(self).__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.index = index
+        clone.type = self.type
+        clone.time = time_offset
+        clone.window_id = window_id
+        return clone
+
+
+class MoveRecord(EventRecord):
+    __slots__ = ("x", "y")
+
+    def __init__(self, index: int, time_offset: float, x: int, y: int):
+        super().__init__(index, "move", time_offset)
+        self.x = x
+        self.y = y
+
+    def to_dict(self, window_table: WindowContextTable) -> dict:
+        return {"type": "move", "time": self.time, "x": self.x, "y": self.y}
+
+
+class ClickRecord(EventRecord):
+    __slots__ = ("x", "y", "button", "pressed", "pixel")
+
+    def __init__(
+        self,
+        index: int,
+        time_offset: float,
+        x: int,
+        y: int,
+        button: str,
+        pressed: bool,
+        pixel=None,
+        window_id=None,
+    ):
+        super().__init__(index, "click", time_offset, window_id)
+        self.x = x
+        self.y = y
+        self.button = button
+        self.pressed = pressed
+        self.pixel = pixel
+
+    def to_dict(self, window_table: WindowContextTable) -> dict:
+        event = {
+            "type": "click",
+            "time": self.time,
+            "x": self.x,
+            "y": self.y,
+            "button": self.button,
+            "pressed": self.pressed,
+        }
+        if self.pixel is not None:
+            event["pixel"] = {"r": self.pixel[0], "g": self.pixel[1], "b": self.pixel[2]}
+        if self.window_id is not None:
+            event["window"] = window_table.contexts[self.window_id]
+        return event
+
+
+class ScrollRecord(EventRecord):
+    __slots__ = ("x", "y", "dx", "dy")
+
+    def __init__(self, index: int, time_offset: float, x: int, y: int, dx: float, dy: float, window_id=None):
+        super().__init__(index, "scroll", time_offset, window_id)
+        self.x = x
+        self.y = y
+        self.dx = dx
+        self.dy = dy
+
+    def to_dict(self, window_table: WindowContextTable) -> dict:
+        event = {"type": "scroll", "time": self.time, "x": self.x, "y": self.y, "dx": self.dx, "dy": self.dy}
+        if self.window_id is not None:
+            event["window"] = window_table.contexts[self.window_id]
+        return event
+
+
+class KeyRecord(EventRecord):
+    __slots__ = ("action", "key_kind", "key_value")
+
+    def __init__(self, index: int, time_offset: float, action: str, key_kind: str, key_value, window_id=None):
+        super().__init__(index, "key", time_offset, window_id)
+        self.action = action
+        self.key_kind = key_kind
+        self.key_value = key_value
+
+    def to_dict(self, window_table: WindowContextTable) -> dict:
+        event = {
+            "type": "key",
+            "time": self.time,
+            "action": self.action,
+            "key": {"kind": self.key_kind, "value": self.key_value},
+        }
+        if self.window_id is not None:
+            event["window"] = window_table.contexts[self.window_id]
+        return event
+
+
+class CompiledRecording:
+    """Validated records sorted by time, plus the window table they reference."""
+
+    def __init__(self, records, window_table: WindowContextTable, source_version: int, screen: ScreenLayout = None):
+        self.records = records
+        self.window_table = window_table
+        self.source_version = source_version
+        self.screen = screen
+        self.point_cache = {}
+        self.repaired = 0
+        self.rejected = 0
+        self.problems = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def to_events(self) -> list:
+        return [record.to_dict(self.window_table) for record in self.records]
+
+    def summary(self) -> str:
+        return (
+            f"schema v{self.source_version}->v{SCHEMA_VERSION}, events={len(self.records)}, "
+            f"repaired={self.repaired}, rejected={self.rejected}"
+        )
+
+
+def _as_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            return None
+    else:
+        return None
+    if math.isnan(number) or math.isinf(number):
+        return None
+    return number
+
+
+def _as_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value, False
+    number = _as_number(value)
+    if number is None:
+        return None, False
+    return int(round(number)), True
+
+
+def _upgrade_key_payload(payload, version: int):
+    if version < 2 and isinstance(payload, dict) and payload.get("kind") == "text":
+        value = payload.get("value")
+        if isinstance(value, str) and value.startswith("Key."):
+            return {"kind": "special", "value": value.split("Key.", 1)[1]}, True
+    return payload, False
+
+
+class _Compiler:
+    max_problems = 50
+
+    def __init__(self, window_table: WindowContextTable, version: int):
+        self.window_table = window_table
+        self.version = version
+        self.repaired = 0
+        self.rejected = 0
+        self.problems = []
+        self.last_time = 0.0
+
+    def note(self, index: int, message: str) -> None:
+        if len(self.problems) < self.max_problems:
+            self.problems.append(f"event {index}: {message}")
+
+    def reject(self, index: int, message: str) -> None:
+        self.rejected += 1
+        self.note(index, f"rejected ({message})")
+
+    def compile_event(self, index: int, event):
+        if not isinstance(event, dict):
+            self.reject(index, "not an object")
+            return None
+        event_type = event.get("type")
+        if event_type not in EVENT_TYPES:
+            self.reject(index, f"unknown type {event_type!r}")
+            return None
+
+        repaired = False
+        raw_time = event.get("time")
+        time_offset = _as_number(raw_time)
+        if time_offset is None:
+            # Keep the event in place relative to its neighbours.
+            time_offset = self.last_time
+            repaired = True
+        elif not isinstance(raw_time, (int, float)):
+            repaired = True
+        if time_offset < 0:
+            time_offset = 0.0
+            repaired = True
+        self.last_time = time_offset
+
+        window_id = None
+        if "window" in event:
+            window = event["window"]
+            if (
+                isinstance(window, dict)
+                and isinstance(window.get("title", ""), str)
+                and isinstance(window.get("class", ""), str)
+            ):
+                window_id = self.window_table.intern(window)
+            else:
+                repaired = True
+
+        if event_type == "key":
+            record = self._compile_key(index, event, time_offset, window_id)
+        else:
+            x, x_repaired = _as_int(event.get("x"))
+            y, y_repaired = _as_int(event.get("y"))
+            if x is None or y is None:
+                self.reject(index, "missing or invalid coordinates")
+                return None
+            repaired = repaired or x_repaired or y_repaired
+            if event_type == "move":
+                record = MoveRecord(index, time_offset, x, y)
+            elif event_type == "click":
+                record = self._compile_click(index, event, time_offset, x, y, window_id)
+            else:
+                dx = _as_number(event.get("dx", 0.0))
+                dy = _as_number(event.get("dy", 0.0))
+                if dx is None or dy is None:
+                    self.reject(index, "invalid scroll delta")
+                    return None
+                record = ScrollRecord(index, time_offset, x, y, dx, dy, window_id)
+
+        if record is None:
+            return None
+        if isinstance(record, tuple):
+            record, extra_repair = record
+            repaired = repaired or extra_repair
+        if repaired:
+            self.repaired += 1
+            self.note(index, "repaired")
+        return record
+
+    def _compile_click(self, index: int, event: dict, time_offset: float, x: int, y: int, window_id):
+        button = event.get("button")
+        if not isinstance(button, str) or not button:
+            self.reject(index, "missing button")
+            return None
+        pressed = event.get("pressed")
+        repaired = False
+        if not isinstance(pressed, bool):
+            if pressed in (0, 1):
+                pressed = bool(pressed)
+                repaired = True
+            else:
+                self.reject(index, "missing pressed flag")
+                return None
+        pixel = None
+        if "pixel" in event:
+            raw_pixel = event["pixel"]
+            channels = None
+            if isinstance(raw_pixel, dict):
+                channels = [_as_int(raw_pixel.get(name))[0] for name in ("r", "g", "b")]
+            if channels and all(value is not None and 0 <= value <= 255 for value in channels):
+                pixel = tuple(channels)
+            else:
+                # A broken pixel sample only disables the pixel guard for this click.
+                repaired = True
+        return ClickRecord(index, time_offset, x, y, button, pressed, pixel, window_id), repaired
+
+    def _compile_key(self, index: int, event: dict, time_offset: float, window_id):
+        action = event.get("action")
+        if action not in KEY_ACTIONS:
+            self.reject(index, f"invalid key action {action!r}")
+            return None
+        payload, upgraded = _upgrade_key_payload(event.get("key"), self.version)
+        if not isinstance(payload, dict) or payload.get("kind") not in KEY_KINDS:
+            self.reject(index, "invalid key payload")
+            return None
+        kind = payload["kind"]
+        value = payload.get("value")
+        if kind == "vk":
+            value, vk_repaired = _as_int(value)
+            if value is None:
+                self.reject(index, "invalid virtual key code")
+                return None
+            upgraded = upgraded or vk_repaired
+        elif not isinstance(value, str) or value == "":
+            self.reject(index, "invalid key value")
+            return None
+        return KeyRecord(index, time_offset, action, kind, value, window_id), upgraded
+
+
+def compile_events(
+    events,
+    version: int = SCHEMA_VERSION,
+    window_table: WindowContextTable = None,
+    screen: dict = None,
+) -> CompiledRecording:
+    """Validates, repairs and upgrades raw events in one pass."""
+    if version > SCHEMA_VERSION:
+        raise SchemaError(f"Recording schema v{version} is newer than supported v{SCHEMA_VERSION}")
+    # An empty table is falsy, so test for None to keep a caller's shared table.
+    if window_table is None:
+        window_table = WindowContextTable()
+    compiler = _Compiler(window_table, version)
+    records = []
+    needs_sort = False
+    previous_time = 0.0
+    for index, event in enumerate(events):
+        record = compiler.compile_event(index, event)
+        if record is None:
+            continue
+        if record.time < previous_time:
+            needs_sort = True
+        previous_time = record.time
+        records.append(record)
+    if needs_sort:
+        records.sort(key=lambda record: record.time)
+    for position, record in enumerate(records):
+        record.index = position
+
+    compiled = CompiledRecording(records, window_table, version, ScreenLayout.from_dict(screen))
+    compiled.repaired = compiler.repaired
+    compiled.rejected = compiler.rejected
+    compiled.problems = compiler.problems
+    return compiled
+
+
+def _schema_version(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < LEGACY_SCHEMA_VERSION:
+        raise SchemaError(f"Invalid recording schema version {value!r}")
+    return value
+
+
+def read_recording_file(path: Path):
+    """Returns (schema_version, raw_events, screen) for an archive or JSON recording.
+
+    `screen` is the recorded virtual-screen layout dict, or None for files
+    written before layouts were captured.
+    """
+    path = Path(path)
+    if is_archive(path):
+        data = path.read_bytes()
+        header = read_header(data)
+        version = _schema_version(header.get("schema", LEGACY_SCHEMA_VERSION))
+        return version, iter_events(data), header.get("screen")
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except ValueError as exc:  # also covers UnicodeDecodeError
+        raise SchemaError(f"Recording file is not valid JSON: {exc}") from exc
+    if isinstance(data, list):
+        return LEGACY_SCHEMA_VERSION, data, None
+    if not isinstance(data, dict) or not isinstance(data.get("events"), list):
+        raise SchemaError("Recording file must contain a list of events")
+    return _schema_version(data.get("schema", LEGACY_SCHEMA_VERSION)), data["events"], data.get("screen")
+
+
+def load_recording(path: Path, window_table: WindowContextTable = None) -> CompiledRecording:
+    version, events, screen = read_recording_file(path)
+    return compile_events(events, version, window_table, screen)
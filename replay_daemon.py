@@ -0,0 +1,680 @@
+"""Local replay job daemon: a localhost HTTP API over a persistent job queue.
+
+Jobs are stored in SQLite next to the app data, so queued jobs survive a
+restart (jobs that were running when the daemon stopped are queued again).
+One scheduler thread runs jobs back-to-back inside the daemon process,
+reusing the imported engine, the input controllers and compiled recordings
+instead of starting a process per job.
+
+API (JSON):
+    POST /jobs                {"recording": ID, "loops": N, "smart_wait": S,
+                               "tolerance": N, "priority": N, ...} -> job
+    GET  /jobs[?state=queued] list jobs
+    GET  /jobs/ID             job, plus live progress while it runs
+    POST /jobs/ID/cancel      cancel a queued or running job
+    GET  /health              queue depth, throughput and recordings dir
+
+Usage:
+    python replay_daemon.py serve [--port 8765] [--recordings DIR] [--dry-run]
+    python replay_daemon.py submit RECORDING [--loops N] [--priority N] ...
+    python replay_daemon.py status [JOB_ID]
+    python replay_daemon.py cancel JOB_ID
+    python replay_daemon.py bench [--jobs 200]
+"""
+
+import argparse
+import json
+import signal
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+DEFAULT_PORT = 8765
+RECORDING_SUFFIXES = (".mtr", ".json")
+JOB_STATES = ("queued", "running", "done", "stopped", "failed", "cancelled")
+FINISHED_STATES = ("done", "stopped", "failed", "cancelled")
+
+JOB_COLUMNS = (
+    "id",
+    "recording",
+    "loops",
+    "smart",
+    "smart_wait",
+    "pixel_guard",
+    "tolerance",
+    "exact_key_timing",
+    "priority",
+    "state",
+    "enqueued_at",
+    "started_at",
+    "finished_at",
+    "completed_loops",
+    "events",
+    "stop_reason",
+    "error",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recording TEXT NOT NULL,
+    loops INTEGER NOT NULL,
+    smart INTEGER NOT NULL,
+    smart_wait REAL NOT NULL,
+    pixel_guard INTEGER NOT NULL,
+    tolerance INTEGER NOT NULL,
+    exact_key_timing INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    completed_loops INTEGER NOT NULL DEFAULT 0,
+    events INTEGER NOT NULL DEFAULT 0,
+    stop_reason TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (state, priority DESC, id);
+"""
+
+
+class JobError(ValueError):
+    pass
+
+
+class JobStore:
+    """SQLite-backed queue; one connection shared by the HTTP and scheduler threads."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # A job that was running when the daemon stopped never finished.
+        self._db.execute("UPDATE jobs SET state = 'queued', started_at = NULL WHERE state = 'running'")
+
+    def _row(self, row) -> dict:
+        return dict(zip(JOB_COLUMNS, row)) if row else None
+
+    def add(self, spec: dict) -> dict:
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (recording, loops, smart, smart_wait, pixel_guard, tolerance, "
+                "exact_key_timing, priority, state, enqueued_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                (
+                    spec["recording"],
+                    spec["loops"],
+                    int(spec["smart"]),
+                    spec["smart_wait"],
+                    int(spec["pixel_guard"]),
+                    spec["tolerance"],
+                    int(spec["exact_key_timing"]),
+                    spec["priority"],
+                    time.time(),
+                ),
+            )
+            return self._get(cursor.lastrowid)
+
+    def _get(self, job_id: int):
+        cursor = self._db.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        return self._row(cursor.fetchone())
+
+    def get(self, job_id: int):
+        with self._lock:
+            return self._get(job_id)
+
+    def list(self, state: str = None, limit: int = 200) -> list:
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params = ()
+        if state:
+            query += " WHERE state = ?"
+            params = (state,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            return [self._row(row) for row in self._db.execute(query, params + (limit,))]
+
+    def claim_next(self, on_claimed=None):
+        """Marks the next queued job running; `on_claimed(job)` runs before the lock is released."""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE state = 'queued' "
+                "ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job = self._row(row)
+            self._db.execute(
+                "UPDATE jobs SET state = 'running', started_at = ? WHERE id = ?",
+                (time.time(), job["id"]),
+            )
+            job = self._get(job["id"])
+            if on_claimed is not None:
+                on_claimed(job)
+            return job
+
+    def finish(self, job_id: int, state: str, completed_loops: int, events: int, stop_reason: str, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, finished_at = ?, completed_loops = ?, events = ?, "
+                "stop_reason = ?, error = ? WHERE id = ?",
+                (state, time.time(), completed_loops, events, stop_reason, error, job_id),
+            )
+
+    def requeue(self, job_id: int) -> None:
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = 'queued', started_at = NULL WHERE id = ?", (job_id,))
+
+    def cancel_queued(self, job_id: int) -> bool:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET state = 'cancelled', finished_at = ?, stop_reason = 'Cancelled via API' "
+                "WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id),
+            )
+            return cursor.rowcount > 0
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+
+class NullController:
+    """Accepts injections without touching the desktop (daemon --dry-run)."""
+
+    def __init__(self):
+        self.position = (0, 0)
+        self.injections = 0
+
+    def press(self, _item) -> None:
+        self.injections += 1
+
+    def release(self, _item) -> None:
+        self.injections += 1
+
+    def scroll(self, _dx, _dy) -> None:
+        self.injections += 1
+
+    def type(self, _text) -> None:
+        self.injections += 1
+
+
+def parse_job_spec(payload) -> dict:
+    if not isinstance(payload, dict):
+        raise JobError("job must be a JSON object")
+    recording = payload.get("recording")
+    if not isinstance(recording, str) or not recording.strip():
+        raise JobError("'recording' must be a recording id")
+    try:
+        spec = {
+            "recording": recording.strip(),
+            "loops": int(payload.get("loops", 1)),
+            "smart": bool(payload.get("smart", True)),
+            "smart_wait": float(payload.get("smart_wait", 8.0)),
+            "pixel_guard": bool(payload.get("pixel_guard", True)),
+            "tolerance": int(payload.get("tolerance", 28)),
+            "exact_key_timing": bool(payload.get("exact_key_timing", False)),
+            "priority": int(payload.get("priority", 0)),
+        }
+    except (TypeError, ValueError) as exc:
+        raise JobError(f"invalid job field: {exc}") from exc
+    if spec["loops"] < 1:
+        raise JobError("'loops' must be at least 1")
+    if not 0.0 < spec["smart_wait"] <= 120.0:
+        raise JobError("'smart_wait' must be in (0, 120] seconds")
+    if not 1 <= spec["tolerance"] <= 255:
+        raise JobError("'tolerance' must be between 1 and 255")
+    return spec
+
+
+class ReplayDaemon:
+    """Owns the job store, the scheduler thread and the warm replay state."""
+
+    def __init__(self, data_dir: Path, recordings_dir: Path, dry_run: bool = False, log=None):
+        import main
+
+        self.main = main
+        self.data_dir = Path(data_dir)
+        self.recordings_dir = Path(recordings_dir)
+        self.dry_run = dry_run
+        self.log = log or (lambda _message: None)
+        self.store = JobStore(self.data_dir / "replay_jobs.sqlite3")
+        self.started_at = time.time()
+        self.jobs_run = 0
+        self.current = None  # (job_id, engine or None, token) from claim until the job ends
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._recordings = {}
+        self._controllers = None
+
+    def resolve_recording(self, recording_id: str) -> Path:
+        if recording_id == "last":
+            return self.data_dir / f"last_recording{self.main.ARCHIVE_SUFFIX}"
+        root = self.recordings_dir.resolve()
+        for suffix in ("",) + RECORDING_SUFFIXES:
+            candidate = (root / f"{recording_id}{suffix}").resolve()
+            if candidate.parent != root and root not in candidate.parents:
+                raise JobError(f"recording id {recording_id!r} escapes the recordings directory")
+            if candidate.is_file():
+                return candidate
+        raise JobError(f"unknown recording {recording_id!r}")
+
+    def _compiled(self, path: Path):
+        # Recordings are compiled once per file version and shared by later jobs.
+        mtime = path.stat().st_mtime_ns
+        cached = self._recordings.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        from recording_schema import load_recording
+
+        recording = load_recording(path)
+        self._recordings[path] = (mtime, recording)
+        return recording
+
+    def _replay_controllers(self):
+        if self._controllers is None:
+            if self.dry_run:
+                controller = NullController()
+                self._controllers = (controller, controller)
+            else:
+                x_display = self.main.get_x11_display()
+                if x_display is not None and x_display.has_xtest:
+                    import x11_backend
+
+                    self._controllers = (
+                        x11_backend.X11MouseController(x_display),
+                        x11_backend.X11KeyboardController(x_display),
+                    )
+                else:
+                    self._controllers = (self.main.mouse.Controller(), self.main.keyboard.Controller())
+        return self._controllers
+
+    def submit(self, payload) -> dict:
+        spec = parse_job_spec(payload)
+        self.resolve_recording(spec["recording"])
+        job = self.store.add(spec)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job
+
+    def cancel(self, job_id: int) -> dict:
+        if self.store.cancel_queued(job_id):
+            return self.store.get(job_id)
+        current = self.current
+        if current and current[0] == job_id:
+            current[2].cancel("Cancelled via API")
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobError(f"unknown job {job_id}")
+        return job
+
+    def job_status(self, job_id: int):
+        job = self.store.get(job_id)
+        current = self.current
+        engine = current[1] if current and current[0] == job_id else None
+        if job and engine is not None and engine.progress is not None:
+            progress = engine.progress
+            now = time.perf_counter()
+            loop_number, event_index, event_time, events_done, lateness = progress.latest
+            job["progress"] = {
+                "loop": loop_number,
+                "event_index": event_index,
+                "events_per_loop": progress.events_per_loop,
+                "event_time": event_time,
+                "events_done": events_done,
+                "lateness_ms": lateness * 1000.0,
+                "guard_wait_s": progress.guard_wait_seconds(),
+                "eta_s": progress.eta_seconds(now),
+            }
+        return job
+
+    def health(self) -> dict:
+        uptime = time.time() - self.started_at
+        current = self.current
+        return {
+            "uptime_s": uptime,
+            "jobs": self.store.counts(),
+            "jobs_run": self.jobs_run,
+            "jobs_per_min": self.jobs_run / uptime * 60.0 if uptime else 0.0,
+            "running": current[0] if current else None,
+            "recordings_dir": str(self.recordings_dir),
+            "dry_run": self.dry_run,
+        }
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._schedule, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        current = self.current
+        if current:
+            current[2].cancel("Daemon stopping")
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def _schedule(self) -> None:
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self.store.claim_next(self._publish_claimed)
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(timeout=1.0)
+                continue
+            self._run_job(job)
+
+    def _publish_claimed(self, job: dict) -> None:
+        # Runs under the store lock, so a cancel either still finds the job
+        # queued or finds it here, before any setup has started.
+        self.current = (job["id"], None, self.main.CancellationToken())
+
+    def _run_job(self, job: dict) -> None:
+        token = self.current[2]
+        try:
+            self._run_claimed(job, token)
+        except Exception as exc:
+            # One bad job must not stop the scheduler or stay "running" forever.
+            error = f"{type(exc).__name__}: {exc}"
+            self.store.finish(job["id"], "failed", 0, 0, "", error)
+            self.log(f"Job {job['id']} failed ({error})")
+        finally:
+            self.current = None
+
+    def _run_claimed(self, job: dict, token) -> None:
+        main = self.main
+        try:
+            recording = self._compiled(self.resolve_recording(job["recording"]))
+        except (OSError, ValueError) as exc:
+            self.store.finish(job["id"], "failed", 0, 0, "", str(exc))
+            return
+        # A dry run must not look at the real desktop either.
+        guards_available = main.native_context_available() and not self.dry_run
+        options = main.ReplayOptions(
+            replay_count=job["loops"],
+            smart_enabled=bool(job["smart"]) and guards_available,
+            smart_wait_timeout=job["smart_wait"],
+            pixel_guard_enabled=bool(job["pixel_guard"]) and guards_available,
+            pixel_tolerance=job["tolerance"],
+            exact_key_timing=bool(job["exact_key_timing"]),
+        )
+        mouse_controller, keyboard_controller = self._replay_controllers()
+        engine = main.ReplayEngine(
+            recording,
+            options,
+            mouse_controller,
+            keyboard_controller,
+            cancel_token=token,
+            log=self.log,
+            screen=main.get_screen_layout(),
+        )
+        self.current = (job["id"], engine, token)
+        self.log(f"Job {job['id']} started ({job['recording']}, {options.describe()})")
+        try:
+            result = engine.run()
+        except Exception as exc:
+            self.store.finish(job["id"], "failed", 0, 0, "", f"{type(exc).__name__}: {exc}")
+            return
+        finally:
+            self.jobs_run += 1
+        events = engine.progress.events_done if engine.progress else 0
+        if result.stopped and token.reason == "Daemon stopping":
+            # Interrupted by shutdown: run it again from the start after restart.
+            self.store.requeue(job["id"])
+            self.log(f"Job {job['id']} requeued (daemon stopping)")
+            return
+        if result.stopped and token.reason == "Cancelled via API":
+            state = "cancelled"
+        elif result.stopped:
+            state = "stopped"
+        else:
+            state = "done"
+        self.store.finish(job["id"], state, result.completed_loops, events, result.stop_reason, "")
+        self.log(f"Job {job['id']} {state} (loops={result.completed_loops}/{job['loops']}, events={events})")
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    daemon = None  # set on the subclass created by serve()
+
+    def log_message(self, _format, *_args) -> None:
+        pass
+
+    def _reply(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self, part: str) -> int:
+        try:
+            return int(part)
+        except ValueError:
+            raise JobError(f"invalid job id {part!r}") from None
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as exc:
+            raise JobError(f"invalid JSON: {exc}") from exc
+
+    def do_GET(self) -> None:
+        path, _, query = self.path.partition("?")
+        parts = [part for part in path.split("/") if part]
+        try:
+            if parts == ["health"]:
+                self._reply(200, self.daemon.health())
+            elif parts == ["jobs"]:
+                state = None
+                limit = 200
+                for item in query.split("&"):
+                    key, _, value = item.partition("=")
+                    if key == "state" and value:
+                        state = value
+                    elif key == "limit" and value.isdigit():
+                        limit = int(value)
+                self._reply(200, self.daemon.store.list(state, limit))
+            elif len(parts) == 2 and parts[0] == "jobs":
+                job = self.daemon.job_status(self._job_id(parts[1]))
+                self._reply(200 if job else 404, job or {"error": "unknown job"})
+            else:
+                self._reply(404, {"error": "not found"})
+        except JobError as exc:
+            self._reply(400, {"error": str(exc)})
+
+    def do_POST(self) -> None:
+        parts = [part for part in self.path.partition("?")[0].split("/") if part]
+        try:
+            if parts == ["jobs"]:
+                self._reply(201, self.daemon.submit(self._read_json()))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                self._reply(200, self.daemon.cancel(self._job_id(parts[1])))
+            else:
+                self._reply(404, {"error": "not found"})
+        except JobError as exc:
+            self._reply(400, {"error": str(exc)})
+
+
+def _raise_interrupt(_signum, _frame):
+    raise KeyboardInterrupt
+
+
+def serve(args) -> int:
+    import main
+
+    data_dir = main.get_app_data_dir()
+    recordings_dir = Path(args.recordings) if args.recordings else data_dir / "recordings"
+    recordings_dir.mkdir(parents=True, exist_ok=True)
+    log_file = data_dir / "replay_daemon.log"
+
+    def log(message: str) -> None:
+        try:
+            with log_file.open("a", encoding="utf-8") as handle:
+                handle.write(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}\n")
+        except OSError:
+            pass
+
+    daemon = ReplayDaemon(data_dir, recordings_dir, dry_run=args.dry_run, log=log)
+    handler = type("ApiHandler", (_ApiHandler,), {"daemon": daemon})
+    try:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+    except OSError as exc:
+        print(f"Cannot listen on {args.host}:{args.port}: {exc}", file=sys.stderr)
+        return 1
+    # Service managers stop daemons with SIGTERM; shut down like Ctrl+C.
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    daemon.start()
+    print(f"Replay daemon on http://{args.host}:{args.port} (recordings: {recordings_dir})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.stop()
+    return 0
+
+
+def _request(url: str, method: str = "GET", payload=None):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return json.loads(exc.read() or b"{}") | {"status": exc.code}
+
+
+def bench(args) -> int:
+    """Measures enqueue round trip, queue latency and back-to-back job throughput."""
+    base = f"http://{args.host}:{args.port}"
+    health = _request(f"{base}/health")
+    recording_id = args.recording
+    if recording_id is None:
+        # A tiny zero-delay recording, so the numbers reflect scheduling, not replay time.
+        recording_id = "_bench"
+        events = [{"type": "move", "time": 0.0, "x": idx, "y": idx} for idx in range(args.events)]
+        Path(health["recordings_dir"], f"{recording_id}.json").write_text(json.dumps(events), encoding="utf-8")
+
+    submit_ms = []
+    job_ids = []
+    started_at = time.perf_counter()
+    for _ in range(args.jobs):
+        sent_at = time.perf_counter()
+        job = _request(f"{base}/jobs", "POST", {"recording": recording_id, "loops": 1, "smart": False,
+                                                "pixel_guard": False})
+        submit_ms.append((time.perf_counter() - sent_at) * 1000.0)
+        if "id" not in job:
+            print(f"submit failed: {job}", file=sys.stderr)
+            return 1
+        job_ids.append(job["id"])
+
+    pending = set(job_ids)
+    finished = {}
+    while pending:
+        for job in _request(f"{base}/jobs?limit={args.jobs}"):
+            if job["id"] in pending and job["state"] in FINISHED_STATES:
+                pending.discard(job["id"])
+                finished[job["id"]] = job
+        if pending:
+            time.sleep(0.05)
+    wall = time.perf_counter() - started_at
+
+    queue_ms = [(job["started_at"] - job["enqueued_at"]) * 1000.0 for job in finished.values()]
+    run_ms = [(job["finished_at"] - job["started_at"]) * 1000.0 for job in finished.values()]
+    starts = sorted(job["started_at"] for job in finished.values())
+    gaps_ms = [(later - earlier) * 1000.0 for earlier, later in zip(starts, starts[1:])]
+    print(json.dumps({
+        "jobs": args.jobs,
+        "wall_s": wall,
+        "jobs_per_s": args.jobs / wall,
+        "submit_ms_p50": statistics.median(submit_ms),
+        "submit_ms_max": max(submit_ms),
+        "queue_ms_p50": statistics.median(queue_ms),
+        "queue_ms_max": max(queue_ms),
+        "run_ms_p50": statistics.median(run_ms),
+        "start_gap_ms_p50": statistics.median(gaps_ms) if gaps_ms else 0.0,
+    }, indent=2))
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local replay job daemon and client.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("--recordings", help="directory of recordings addressable by id")
+    serve_parser.add_argument("--dry-run", action="store_true", help="replay without injecting input")
+
+    submit_parser = commands.add_parser("submit", help="enqueue a replay job")
+    submit_parser.add_argument("recording", help="recording id (file name without suffix, or 'last')")
+    submit_parser.add_argument("--loops", type=int, default=1)
+    submit_parser.add_argument("--smart-wait", type=float, default=8.0)
+    submit_parser.add_argument("--tolerance", type=int, default=28)
+    submit_parser.add_argument("--priority", type=int, default=0)
+    submit_parser.add_argument("--no-smart", action="store_true")
+    submit_parser.add_argument("--no-pixel-guard", action="store_true")
+
+    status_parser = commands.add_parser("status", help="show one job or the recent queue")
+    status_parser.add_argument("job_id", nargs="?", type=int)
+
+    cancel_parser = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel_parser.add_argument("job_id", type=int)
+
+    bench_parser = commands.add_parser("bench", help="measure queue latency and throughput")
+    bench_parser.add_argument("--jobs", type=int, default=200)
+    bench_parser.add_argument("--events", type=int, default=20, help="events in the generated bench recording")
+    bench_parser.add_argument("--recording", help="use an existing recording id instead of a generated one")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        return serve(args)
+    if args.command == "bench":
+        return bench(args)
+
+    base = f"http://{args.host}:{args.port}"
+    try:
+        if args.command == "submit":
+            payload = {
+                "recording": args.recording,
+                "loops": args.loops,
+                "smart_wait": args.smart_wait,
+                "tolerance": args.tolerance,
+                "priority": args.priority,
+                "smart": not args.no_smart,
+                "pixel_guard": not args.no_pixel_guard,
+            }
+            reply = _request(f"{base}/jobs", "POST", payload)
+        elif args.command == "cancel":
+            reply = _request(f"{base}/jobs/{args.job_id}/cancel", "POST", {})
+        elif args.job_id is not None:
+            reply = _request(f"{base}/jobs/{args.job_id}")
+        else:
+            reply = _request(f"{base}/jobs")
+    except urllib.error.URLError as exc:
+        print(f"Cannot reach daemon at {base}: {exc.reason}", file=sys.stderr)
+        return 1
+    print(json.dumps(reply, indent=2))
+    return 0 if "error" not in reply else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,391 @@
+"""Replay farm: run recordings in parallel, one worker process per virtual X display.
+
+Every worker owns a private Xvfb server, so each replay has its own cursor
+and keyboard focus, and workers never contend for the desktop. The
+coordinator hands out jobs, collects per-job results as they finish and
+can cancel every running and queued job at once.
+
+Usage:
+    python replay_farm.py [--workers N] [--loops N] [--smart] [--wait S]
+                          [--pixel-guard] [--tolerance N] [--overlap-loops]
+                          [--screen WxHxD]
+                          [--display :N ...] RECORDING[:LOOPS] ...
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+DEFAULT_SCREEN = "1920x1080x24"
+
+
+class FarmJob:
+    def __init__(
+        self,
+        job_id: int,
+        recording_path,
+        replay_count: int = 1,
+        smart_enabled: bool = False,
+        smart_wait_timeout: float = 8.0,
+        pixel_guard_enabled: bool = False,
+        pixel_tolerance: int = 28,
+        exact_key_timing: bool = False,
+        overlap_loops: bool = False,
+    ):
+        self.job_id = job_id
+        self.recording_path = str(recording_path)
+        self.replay_count = max(1, int(replay_count))
+        self.smart_enabled = smart_enabled
+        self.smart_wait_timeout = smart_wait_timeout
+        self.pixel_guard_enabled = pixel_guard_enabled
+        self.pixel_tolerance = pixel_tolerance
+        self.exact_key_timing = exact_key_timing
+        self.overlap_loops = overlap_loops
+
+
+class JobResult:
+    def __init__(self, job_id: int, worker_id: int, display: str):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.display = display
+        self.replay_count = 0
+        self.completed_loops = 0
+        self.events = 0
+        self.wall_seconds = 0.0
+        self.guard_wait_seconds = 0.0
+        self.stopped = False
+        self.stop_reason = ""
+        self.error = ""
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+class XvfbServer:
+    """A private Xvfb instance; the display number is picked by the server via -displayfd."""
+
+    def __init__(self, screen: str = DEFAULT_SCREEN, start_timeout: float = 10.0):
+        self.screen = screen
+        self.start_timeout = start_timeout
+        self.process = None
+        self.display = None
+
+    def start(self) -> str:
+        executable = shutil.which("Xvfb")
+        if executable is None:
+            raise RuntimeError("Xvfb not found; install xvfb or pass --display for existing servers")
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [executable, "-displayfd", str(write_fd), "-screen", "0", self.screen, "-nolisten", "tcp"],
+                pass_fds=(write_fd,),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                # Keep Ctrl+C from killing the servers before workers stop cleanly.
+                start_new_session=True,
+            )
+        finally:
+            os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as reader:
+            # Xvfb writes "<display>\n" once it accepts connections.
+            ready, _, _ = select.select([reader], [], [], self.start_timeout)
+            number = reader.readline().strip() if ready else b""
+        if not number:
+            self.stop()
+            raise RuntimeError("Xvfb exited before reporting its display")
+        self.display = f":{number.decode()}"
+        return self.display
+
+    def stop(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+
+def run_replay_job(job: FarmJob, worker_id: int, display: str, cancel_event, log=None) -> JobResult:
+    """Replays one job on `display` inside a farm worker process.
+
+    Sets $DISPLAY for the whole process, so it must only run in a process
+    dedicated to that display (the job daemon builds its own engine).
+    """
+    # The XTest controllers and the window/pixel guards all use the default
+    # connection, which x11_backend opens to $DISPLAY on first use.
+    os.environ["DISPLAY"] = display
+    import main
+    import x11_backend
+    from recording_schema import load_recording
+
+    result = JobResult(job.job_id, worker_id, display)
+    result.replay_count = job.replay_count
+    x_display = x11_backend.default_display()
+    if x_display is None or not x_display.has_xtest:
+        result.error = f"X display {display} with XTest is not available"
+        return result
+    try:
+        recording = load_recording(Path(job.recording_path))
+    except (OSError, ValueError) as exc:
+        result.error = f"Cannot load {job.recording_path}: {exc}"
+        return result
+
+    options = main.ReplayOptions(
+        replay_count=job.replay_count,
+        smart_enabled=job.smart_enabled,
+        smart_wait_timeout=job.smart_wait_timeout,
+        pixel_guard_enabled=job.pixel_guard_enabled,
+        pixel_tolerance=job.pixel_tolerance,
+        exact_key_timing=job.exact_key_timing,
+        overlap_loops=job.overlap_loops,
+    )
+    token = main.CancellationToken()
+    finished = threading.Event()
+
+    def forward_cancel():
+        while not finished.is_set():
+            if cancel_event.wait(0.05):
+                token.cancel("Cancelled by coordinator")
+                return
+
+    threading.Thread(target=forward_cancel, daemon=True).start()
+
+    engine = main.ReplayEngine(
+        recording,
+        options,
+        x11_backend.X11MouseController(x_display),
+        x11_backend.X11KeyboardController(x_display),
+        cancel_token=token,
+        log=log,
+        screen=main.get_screen_layout(),
+    )
+    started_at = time.perf_counter()
+    try:
+        replay = engine.run()
+    finally:
+        finished.set()
+    result.wall_seconds = time.perf_counter() - started_at
+    result.completed_loops = replay.completed_loops
+    result.events = engine.progress.events_done if engine.progress else 0
+    result.guard_wait_seconds = engine.window_wait_stats.wait_seconds + engine.pixel_wait_stats.wait_seconds
+    result.stopped = replay.stopped
+    result.stop_reason = replay.stop_reason
+    return result
+
+
+def _worker_main(worker_id: int, display: str, jobs, results, cancel_event) -> None:
+    # Ctrl+C is handled by the coordinator, which cancels every worker at once.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        if cancel_event.is_set():
+            result = JobResult(job.job_id, worker_id, display)
+            result.replay_count = job.replay_count
+            result.stopped = True
+            result.stop_reason = "Cancelled before start"
+        else:
+            try:
+                result = run_replay_job(job, worker_id, display, cancel_event)
+            except Exception as exc:
+                result = JobResult(job.job_id, worker_id, display)
+                result.error = f"{type(exc).__name__}: {exc}"
+        results.put(result.to_dict())
+
+
+class FarmStats:
+    def __init__(self):
+        self.jobs = 0
+        self.failed = 0
+        self.stopped = 0
+        self.loops = 0
+        self.events = 0
+        self.replay_seconds = 0.0
+        self.guard_wait_seconds = 0.0
+        self.stop_reasons = {}
+        self.per_worker = {}
+
+    def add(self, result: dict) -> None:
+        self.jobs += 1
+        self.loops += result["completed_loops"]
+        self.events += result["events"]
+        self.replay_seconds += result["wall_seconds"]
+        self.guard_wait_seconds += result["guard_wait_seconds"]
+        if result["error"]:
+            self.failed += 1
+        elif result["stopped"]:
+            self.stopped += 1
+            reason = result["stop_reason"] or "unknown"
+            self.stop_reasons[reason] = self.stop_reasons.get(reason, 0) + 1
+        worker = self.per_worker.setdefault(result["worker_id"], {"jobs": 0, "loops": 0, "events": 0})
+        worker["jobs"] += 1
+        worker["loops"] += result["completed_loops"]
+        worker["events"] += result["events"]
+
+    def summary(self, wall_seconds: float) -> str:
+        lines = [
+            f"jobs={self.jobs} failed={self.failed} stopped={self.stopped} loops={self.loops} "
+            f"events={self.events} wall={wall_seconds:.1f}s "
+            f"events/s={self.events / wall_seconds if wall_seconds else 0.0:.0f} "
+            f"replay_time={self.replay_seconds:.1f}s guard_wait={self.guard_wait_seconds:.1f}s"
+        ]
+        for worker_id in sorted(self.per_worker):
+            worker = self.per_worker[worker_id]
+            lines.append(
+                f"  worker {worker_id}: jobs={worker['jobs']} loops={worker['loops']} events={worker['events']}"
+            )
+        for reason, count in sorted(self.stop_reasons.items(), key=lambda item: -item[1]):
+            lines.append(f"  stopped x{count}: {reason}")
+        return "\n".join(lines)
+
+
+class ReplayFarm:
+    """Schedules jobs over worker processes, each bound to its own X display."""
+
+    def __init__(self, workers: int = None, displays=None, screen: str = DEFAULT_SCREEN):
+        self.worker_count = workers or (len(displays) if displays else os.cpu_count() or 1)
+        self.displays = list(displays or [])
+        self.screen = screen
+        self.stats = FarmStats()
+        self._context = multiprocessing.get_context("spawn")
+        self._cancel = self._context.Event()
+        self._servers = []
+        self._processes = []
+
+    def cancel_all(self) -> None:
+        self._cancel.set()
+
+    def _start_displays(self):
+        displays = list(self.displays[:self.worker_count])
+        while len(displays) < self.worker_count:
+            server = XvfbServer(self.screen)
+            displays.append(server.start())
+            self._servers.append(server)
+        return displays
+
+    def run(self, jobs, on_result=None) -> list:
+        jobs = list(jobs)
+        job_queue = self._context.Queue()
+        result_queue = self._context.Queue()
+        for job in jobs:
+            job_queue.put(job)
+        results = []
+        try:
+            displays = self._start_displays()
+            for worker_id, display in enumerate(displays):
+                job_queue.put(None)
+                process = self._context.Process(
+                    target=_worker_main,
+                    args=(worker_id, display, job_queue, result_queue, self._cancel),
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+
+            while len(results) < len(jobs):
+                try:
+                    result = result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in self._processes):
+                        break
+                    continue
+                self.stats.add(result)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        finally:
+            self.cancel_all()
+            for process in self._processes:
+                process.join(timeout=5.0)
+                if process.is_alive():
+                    process.terminate()
+            for server in self._servers:
+                server.stop()
+            self._processes = []
+            self._servers = []
+        return results
+
+
+def _parse_jobs(specs, args):
+    jobs = []
+    for job_id, spec in enumerate(specs):
+        path, loops = spec, args.loops
+        head, separator, tail = spec.rpartition(":")
+        if separator and tail.isdigit():
+            path, loops = head, int(tail)
+        jobs.append(FarmJob(
+            job_id,
+            path,
+            replay_count=loops,
+            smart_enabled=args.smart,
+            smart_wait_timeout=args.wait,
+            pixel_guard_enabled=args.pixel_guard,
+            pixel_tolerance=args.tolerance,
+            exact_key_timing=args.exact_key_timing,
+            overlap_loops=args.overlap_loops,
+        ))
+    return jobs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recordings in parallel on private X displays.")
+    parser.add_argument("recordings", nargs="+", metavar="RECORDING[:LOOPS]")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--loops", type=int, default=1, help="default loop count per job")
+    parser.add_argument("--smart", action="store_true", help="enable smart replay window guards")
+    parser.add_argument("--wait", type=float, default=8.0, help="smart wait timeout in seconds")
+    parser.add_argument("--pixel-guard", action="store_true", help="enable the click pixel guard")
+    parser.add_argument("--tolerance", type=int, default=28, help="pixel guard tolerance")
+    parser.add_argument("--exact-key-timing", action="store_true", help="replay every key at its recorded time")
+    parser.add_argument(
+        "--overlap-loops",
+        action="store_true",
+        help="keep one timeline across loops and overlap loop-boundary work with the next loop",
+    )
+    parser.add_argument("--screen", default=DEFAULT_SCREEN, help="Xvfb screen geometry")
+    parser.add_argument(
+        "--display",
+        action="append",
+        dest="displays",
+        help="use an existing X display instead of starting Xvfb (repeatable)",
+    )
+    args = parser.parse_args(argv)
+
+    jobs = _parse_jobs(args.recordings, args)
+    farm = ReplayFarm(workers=args.workers, displays=args.displays, screen=args.screen)
+
+    def report(result):
+        state = result["error"] or (f"stopped: {result['stop_reason']}" if result["stopped"] else "done")
+        print(
+            f"job {result['job_id']} worker {result['worker_id']} ({result['display']}): "
+            f"loops {result['completed_loops']}/{result['replay_count']} "
+            f"events={result['events']} {result['wall_seconds']:.1f}s {state}",
+            flush=True,
+        )
+
+    started_at = time.perf_counter()
+    try:
+        farm.run(jobs, on_result=report)
+    except KeyboardInterrupt:
+        farm.cancel_all()
+    except RuntimeError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(farm.stats.summary(time.perf_counter() - started_at))
+    return 0 if farm.stats.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,285 @@
+"""Compact binary trace of injected replay events, and a drift/hotspot analyzer.
+
+A trace file is the magic b"MTRT", a format version byte, a length-prefixed
+JSON header and then fixed-size little-endian records:
+
+    loop (u32), index (u32), kind (u8), flags (u8),
+    planned (f64), actual (f64), guard_wait (f32)
+
+`planned` and `actual` are seconds since the start of the loop, so
+`actual - planned` is the lateness of that injection. Loop boundaries are
+stored as records of kind LOOP_MARK whose `actual` is the loop start in
+seconds since the trace began.
+
+Usage:
+    python replay_trace.py analyze TRACE [--top N]
+    python replay_trace.py compare TRACE_A TRACE_B [--top N]
+"""
+
+import json
+import queue
+import statistics
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+
+TRACE_MAGIC = b"MTRT"
+TRACE_VERSION = 1
+TRACE_SUFFIX = ".mtt"
+RECORD = struct.Struct("<IIBBddf")
+HEADER_LENGTH = struct.Struct("<I")
+
+KIND_CODES = {"move": 0, "click": 1, "scroll": 2, "key": 3, "text": 4}
+KIND_NAMES = {code: name for name, code in KIND_CODES.items()}
+LOOP_MARK = 255
+
+FLAG_PREFETCHED = 1
+FLAG_GUARD_WAITED = 2
+
+
+class TraceError(ValueError):
+    pass
+
+
+class TraceWriter:
+    """Packs records into a bytearray; full buffers are written by a background thread."""
+
+    def __init__(self, path: Path, metadata: dict = None, buffer_records: int = 8192):
+        self.path = Path(path)
+        self.buffer_limit = buffer_records * RECORD.size
+        self.origin = time.perf_counter()
+        self.records = 0
+        self._buffer = bytearray()
+        self._pending = queue.SimpleQueue()
+        self._handle = self.path.open("wb")
+        header = json.dumps(dict(metadata or {}, created=time.strftime("%Y-%m-%d %H:%M:%S"))).encode("utf-8")
+        self._handle.write(TRACE_MAGIC + bytes([TRACE_VERSION]) + HEADER_LENGTH.pack(len(header)) + header)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self) -> None:
+        while True:
+            chunk = self._pending.get()
+            if chunk is None:
+                return
+            self._handle.write(chunk)
+
+    def add(
+        self,
+        loop_index: int,
+        event_index: int,
+        kind: str,
+        planned: float,
+        actual: float,
+        guard_wait: float = 0.0,
+        flags: int = 0,
+    ) -> None:
+        self._buffer += RECORD.pack(
+            loop_index, event_index, KIND_CODES.get(kind, 0), flags, planned, actual, guard_wait
+        )
+        self.records += 1
+        if len(self._buffer) >= self.buffer_limit:
+            self._pending.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def loop_started(self, loop_index: int, started_at: float) -> None:
+        self._buffer += RECORD.pack(loop_index, 0, LOOP_MARK, 0, 0.0, started_at - self.origin, 0.0)
+
+    def close(self) -> None:
+        if self._handle.closed:
+            return
+        if self._buffer:
+            self._pending.put(bytes(self._buffer))
+            self._buffer.clear()
+        self._pending.put(None)
+        self._thread.join()
+        self._handle.close()
+
+
+def read_trace(path: Path):
+    """Returns (metadata, records) where records are tuples in RECORD field order."""
+    data = Path(path).read_bytes()
+    if data[:4] != TRACE_MAGIC:
+        raise TraceError(f"{path} is not a replay trace")
+    if data[4] != TRACE_VERSION:
+        raise TraceError(f"Unsupported trace version {data[4]}")
+    (header_length,) = HEADER_LENGTH.unpack_from(data, 5)
+    body_start = 9 + header_length
+    metadata = json.loads(data[9:body_start].decode("utf-8"))
+    body = memoryview(data)[body_start:]
+    usable = len(body) - len(body) % RECORD.size
+    return metadata, list(RECORD.iter_unpack(body[:usable]))
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class TraceAnalysis:
+    """Per-loop lateness, per-event drift increments and guard-wait hotspots of one trace."""
+
+    def __init__(self, records):
+        self.loops = {}
+        self.loop_starts = {}
+        self.drift_steps = {}
+        self.guard_hotspots = {}
+        self.kinds = {}
+        previous = {}
+        for loop_index, event_index, kind, flags, planned, actual, guard_wait in records:
+            if kind == LOOP_MARK:
+                self.loop_starts[loop_index] = actual
+                continue
+            lateness = actual - planned
+            loop = self.loops.setdefault(loop_index, {"lateness": [], "guard_wait": 0.0, "last_actual": 0.0})
+            loop["lateness"].append(lateness)
+            loop["guard_wait"] += guard_wait
+            loop["last_actual"] = actual
+            self.kinds[event_index] = kind
+
+            # Lateness added by this event relative to the previous one in the
+            # same loop; guard waits are excluded so they are reported separately.
+            last_lateness = previous.get(loop_index)
+            if last_lateness is not None:
+                step = lateness - last_lateness - guard_wait
+                entry = self.drift_steps.setdefault(event_index, [0.0, 0, 0.0])
+                entry[0] += step
+                entry[1] += 1
+                entry[2] = max(entry[2], step)
+            previous[loop_index] = lateness
+
+            if flags & FLAG_GUARD_WAITED or guard_wait > 0.0:
+                entry = self.guard_hotspots.setdefault(event_index, [0.0, 0, 0.0])
+                entry[0] += guard_wait
+                entry[1] += 1
+                entry[2] = max(entry[2], guard_wait)
+
+    def loop_rows(self) -> list:
+        rows = []
+        ordered = sorted(self.loops)
+        for position, loop_index in enumerate(ordered):
+            loop = self.loops[loop_index]
+            lateness = loop["lateness"]
+            boundary = None
+            if position + 1 < len(ordered) and loop_index in self.loop_starts:
+                next_start = self.loop_starts.get(ordered[position + 1])
+                if next_start is not None:
+                    # Time between this loop's last injection and the next loop's start.
+                    boundary = next_start - self.loop_starts[loop_index] - loop["last_actual"]
+            rows.append({
+                "loop": loop_index + 1,
+                "events": len(lateness),
+                "lateness_ms_p50": _percentile(lateness, 0.5) * 1000.0,
+                "lateness_ms_p95": _percentile(lateness, 0.95) * 1000.0,
+                "lateness_ms_max": max(lateness) * 1000.0,
+                "end_drift_ms": lateness[-1] * 1000.0,
+                "guard_wait_s": loop["guard_wait"],
+                "boundary_ms": boundary * 1000.0 if boundary is not None else None,
+            })
+        return rows
+
+    def anomalous_loops(self, factor: float = 2.0) -> list:
+        rows = self.loop_rows()
+        if len(rows) < 3:
+            return []
+        baseline = statistics.median(row["lateness_ms_p95"] for row in rows)
+        floor = max(baseline * factor, 1.0)
+        return [row for row in rows if row["lateness_ms_p95"] > floor]
+
+    def top_drift(self, count: int) -> list:
+        ranked = sorted(self.drift_steps.items(), key=lambda item: -item[1][0])
+        return [
+            {"event": index, "kind": KIND_NAMES.get(self.kinds.get(index), "?"),
+             "added_ms_total": total * 1000.0, "added_ms_mean": total / hits * 1000.0,
+             "added_ms_max": worst * 1000.0, "loops": hits}
+            for index, (total, hits, worst) in ranked[:count] if total > 0.0
+        ]
+
+    def top_guards(self, count: int) -> list:
+        ranked = sorted(self.guard_hotspots.items(), key=lambda item: -item[1][0])
+        return [
+            {"event": index, "kind": KIND_NAMES.get(self.kinds.get(index), "?"),
+             "wait_s_total": total, "wait_ms_mean": total / hits * 1000.0,
+             "wait_ms_max": worst * 1000.0, "waits": hits}
+            for index, (total, hits, worst) in ranked[:count]
+        ]
+
+
+def _mean_lateness_by_event(records) -> dict:
+    totals = {}
+    for _loop, event_index, kind, _flags, planned, actual, _guard in records:
+        if kind == LOOP_MARK:
+            continue
+        entry = totals.setdefault(event_index, [0.0, 0])
+        entry[0] += actual - planned
+        entry[1] += 1
+    return {index: total / hits for index, (total, hits) in totals.items()}
+
+
+def _format_row(row: dict) -> str:
+    return "  " + ", ".join(
+        f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in row.items()
+    )
+
+
+def analyze(path: Path, top: int = 10) -> str:
+    metadata, records = read_trace(path)
+    analysis = TraceAnalysis(records)
+    lines = [f"Trace {path} ({len(records)} records) {json.dumps(metadata)}", "Loops:"]
+    lines.extend(_format_row(row) for row in analysis.loop_rows())
+    anomalous = analysis.anomalous_loops()
+    if anomalous:
+        lines.append("Loops with p95 lateness over 2x the median loop:")
+        lines.extend(_format_row(row) for row in anomalous)
+    lines.append(f"Top {top} events adding lateness (excluding guard waits):")
+    lines.extend(_format_row(row) for row in analysis.top_drift(top))
+    lines.append(f"Top {top} guard-wait hotspots:")
+    lines.extend(_format_row(row) for row in analysis.top_guards(top))
+    return "\n".join(lines)
+
+
+def compare(path_a: Path, path_b: Path, top: int = 10) -> str:
+    _, records_a = read_trace(path_a)
+    _, records_b = read_trace(path_b)
+    mean_a = _mean_lateness_by_event(records_a)
+    mean_b = _mean_lateness_by_event(records_b)
+    shared = sorted(set(mean_a) & set(mean_b))
+    deltas = sorted(((mean_b[index] - mean_a[index], index) for index in shared), reverse=True)
+    lines = [
+        f"Compare {path_a} -> {path_b} ({len(shared)} shared events)",
+        f"  mean lateness ms: {statistics.fmean(mean_a.values()) * 1000.0 if mean_a else 0.0:.2f} -> "
+        f"{statistics.fmean(mean_b.values()) * 1000.0 if mean_b else 0.0:.2f}",
+        f"Top {top} events that got later:",
+    ]
+    for delta, index in deltas[:top]:
+        lines.append(
+            f"  event={index} {mean_a[index] * 1000.0:.2f}ms -> {mean_b[index] * 1000.0:.2f}ms "
+            f"(+{delta * 1000.0:.2f}ms)"
+        )
+    return "\n".join(lines)
+
+
+def main(argv) -> int:
+    top = 10
+    if "--top" in argv:
+        position = argv.index("--top")
+        top = int(argv[position + 1])
+        argv = argv[:position] + argv[position + 2:]
+    if len(argv) == 2 and argv[0] == "analyze":
+        print(analyze(Path(argv[1]), top))
+        return 0
+    if len(argv) == 3 and argv[0] == "compare":
+        print(compare(Path(argv[1]), Path(argv[2]), top))
+        return 0
+    print("Usage:" + __doc__.split("Usage:", 1)[1].rstrip())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,118 @@
+"""Virtual-screen geometry captured with a recording, and coordinate remapping at replay.
+
+Recorded coordinates and the captured geometry are in the same pixel space
+(physical pixels when the process is DPI aware), so mapping the recorded
+virtual-screen rectangle onto the replay machine's rectangle also absorbs
+a change of display scaling. Remapped points are computed for a whole
+recording at once and cached per target layout, so the replay loop only
+indexes arrays.
+"""
+
+from array import array
+
+
+REFERENCE_DPI = 96
+MAX_TABLE_SPAN = 1 << 20  # wider coordinate ranges are mapped without a lookup table
+
+
+class ScreenLayout:
+    """Bounding rectangle of all monitors in desktop coordinates, plus the system DPI."""
+
+    __slots__ = ("left", "top", "width", "height", "dpi")
+
+    def __init__(self, left: int, top: int, width: int, height: int, dpi: int = REFERENCE_DPI):
+        self.left = int(left)
+        self.top = int(top)
+        self.width = int(width)
+        self.height = int(height)
+        self.dpi = int(dpi) or REFERENCE_DPI
+
+    def key(self) -> tuple:
+        return (self.left, self.top, self.width, self.height, self.dpi)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ScreenLayout) and self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def to_dict(self) -> dict:
+        return {"left": self.left, "top": self.top, "width": self.width, "height": self.height, "dpi": self.dpi}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Returns None for a missing or malformed layout, so old recordings replay unmapped."""
+        if not isinstance(data, dict):
+            return None
+        try:
+            layout = cls(data["left"], data["top"], data["width"], data["height"], data.get("dpi", REFERENCE_DPI))
+        except (KeyError, TypeError, ValueError):
+            return None
+        if layout.width <= 0 or layout.height <= 0:
+            return None
+        return layout
+
+    def describe(self) -> str:
+        return f"{self.width}x{self.height}+{self.left}+{self.top}@{self.dpi}dpi"
+
+
+class CoordinateTransform:
+    """Per-axis affine map from one layout's rectangle onto another's, clamped to the target."""
+
+    def __init__(self, source: ScreenLayout, target: ScreenLayout):
+        self.source = source
+        self.target = target
+        self.scale_x = target.width / source.width
+        self.scale_y = target.height / source.height
+        self.offset_x = target.left - source.left * self.scale_x
+        self.offset_y = target.top - source.top * self.scale_y
+        self.identity = (source.left, source.top, source.width, source.height) == (
+            target.left,
+            target.top,
+            target.width,
+            target.height,
+        )
+
+    def map_point(self, x: int, y: int):
+        target = self.target
+        mapped_x = min(max(round(x * self.scale_x + self.offset_x), target.left), target.left + target.width - 1)
+        mapped_y = min(max(round(y * self.scale_y + self.offset_y), target.top), target.top + target.height - 1)
+        return mapped_x, mapped_y
+
+    def map_records(self, records):
+        """Mapped (xs, ys) arrays indexed by record position; key records map from (0, 0).
+
+        Each axis goes through a lookup table spanning the recorded coordinate
+        range, so the per-record work is two list lookups.
+        """
+        xs = [getattr(record, "x", 0) for record in records]
+        ys = [getattr(record, "y", 0) for record in records]
+        return (
+            _map_axis(xs, self.scale_x, self.offset_x, self.target.left, self.target.width),
+            _map_axis(ys, self.scale_y, self.offset_y, self.target.top, self.target.height),
+        )
+
+
+def _map_axis(values: list, scale: float, offset: float, low: int, size: int) -> array:
+    high = low + size - 1
+    if not values:
+        return array("i")
+    first, last = min(values), max(values)
+    if last - first > MAX_TABLE_SPAN:
+        return array("i", (min(max(round(value * scale + offset), low), high) for value in values))
+    table = [min(max(round(value * scale + offset), low), high) for value in range(first, last + 1)]
+    if first:
+        values = map((-first).__add__, values)
+    return array("i", map(table.__getitem__, values))
+
+
+def remap_points(recording, target: ScreenLayout):
+    """Cached (xs, ys) for replaying `recording` on `target`, or None when no remapping applies."""
+    source = recording.screen
+    if source is None or target is None:
+        return None
+    cache = recording.point_cache
+    if target not in cache:
+        transform = CoordinateTransform(source, target)
+        cache[target] = None if transform.identity else transform.map_records(recording.records)
+    return cache[target]
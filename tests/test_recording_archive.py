@@ -0,0 +1,184 @@
+import json
+import random
+
+import pytest
+
+import recording_archive
+from recording_archive import ArchiveError, decode_events, encode_events, read_header
+
+
+WINDOW = {"title": "Invoice - Editor", "class": "Notepad"}
+
+
+def sample_events(count: int = 200) -> list:
+    # Times are multiples of 1/64 s so they survive microsecond rounding exactly.
+    events = []
+    for index in range(count):
+        time_offset = index / 64
+        kind = index % 6
+        if kind == 0:
+            events.append({"type": "move", "time": time_offset, "x": index * 3, "y": -index})
+        elif kind == 1:
+            events.append({
+                "type": "click", "time": time_offset, "x": index, "y": index + 1,
+                "button": "left", "pressed": True, "pixel": {"r": 10, "g": 20, "b": 30}, "window": WINDOW,
+            })
+        elif kind == 2:
+            events.append({
+                "type": "click", "time": time_offset, "x": index, "y": index + 1,
+                "button": "left", "pressed": False, "window": WINDOW,
+            })
+        elif kind == 3:
+            events.append({"type": "scroll", "time": time_offset, "x": 5, "y": 6, "dx": 0.0, "dy": -1.5})
+        elif kind == 4:
+            events.append({
+                "type": "key", "time": time_offset, "action": "press",
+                "key": {"kind": "char", "value": "a"}, "window": WINDOW,
+            })
+        else:
+            events.append({"type": "key", "time": time_offset, "action": "release", "key": {"kind": "vk", "value": 65}})
+    return events
+
+
+@pytest.mark.parametrize("codec", ["zlib", "lzma"])
+def test_round_trip(codec):
+    events = sample_events()
+    assert decode_events(encode_events(events, codec)) == events
+
+
+def test_round_trip_keeps_unknown_shapes_verbatim():
+    events = [
+        {"type": "move", "time": 0.5, "x": 1, "y": 2},
+        {"type": "gesture", "time": 1.0, "points": [1, 2, 3]},
+        {"type": "click", "time": 1.5, "x": 1, "y": 2, "button": "left", "pressed": True, "extra": 1},
+    ]
+    assert decode_events(encode_events(events)) == events
+
+
+def test_empty_archive():
+    assert decode_events(encode_events([])) == []
+
+
+def test_header_carries_schema_and_screen():
+    screen = {"left": 0, "top": 0, "width": 1920, "height": 1080, "dpi": 96}
+    header = read_header(encode_events(sample_events(10), schema=2, screen=screen))
+    assert header["schema"] == 2
+    assert header["screen"] == screen
+    assert header["count"] == 10
+
+
+def test_unknown_codec():
+    with pytest.raises(ArchiveError):
+        encode_events([], codec="zstd")
+
+
+def test_not_an_archive():
+    with pytest.raises(ArchiveError):
+        decode_events(b'[{"type": "move"}]')
+
+
+def _rebuild(data: bytes, header_update=None, column_update=None) -> bytes:
+    """Re-packs an archive after changing its header or one decompressed column."""
+    header, columns = recording_archive._read_container(data)
+    header = dict(header)
+    if column_update:
+        name, value = column_update
+        columns[name] = value
+    blobs = [recording_archive.zlib.compress(bytes(columns[name])) for name in recording_archive.COLUMNS]
+    header["columns"] = [[name, len(blob)] for name, blob in zip(recording_archive.COLUMNS, blobs)]
+    if header_update:
+        header.update(header_update)
+    raw_header = json.dumps(header).encode("ascii")
+    out = bytearray(data[:6])
+    recording_archive._write_varint(out, len(raw_header))
+    out += raw_header
+    for blob in blobs:
+        out += blob
+    return bytes(out)
+
+
+def test_rebuild_helper_is_faithful():
+    data = encode_events(sample_events())
+    assert decode_events(_rebuild(data)) == sample_events()
+
+
+@pytest.mark.parametrize(
+    "header_update",
+    [
+        {"count": 5},
+        {"count": "many"},
+        {"strings": None},
+        {"windows": [["only title"]]},
+        {"columns": 3},
+    ],
+)
+def test_damaged_header(header_update):
+    with pytest.raises(ArchiveError):
+        decode_events(_rebuild(encode_events(sample_events()), header_update=header_update))
+
+
+def test_header_that_is_not_an_object():
+    data = encode_events([])
+    raw_header = b"[1, 2]"
+    out = bytearray(data[:6])
+    recording_archive._write_varint(out, len(raw_header))
+    out += raw_header
+    with pytest.raises(ArchiveError):
+        read_header(bytes(out))
+
+
+@pytest.mark.parametrize("column", ["time", "x", "y", "window", "click", "scroll", "key", "pixel", "raw"])
+def test_truncated_column(column):
+    data = encode_events(sample_events() + [{"type": "odd", "time": 9.0}])
+    header, columns = recording_archive._read_container(data)
+    damaged = _rebuild(data, column_update=(column, columns[column][: len(columns[column]) // 2]))
+    with pytest.raises(ArchiveError):
+        decode_events(damaged)
+
+
+def test_unknown_event_type_id():
+    data = encode_events(sample_events(12))
+    _header, columns = recording_archive._read_container(data)
+    types = bytearray(columns["type"])
+    types[3] = 7
+    with pytest.raises(ArchiveError):
+        decode_events(_rebuild(data, column_update=("type", types)))
+
+
+def test_string_reference_out_of_range():
+    data = encode_events(sample_events(12))
+    with pytest.raises(ArchiveError):
+        decode_events(_rebuild(data, header_update={"strings": []}))
+
+
+def test_random_corruption_only_raises_archive_error():
+    data = encode_events(sample_events())
+    rng = random.Random(7)
+    for _ in range(500):
+        damaged = bytearray(data)
+        if rng.random() < 0.3:
+            damaged = damaged[: rng.randrange(len(damaged))]
+        else:
+            for _flip in range(rng.randrange(1, 4)):
+                damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+        try:
+            decode_events(bytes(damaged))
+        except ArchiveError:
+            pass
+
+
+def test_pack_unpack_keep_schema_and_screen(tmp_path):
+    screen = {"left": -1920, "top": 0, "width": 3840, "height": 1080, "dpi": 144}
+    document = {"schema": 2, "events": sample_events(30), "screen": screen}
+    source = tmp_path / "in.json"
+    source.write_text(json.dumps(document), encoding="utf-8")
+    archive = tmp_path / "out.mtr"
+    unpacked = tmp_path / "back.json"
+
+    assert recording_archive.main(["pack", str(source), str(archive)]) == 0
+    header = read_header(archive.read_bytes())
+    assert header["schema"] == 2
+    assert header["screen"] == screen
+
+    assert recording_archive.main(["unpack", str(archive), str(unpacked)]) == 0
+    assert json.loads(unpacked.read_text(encoding="utf-8")) == document
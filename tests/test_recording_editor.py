@@ -0,0 +1,166 @@
+import json
+
+import pytest
+
+from recording_editor import EditError, EditedRecording, main, parse_operation, save_recording
+from recording_schema import compile_events, load_recording
+
+
+def moves(count: int, start_x: int = 0, step: float = 1.0, window: dict = None) -> list:
+    events = []
+    for index in range(count):
+        event = {"type": "move", "time": index * step, "x": start_x + index, "y": 0}
+        if window is not None:
+            event = {
+                "type": "click", "time": index * step, "x": start_x + index, "y": 0,
+                "button": "left", "pressed": index % 2 == 0, "window": window,
+            }
+        events.append(event)
+    return events
+
+
+def edited(events, screen=None) -> EditedRecording:
+    return EditedRecording.from_recording(compile_events(events, screen=screen))
+
+
+def xs(recording) -> list:
+    return [record.x for record in recording.records]
+
+
+def times(recording) -> list:
+    return [record.time for record in recording.records]
+
+
+def test_from_recording_is_a_view():
+    recording = edited(moves(5))
+    assert len(recording) == 5
+    assert len(recording.segments) == 1
+    assert xs(recording) == [0, 1, 2, 3, 4]
+    assert [record.index for record in recording.records] == [0, 1, 2, 3, 4]
+
+
+def test_trim_rebases_to_zero():
+    recording = edited(moves(10)).trim(2.0, 5.0)
+    assert xs(recording) == [2, 3, 4, 5]
+    assert times(recording) == [0.0, 1.0, 2.0, 3.0]
+
+
+def test_trim_without_events():
+    with pytest.raises(EditError):
+        edited(moves(3)).trim(10.0, 20.0)
+
+
+def test_delete_closes_the_gap():
+    recording = edited(moves(6)).delete(1, 3)
+    assert xs(recording) == [0, 3, 4, 5]
+    assert times(recording) == [0.0, 1.0, 2.0, 3.0]
+    assert [record.index for record in recording.records] == [0, 1, 2, 3]
+
+
+def test_delete_tail():
+    assert xs(edited(moves(4)).delete(2, 4)) == [0, 1]
+
+
+@pytest.mark.parametrize("start, stop", [(-1, 2), (2, 2), (3, 1), (0, 7)])
+def test_delete_out_of_range(start, stop):
+    with pytest.raises(EditError):
+        edited(moves(6)).delete(start, stop)
+
+
+def test_edits_return_new_objects():
+    original = edited(moves(6))
+    original.delete(0, 3)
+    assert xs(original) == [0, 1, 2, 3, 4, 5]
+
+
+def test_repeat_plays_block_back_to_back():
+    recording = edited(moves(4)).repeat(1, 3, 3, gap=0.5)
+    assert xs(recording) == [0, 1, 2, 1, 2, 1, 2, 3]
+    # Block period is 1.0 (span) + 0.5 (gap); later events move by two periods.
+    assert times(recording) == [0.0, 1.0, 2.0, 2.5, 3.5, 4.0, 5.0, 6.0]
+
+
+def test_repeat_needs_one_copy():
+    with pytest.raises(EditError):
+        edited(moves(4)).repeat(0, 2, 0)
+
+
+def test_shift_moves_the_tail():
+    recording = edited(moves(4)).shift(2, 1.5)
+    assert times(recording) == [0.0, 1.0, 3.5, 4.5]
+
+
+def test_shift_cannot_reorder_events():
+    with pytest.raises(EditError):
+        edited(moves(4)).shift(2, -1.5)
+
+
+def test_splice_inserts_after_previous_event():
+    base = edited(moves(3))
+    other = edited(moves(2, start_x=100, step=0.25))
+    recording = base.splice(2, other, gap=0.5)
+    assert xs(recording) == [0, 1, 100, 101, 2]
+    assert times(recording) == [0.0, 1.0, 1.5, 1.75, 2.75]
+
+
+def test_splice_range_and_position_checks():
+    base = edited(moves(3))
+    other = edited(moves(2))
+    with pytest.raises(EditError):
+        base.splice(4, other)
+    with pytest.raises(EditError):
+        base.splice(1, other, 1, 5)
+
+
+def test_splice_maps_window_contexts():
+    first = {"title": "A", "class": "a"}
+    second = {"title": "B", "class": "b"}
+    base = edited(moves(2, window=first))
+    other = edited(moves(2, start_x=10, window=second))
+    recording = base.splice(1, other)
+    contexts = [recording.window_table.contexts[record.window_id]["title"] for record in recording.records]
+    assert contexts == ["A", "B", "B", "A"]
+
+
+def test_chained_edits_stay_consistent():
+    recording = edited(moves(20)).repeat(0, 5, 2).delete(3, 8).shift(4, 2.0).trim(1.0, 30.0)
+    recorded_times = times(recording)
+    assert recorded_times == sorted(recorded_times)
+    assert recorded_times[0] == 0.0
+    assert len(recording) == len(list(recording.records))
+    assert recording.records[-1].x == recording.records[len(recording) - 1].x
+
+
+def test_parse_operation_specs():
+    recording = edited(moves(10))
+    assert xs(parse_operation("delete:0:8")(recording)) == [8, 9]
+    assert xs(parse_operation("trim:8:9")(recording)) == [8, 9]
+    assert len(parse_operation("repeat:0:2:3")(recording)) == 14
+    assert times(parse_operation("shift:9:1")(recording))[-1] == 10.0
+
+
+@pytest.mark.parametrize("spec", ["delete:1", "trim:a:b", "explode:1:2", "repeat:0:1:x"])
+def test_parse_operation_rejects_bad_specs(spec):
+    with pytest.raises(EditError):
+        parse_operation(spec)
+
+
+@pytest.mark.parametrize("suffix", [".json", ".mtr"])
+def test_save_and_reload_keeps_events_and_screen(tmp_path, suffix):
+    screen = {"left": 0, "top": 0, "width": 1280, "height": 720, "dpi": 96}
+    recording = edited(moves(6), screen=screen).delete(0, 2)
+    path = tmp_path / f"edited{suffix}"
+    save_recording(recording, path)
+    reloaded = load_recording(path)
+    assert reloaded.to_events() == recording.to_events()
+    assert reloaded.screen.to_dict() == screen
+
+
+def test_cli_applies_operations_in_order(tmp_path, capsys):
+    source = tmp_path / "in.json"
+    source.write_text(json.dumps({"schema": 2, "events": moves(10)}), encoding="utf-8")
+    target = tmp_path / "out.json"
+    assert main([str(source), str(target), "delete:0:5", "repeat:0:2:2"]) == 0
+    assert xs(load_recording(target)) == [5, 6, 5, 6, 7, 8, 9]
+    assert main([str(source), str(target), "delete:5:50"]) == 1
+    assert "Edit failed" in capsys.readouterr().err
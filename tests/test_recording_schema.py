@@ -0,0 +1,202 @@
+import json
+
+import pytest
+
+from recording_archive import save_archive
+from recording_schema import (
+    LEGACY_SCHEMA_VERSION,
+    SCHEMA_VERSION,
+    SchemaError,
+    WindowContextTable,
+    compile_events,
+    load_recording,
+    read_recording_file,
+    release_pressed,
+)
+
+
+WINDOW = {"title": "Invoice - Editor", "class": "Notepad"}
+
+
+def valid_events() -> list:
+    return [
+        {"type": "move", "time": 0.0, "x": 10, "y": 20},
+        {"type": "click", "time": 0.5, "x": 10, "y": 20, "button": "left", "pressed": True,
+         "pixel": {"r": 1, "g": 2, "b": 3}, "window": WINDOW},
+        {"type": "click", "time": 0.6, "x": 10, "y": 20, "button": "left", "pressed": False, "window": WINDOW},
+        {"type": "scroll", "time": 1.0, "x": 10, "y": 20, "dx": 0.0, "dy": -1.0, "window": WINDOW},
+        {"type": "key", "time": 1.5, "action": "press", "key": {"kind": "special", "value": "shift"}},
+        {"type": "key", "time": 1.6, "action": "press", "key": {"kind": "char", "value": "A"}},
+        {"type": "key", "time": 1.7, "action": "release", "key": {"kind": "vk", "value": 65}},
+    ]
+
+
+def test_valid_events_compile_unchanged():
+    recording = compile_events(valid_events())
+    assert (recording.repaired, recording.rejected) == (0, 0)
+    assert recording.to_events() == valid_events()
+    assert [record.index for record in recording.records] == list(range(len(valid_events())))
+
+
+def test_window_contexts_are_interned_once():
+    recording = compile_events(valid_events())
+    assert len(recording.window_table) == 1
+    window_ids = {record.window_id for record in recording.records if record.window_id is not None}
+    assert window_ids == {0}
+
+
+def test_shared_window_table_across_recordings():
+    table = WindowContextTable()
+    first = compile_events(valid_events(), window_table=table)
+    second = compile_events(valid_events(), window_table=table)
+    assert first.window_table is second.window_table
+    assert len(table) == 1
+
+
+@pytest.mark.parametrize(
+    "event, repaired_field",
+    [
+        ({"type": "move", "time": "0.25", "x": 1, "y": 2}, "time"),
+        ({"type": "move", "time": -1, "x": 1, "y": 2}, "time"),
+        ({"type": "move", "time": 0.25, "x": 1.6, "y": "2"}, "x"),
+        ({"type": "click", "time": 0.25, "x": 1, "y": 2, "button": "left", "pressed": 1}, "pressed"),
+        ({"type": "click", "time": 0.25, "x": 1, "y": 2, "button": "left", "pressed": True,
+          "pixel": {"r": 300, "g": 0, "b": 0}}, "pixel"),
+        ({"type": "key", "time": 0.25, "action": "press", "key": {"kind": "vk", "value": "65"}}, "key"),
+        ({"type": "move", "time": 0.25, "x": 1, "y": 2, "window": "not a dict"}, "window"),
+    ],
+)
+def test_repairable_events(event, repaired_field):
+    recording = compile_events([event])
+    assert (recording.repaired, recording.rejected) == (1, 0), repaired_field
+    assert len(recording.records) == 1
+
+
+def test_repairs_keep_expected_values():
+    events = [
+        {"type": "move", "time": 1.0, "x": 1, "y": 2},
+        {"type": "move", "time": None, "x": 1.6, "y": 2},
+        {"type": "click", "time": 2.0, "x": 1, "y": 2, "button": "left", "pressed": True,
+         "pixel": {"r": 1, "g": None, "b": 3}},
+    ]
+    move, repaired_move, click = compile_events(events).records
+    assert repaired_move.time == move.time
+    assert repaired_move.x == 2
+    assert click.pixel is None
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        "not an object",
+        {"type": "teleport", "time": 0.0},
+        {"type": "move", "time": 0.0, "x": None, "y": 2},
+        {"type": "move", "time": 0.0, "x": True, "y": 2},
+        {"type": "click", "time": 0.0, "x": 1, "y": 2, "pressed": True},
+        {"type": "click", "time": 0.0, "x": 1, "y": 2, "button": "left", "pressed": "yes"},
+        {"type": "scroll", "time": 0.0, "x": 1, "y": 2, "dx": "left", "dy": 0},
+        {"type": "key", "time": 0.0, "action": "tap", "key": {"kind": "char", "value": "a"}},
+        {"type": "key", "time": 0.0, "action": "press", "key": {"kind": "text", "value": "a"}},
+        {"type": "key", "time": 0.0, "action": "press", "key": {"kind": "char", "value": ""}},
+        {"type": "key", "time": 0.0, "action": "press", "key": {"kind": "vk", "value": "esc"}},
+    ],
+)
+def test_malformed_events_are_rejected(event):
+    recording = compile_events([event, {"type": "move", "time": 1.0, "x": 1, "y": 2}])
+    assert recording.rejected == 1
+    assert len(recording.records) == 1
+    assert recording.problems
+
+
+def test_out_of_order_events_are_sorted_and_reindexed():
+    events = [
+        {"type": "move", "time": 2.0, "x": 2, "y": 2},
+        {"type": "move", "time": 1.0, "x": 1, "y": 1},
+    ]
+    records = compile_events(events).records
+    assert [record.x for record in records] == [1, 2]
+    assert [record.index for record in records] == [0, 1]
+
+
+def test_legacy_text_key_payload_is_upgraded():
+    event = {"type": "key", "time": 0.0, "action": "press", "key": {"kind": "text", "value": "Key.ctrl_l"}}
+    recording = compile_events([event], LEGACY_SCHEMA_VERSION)
+    assert recording.repaired == 1
+    record = recording.records[0]
+    assert (record.key_kind, record.key_value) == ("special", "ctrl_l")
+
+
+def test_text_key_payload_is_rejected_in_current_schema():
+    event = {"type": "key", "time": 0.0, "action": "press", "key": {"kind": "text", "value": "Key.ctrl_l"}}
+    assert compile_events([event], SCHEMA_VERSION).rejected == 1
+
+
+def test_newer_schema_is_refused():
+    with pytest.raises(SchemaError):
+        compile_events([], SCHEMA_VERSION + 1)
+
+
+def test_screen_layout_is_attached():
+    screen = {"left": 0, "top": 0, "width": 2560, "height": 1440, "dpi": 120}
+    recording = compile_events([], screen=screen)
+    assert recording.screen.to_dict() == screen
+    assert compile_events([], screen={"width": "wide"}).screen is None
+
+
+def test_read_legacy_list_file(tmp_path):
+    path = tmp_path / "legacy.json"
+    path.write_text(json.dumps(valid_events()), encoding="utf-8")
+    version, events, screen = read_recording_file(path)
+    assert version == LEGACY_SCHEMA_VERSION
+    assert events == valid_events()
+    assert screen is None
+
+
+def test_read_document_and_archive_agree(tmp_path):
+    screen = {"left": 0, "top": 0, "width": 1920, "height": 1080, "dpi": 96}
+    document = tmp_path / "doc.json"
+    document.write_text(json.dumps({"schema": SCHEMA_VERSION, "events": valid_events(), "screen": screen}))
+    archive = tmp_path / "doc.mtr"
+    save_archive(valid_events(), archive, schema=SCHEMA_VERSION, screen=screen)
+
+    from_json = load_recording(document)
+    from_archive = load_recording(archive)
+    assert from_json.to_events() == from_archive.to_events()
+    assert from_json.screen == from_archive.screen
+    assert from_json.source_version == from_archive.source_version == SCHEMA_VERSION
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '{"schema": null, "events": []}',
+        '{"schema": "abc", "events": []}',
+        '{"schema": true, "events": []}',
+        '{"schema": 0, "events": []}',
+        '{"schema": 2, "events": 5}',
+        '{"schema": 2}',
+        '"just a string"',
+        "not json",
+        "",
+    ],
+)
+def test_malformed_files_raise_schema_error(tmp_path, content):
+    path = tmp_path / "bad.json"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(SchemaError):
+        load_recording(path)
+
+
+def test_undecodable_file_raises_schema_error(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_bytes(b"\xff\xfe\x00\x01")
+    with pytest.raises(SchemaError):
+        load_recording(path)
+
+
+def test_release_pressed_drops_latest_press():
+    pressed = ["a", "b", "a"]
+    assert release_pressed(pressed, "a")
+    assert pressed == ["a", "b"]
+    assert not release_pressed(pressed, "c")
+    assert pressed == ["a", "b"]
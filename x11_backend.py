@@ -0,0 +1,523 @@
+"""Xlib/XTest backend for Linux hosts: window context, pixel reads and input injection.
+
+Loaded through ctypes like the win32 helpers in main.py, so it only needs
+libX11 (and libXtst for injection) at runtime; both ship with every X
+server, including Xvfb. Injection calls are buffered by Xlib and sent with
+one flush per scheduler tick instead of one round trip per event.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import threading
+
+
+ANY_PROPERTY_TYPE = 0
+XA_STRING = 31
+XA_WINDOW = 33
+Z_PIXMAP = 2
+ALL_PLANES = (1 << (8 * ctypes.sizeof(ctypes.c_ulong))) - 1
+CURRENT_SCREEN = -1
+ESCAPE_KEYSYM = 0xFF1B
+
+BUTTON_NUMBERS = {"left": 1, "middle": 2, "right": 3}
+SCROLL_BUTTONS = {"up": 4, "down": 5, "left": 6, "right": 7}
+
+# pynput Key names that differ from their X keysym names.
+SPECIAL_KEYSYMS = {
+    "alt": "Alt_L",
+    "alt_l": "Alt_L",
+    "alt_r": "Alt_R",
+    "alt_gr": "ISO_Level3_Shift",
+    "backspace": "BackSpace",
+    "caps_lock": "Caps_Lock",
+    "cmd": "Super_L",
+    "cmd_l": "Super_L",
+    "cmd_r": "Super_R",
+    "ctrl": "Control_L",
+    "ctrl_l": "Control_L",
+    "ctrl_r": "Control_R",
+    "delete": "Delete",
+    "down": "Down",
+    "end": "End",
+    "enter": "Return",
+    "esc": "Escape",
+    "home": "Home",
+    "insert": "Insert",
+    "left": "Left",
+    "menu": "Menu",
+    "num_lock": "Num_Lock",
+    "page_down": "Next",
+    "page_up": "Prior",
+    "pause": "Pause",
+    "print_screen": "Print",
+    "right": "Right",
+    "scroll_lock": "Scroll_Lock",
+    "shift": "Shift_L",
+    "shift_l": "Shift_L",
+    "shift_r": "Shift_R",
+    "space": "space",
+    "tab": "Tab",
+    "up": "Up",
+    "media_play_pause": "XF86AudioPlay",
+    "media_volume_mute": "XF86AudioMute",
+    "media_volume_down": "XF86AudioLowerVolume",
+    "media_volume_up": "XF86AudioRaiseVolume",
+    "media_previous": "XF86AudioPrev",
+    "media_next": "XF86AudioNext",
+}
+
+
+class X11Unavailable(OSError):
+    pass
+
+
+class _Visual(ctypes.Structure):
+    _fields_ = [
+        ("ext_data", ctypes.c_void_p),
+        ("visualid", ctypes.c_ulong),
+        ("c_class", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+        ("bits_per_rgb", ctypes.c_int),
+        ("map_entries", ctypes.c_int),
+    ]
+
+
+class _XClassHint(ctypes.Structure):
+    _fields_ = [("res_name", ctypes.c_void_p), ("res_class", ctypes.c_void_p)]
+
+
+_ERROR_HANDLER_TYPE = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+
+
+@_ERROR_HANDLER_TYPE
+def _ignore_x_error(_display, _event):
+    # The default handler exits the process; a window closing between
+    # _NET_ACTIVE_WINDOW and the property reads must not do that.
+    return 0
+
+
+def _load_library(name: str):
+    path = ctypes.util.find_library(name)
+    if not path:
+        return None
+    try:
+        return ctypes.CDLL(path)
+    except OSError:
+        return None
+
+
+def _bind_xlib(x11) -> None:
+    display_p = ctypes.c_void_p
+    window = ctypes.c_ulong
+    x11.XInitThreads.restype = ctypes.c_int
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XOpenDisplay.restype = display_p
+    x11.XCloseDisplay.argtypes = [display_p]
+    x11.XSetErrorHandler.argtypes = [_ERROR_HANDLER_TYPE]
+    x11.XSetErrorHandler.restype = ctypes.c_void_p
+    x11.XDefaultScreen.argtypes = [display_p]
+    x11.XDefaultScreen.restype = ctypes.c_int
+    x11.XDefaultRootWindow.argtypes = [display_p]
+    x11.XDefaultRootWindow.restype = window
+    x11.XDefaultVisual.argtypes = [display_p, ctypes.c_int]
+    x11.XDefaultVisual.restype = ctypes.POINTER(_Visual)
+    x11.XDisplayWidth.argtypes = [display_p, ctypes.c_int]
+    x11.XDisplayHeight.argtypes = [display_p, ctypes.c_int]
+    x11.XDisplayWidthMM.argtypes = [display_p, ctypes.c_int]
+    x11.XInternAtom.argtypes = [display_p, ctypes.c_char_p, ctypes.c_int]
+    x11.XInternAtom.restype = ctypes.c_ulong
+    x11.XGetWindowProperty.argtypes = [
+        display_p,
+        window,
+        ctypes.c_ulong,
+        ctypes.c_long,
+        ctypes.c_long,
+        ctypes.c_int,
+        ctypes.c_ulong,
+        ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_void_p),
+    ]
+    x11.XGetWindowProperty.restype = ctypes.c_int
+    x11.XGetClassHint.argtypes = [display_p, window, ctypes.POINTER(_XClassHint)]
+    x11.XGetClassHint.restype = ctypes.c_int
+    x11.XFree.argtypes = [ctypes.c_void_p]
+    x11.XGetImage.argtypes = [
+        display_p,
+        window,
+        ctypes.c_int,
+        ctypes.c_int,
+        ctypes.c_uint,
+        ctypes.c_uint,
+        ctypes.c_ulong,
+        ctypes.c_int,
+    ]
+    x11.XGetImage.restype = ctypes.c_void_p
+    x11.XGetPixel.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int]
+    x11.XGetPixel.restype = ctypes.c_ulong
+    x11.XDestroyImage.argtypes = [ctypes.c_void_p]
+    x11.XQueryPointer.argtypes = [
+        display_p,
+        window,
+        ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_ulong),
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.POINTER(ctypes.c_uint),
+    ]
+    x11.XQueryKeymap.argtypes = [display_p, ctypes.c_char * 32]
+    x11.XStringToKeysym.argtypes = [ctypes.c_char_p]
+    x11.XStringToKeysym.restype = ctypes.c_ulong
+    x11.XKeysymToKeycode.argtypes = [display_p, ctypes.c_ulong]
+    x11.XKeysymToKeycode.restype = ctypes.c_ubyte
+    x11.XkbKeycodeToKeysym.argtypes = [display_p, ctypes.c_ubyte, ctypes.c_int, ctypes.c_int]
+    x11.XkbKeycodeToKeysym.restype = ctypes.c_ulong
+    x11.XFlush.argtypes = [display_p]
+
+
+def _bind_xtest(xtst) -> None:
+    display_p = ctypes.c_void_p
+    xtst.XTestFakeMotionEvent.argtypes = [display_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+    xtst.XTestFakeButtonEvent.argtypes = [display_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+    xtst.XTestFakeKeyEvent.argtypes = [display_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+
+
+def _mask_shift(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1 if mask else 0
+
+
+def char_keysym(char: str) -> int:
+    code = ord(char)
+    if 0x20 <= code <= 0x7E or 0xA0 <= code <= 0xFF:
+        return code
+    if char == "\n":
+        return 0xFF0D  # Return
+    if char == "\t":
+        return 0xFF09  # Tab
+    return 0x01000000 | code
+
+
+class X11Display:
+    """One Xlib connection shared by context capture, pixel guards and XTest injection."""
+
+    def __init__(self, display_name: str = None):
+        x11 = _load_library("X11")
+        if x11 is None:
+            raise X11Unavailable("libX11 not found")
+        _bind_xlib(x11)
+        # Replay, prefetch and listener threads all share this connection.
+        x11.XInitThreads()
+        display = x11.XOpenDisplay(display_name.encode() if display_name else None)
+        if not display:
+            raise X11Unavailable(f"cannot open X display {display_name or os.environ.get('DISPLAY', '')!r}")
+        x11.XSetErrorHandler(_ignore_x_error)
+
+        self.x11 = x11
+        self.xtst = _load_library("Xtst")
+        if self.xtst is not None:
+            _bind_xtest(self.xtst)
+        self.display = display
+        self.name = display_name or os.environ.get("DISPLAY", "")
+        self.screen = x11.XDefaultScreen(display)
+        self.root = x11.XDefaultRootWindow(display)
+        visual = x11.XDefaultVisual(display, self.screen).contents
+        self._channels = [
+            (visual.red_mask, _mask_shift(visual.red_mask)),
+            (visual.green_mask, _mask_shift(visual.green_mask)),
+            (visual.blue_mask, _mask_shift(visual.blue_mask)),
+        ]
+        self._atoms = {}
+        self._keycodes = {}
+        self.pending = False
+
+    @property
+    def has_xtest(self) -> bool:
+        return self.xtst is not None
+
+    def screen_size(self):
+        return self.x11.XDisplayWidth(self.display, self.screen), self.x11.XDisplayHeight(self.display, self.screen)
+
+    def dpi(self) -> int:
+        width_mm = self.x11.XDisplayWidthMM(self.display, self.screen)
+        if width_mm <= 0:
+            return 96
+        return round(self.x11.XDisplayWidth(self.display, self.screen) * 25.4 / width_mm)
+
+    def atom(self, name: str) -> int:
+        atom = self._atoms.get(name)
+        if atom is None:
+            atom = self._atoms[name] = self.x11.XInternAtom(self.display, name.encode(), False)
+        return atom
+
+    def _property(self, window: int, name: str, property_type: int, max_items: int = 1024):
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        item_count = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        data = ctypes.c_void_p()
+        status = self.x11.XGetWindowProperty(
+            self.display,
+            window,
+            self.atom(name),
+            0,
+            max_items,
+            False,
+            property_type,
+            ctypes.byref(actual_type),
+            ctypes.byref(actual_format),
+            ctypes.byref(item_count),
+            ctypes.byref(bytes_after),
+            ctypes.byref(data),
+        )
+        if status != 0 or not data.value:
+            return None, 0, 0
+        return data, actual_format.value, item_count.value
+
+    def active_window(self) -> int:
+        data, item_format, count = self._property(self.root, "_NET_ACTIVE_WINDOW", XA_WINDOW, 1)
+        if data is None:
+            return 0
+        try:
+            if item_format != 32 or count < 1:
+                return 0
+            # Format-32 properties come back as C longs.
+            return ctypes.cast(data, ctypes.POINTER(ctypes.c_ulong))[0]
+        finally:
+            self.x11.XFree(data)
+
+    def _text_property(self, window: int, name: str, property_type: int) -> str:
+        data, item_format, count = self._property(window, name, property_type)
+        if data is None:
+            return ""
+        try:
+            if item_format != 8:
+                return ""
+            return ctypes.string_at(data, count).decode("utf-8", "replace")
+        finally:
+            self.x11.XFree(data)
+
+    def window_title(self, window: int) -> str:
+        title = self._text_property(window, "_NET_WM_NAME", self.atom("UTF8_STRING"))
+        return title or self._text_property(window, "WM_NAME", ANY_PROPERTY_TYPE)
+
+    def window_class(self, window: int) -> str:
+        hint = _XClassHint()
+        if not self.x11.XGetClassHint(self.display, window, ctypes.byref(hint)):
+            return ""
+        try:
+            return ctypes.string_at(hint.res_class).decode("utf-8", "replace") if hint.res_class else ""
+        finally:
+            if hint.res_name:
+                self.x11.XFree(hint.res_name)
+            if hint.res_class:
+                self.x11.XFree(hint.res_class)
+
+    def active_window_context(self):
+        window = self.active_window()
+        if not window:
+            return {"title": "", "class": ""}
+        return {"title": self.window_title(window), "class": self.window_class(window)}
+
+    def pixel_rgb(self, x: int, y: int):
+        image = self.x11.XGetImage(self.display, self.root, int(x), int(y), 1, 1, ALL_PLANES, Z_PIXMAP)
+        if not image:
+            return None
+        try:
+            pixel = self.x11.XGetPixel(image, 0, 0)
+        finally:
+            self.x11.XDestroyImage(image)
+        return tuple((pixel & mask) >> shift for mask, shift in self._channels)
+
+    def pointer_position(self):
+        root_return = ctypes.c_ulong()
+        child_return = ctypes.c_ulong()
+        root_x = ctypes.c_int()
+        root_y = ctypes.c_int()
+        win_x = ctypes.c_int()
+        win_y = ctypes.c_int()
+        mask = ctypes.c_uint()
+        self.x11.XQueryPointer(
+            self.display,
+            self.root,
+            ctypes.byref(root_return),
+            ctypes.byref(child_return),
+            ctypes.byref(root_x),
+            ctypes.byref(root_y),
+            ctypes.byref(win_x),
+            ctypes.byref(win_y),
+            ctypes.byref(mask),
+        )
+        return root_x.value, root_y.value
+
+    def keycode(self, keysym: int) -> int:
+        keycode = self._keycodes.get(keysym)
+        if keycode is None:
+            keycode = self._keycodes[keysym] = self.x11.XKeysymToKeycode(self.display, keysym)
+        return keycode
+
+    def needs_shift(self, keysym: int, keycode: int) -> bool:
+        return self.x11.XkbKeycodeToKeysym(self.display, keycode, 0, 0) != keysym and (
+            self.x11.XkbKeycodeToKeysym(self.display, keycode, 0, 1) == keysym
+        )
+
+    def keysym(self, name: str) -> int:
+        return self.x11.XStringToKeysym(name.encode())
+
+    def is_key_down(self, keysym: int) -> bool:
+        keycode = self.keycode(keysym)
+        if not keycode:
+            return False
+        keys = (ctypes.c_char * 32)()
+        self.x11.XQueryKeymap(self.display, keys)
+        return bool(keys[keycode // 8][0] & (1 << (keycode % 8)))
+
+    # XTest calls only queue requests; flush() sends them in one write.
+    def fake_motion(self, x: int, y: int) -> None:
+        self.xtst.XTestFakeMotionEvent(self.display, CURRENT_SCREEN, int(x), int(y), 0)
+        self.pending = True
+
+    def fake_button(self, button: int, pressed: bool) -> None:
+        self.xtst.XTestFakeButtonEvent(self.display, button, bool(pressed), 0)
+        self.pending = True
+
+    def fake_key(self, keycode: int, pressed: bool) -> None:
+        self.xtst.XTestFakeKeyEvent(self.display, keycode, bool(pressed), 0)
+        self.pending = True
+
+    def flush(self) -> None:
+        if self.pending:
+            self.pending = False
+            self.x11.XFlush(self.display)
+
+    def close(self) -> None:
+        if self.display:
+            self.x11.XCloseDisplay(self.display)
+            self.display = None
+
+
+class X11MouseController:
+    """pynput-compatible mouse controller that injects through XTest."""
+
+    def __init__(self, x_display: X11Display):
+        self.x_display = x_display
+
+    @property
+    def position(self):
+        return self.x_display.pointer_position()
+
+    @position.setter
+    def position(self, value):
+        self.x_display.fake_motion(value[0], value[1])
+
+    def press(self, button) -> None:
+        number = BUTTON_NUMBERS.get(getattr(button, "name", button))
+        if number:
+            self.x_display.fake_button(number, True)
+
+    def release(self, button) -> None:
+        number = BUTTON_NUMBERS.get(getattr(button, "name", button))
+        if number:
+            self.x_display.fake_button(number, False)
+
+    def _click_repeated(self, button: int, count: int) -> None:
+        for _ in range(count):
+            self.x_display.fake_button(button, True)
+            self.x_display.fake_button(button, False)
+
+    def scroll(self, dx, dy) -> None:
+        if dy:
+            self._click_repeated(SCROLL_BUTTONS["up" if dy > 0 else "down"], abs(int(dy)))
+        if dx:
+            self._click_repeated(SCROLL_BUTTONS["right" if dx > 0 else "left"], abs(int(dx)))
+
+    def flush(self) -> None:
+        self.x_display.flush()
+
+
+class X11KeyboardController:
+    """pynput-compatible keyboard controller that injects through XTest."""
+
+    def __init__(self, x_display: X11Display):
+        self.x_display = x_display
+        self.shift_keycode = x_display.keycode(x_display.keysym("Shift_L"))
+        self.unmapped = 0
+        self._keysyms = {}
+
+    def _key_keysym(self, key) -> int:
+        cached = self._keysyms.get(key)
+        if cached is not None:
+            return cached
+        name = getattr(key, "name", None)
+        char = getattr(key, "char", None)
+        vk = getattr(key, "vk", None)
+        if name:
+            keysym = self.x_display.keysym(SPECIAL_KEYSYMS.get(name, name))
+            if not keysym and name.startswith("f") and name[1:].isdigit():
+                keysym = self.x_display.keysym(name.upper())
+        elif char:
+            keysym = char_keysym(char)
+        else:
+            # pynput's Xorg backend stores keysyms in KeyCode.vk.
+            keysym = int(vk or 0)
+        self._keysyms[key] = keysym
+        return keysym
+
+    def _send(self, key, pressed: bool) -> None:
+        keycode = self.x_display.keycode(self._key_keysym(key))
+        if not keycode:
+            self.unmapped += 1
+            return
+        self.x_display.fake_key(keycode, pressed)
+
+    def press(self, key) -> None:
+        self._send(key, True)
+
+    def release(self, key) -> None:
+        self._send(key, False)
+
+    def type(self, text: str) -> None:
+        x_display = self.x_display
+        for char in text:
+            keysym = char_keysym(char)
+            keycode = x_display.keycode(keysym)
+            if not keycode:
+                self.unmapped += 1
+                continue
+            shifted = self.shift_keycode and x_display.needs_shift(keysym, keycode)
+            if shifted:
+                x_display.fake_key(self.shift_keycode, True)
+            x_display.fake_key(keycode, True)
+            x_display.fake_key(keycode, False)
+            if shifted:
+                x_display.fake_key(self.shift_keycode, False)
+
+    def flush(self) -> None:
+        self.x_display.flush()
+
+
+_default_display = None
+_default_checked = False
+_default_lock = threading.Lock()
+
+
+def default_display():
+    """The shared connection to $DISPLAY, or None when X11 is not usable here."""
+    global _default_display, _default_checked
+    if _default_checked:
+        return _default_display
+    with _default_lock:
+        if not _default_checked:
+            if os.environ.get("DISPLAY"):
+                try:
+                    _default_display = X11Display()
+                except X11Unavailable:
+                    _default_display = None
+            _default_checked = True
+    return _default_display